@@ -10,7 +10,8 @@ ABIs = {
     "cBridge": "cBridge.json",
     "StargatePool": "StargatePool.json",
     "SynapseBridge": "SynapseBridge.json",
-    "ERC20": "ERC20.json"
+    "ERC20": "ERC20.json",
+    "Multicall3": "Multicall3.json"
 }
 
 
@@ -23,6 +24,11 @@ def getABI(x: str):
     * "ERC20"
     * "BridgePool"
     * "HubPool"
+    * "SpokePool"
+    * "cBridge"
+    * "StargatePool"
+    * "SynapseBridge"
+    * "Multicall3"
     """
     if x in ABIs.keys():
         filename = ABIs[x]
@@ -30,3 +36,15 @@ def getABI(x: str):
         raise ValueError("Only certain ABIs available. Rtfd")
 
     return json.loads(pkgutil.get_data("acx.abis", filename))
+
+
+def getEventABI(x: str, event: str):
+    """
+    Retrieve the ABI of a single event of one of the contracts available
+    through `getABI`
+    """
+    for item in getABI(x):
+        if (item["type"] == "event") and (item["name"] == event):
+            return item
+
+    raise ValueError(f"{x} has no event named {event}")
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from eth_utils import to_checksum_address
+
+from acx.manifest import recordRead, recordWrite
+
+
+# Addresses are held as fixed width (20 byte) numpy strings so that they
+# can be sorted and searched without any Python objects
+ADDRESS_DTYPE = "S20"
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def rawAddresses(addresses):
+    """
+    Convert addresses into a fixed width array of their 20 bytes -- Hex
+    strings are accepted in any case (with or without checksums)
+
+    Parameters
+    ----------
+    addresses : array-like(str) or pa.Array or pa.ChunkedArray
+        Hex strings or an arrow column of `binary(20)` addresses (i.e. a
+        column read with `acx.columnar.readEvents`)
+
+    Returns
+    -------
+    raw : np.array(S20)
+    """
+    if isinstance(addresses, (pa.Array, pa.ChunkedArray)):
+        assert(addresses.type == pa.binary(20))
+        chunks = (
+            addresses.chunks if isinstance(addresses, pa.ChunkedArray)
+            else [addresses]
+        )
+        buffer = b"".join(
+            chunk.buffers()[1].to_pybytes()[20*chunk.offset:20*(chunk.offset + len(chunk))]
+            for chunk in chunks if len(chunk) > 0
+        )
+
+        return np.frombuffer(buffer, dtype=ADDRESS_DTYPE).copy()
+
+    return np.array(
+        [bytes.fromhex(x[2:] if x.startswith("0x") else x) for x in addresses],
+        dtype=ADDRESS_DTYPE
+    )
+
+
+class AddressBook:
+    """
+    The shared dictionary that maps every address seen by the pipeline to
+    a compact integer id
+
+    The book is built once by `addresses.py` (see `fromAddresses`) and
+    saved to `intermediate/addresses.parquet`. Every later stage loads it,
+    converts addresses into ids as soon as they are read (so joins and
+    group-bys run on integer keys) and only converts ids back into
+    checksum addresses when final outputs are written. An address's id is
+    its position among the sorted unique addresses, so lookups are a
+    single vectorized binary search
+
+    Parameters
+    ----------
+    raw : np.array(S20)
+        Sorted unique addresses
+    """
+    def __init__(self, raw):
+        self.raw = np.asarray(raw, dtype=ADDRESS_DTYPE)
+        self._checksums = {}
+
+    def __len__(self):
+        return len(self.raw)
+
+    @classmethod
+    def fromAddresses(cls, *addresses):
+        "Build a book from any number of collections of addresses"
+        raw = [rawAddresses(x) for x in addresses]
+
+        return cls(np.unique(np.concatenate(raw + [rawAddresses([ZERO_ADDRESS])])))
+
+    @classmethod
+    def load(cls, path):
+        "Load a book saved with `save`"
+        table = pq.read_table(path, columns=["address"])
+        recordRead(path, len(table))
+
+        return cls(rawAddresses(table.column("address")))
+
+    def save(self, path):
+        "Save the book as a parquet file with one `binary(20)` address per id"
+        column = self.rawColumn(np.arange(len(self.raw)))
+        pq.write_table(pa.table({"address": column}), path, compression="zstd")
+        recordWrite(path, len(column))
+
+    def rawColumn(self, ids):
+        """
+        The addresses of `ids` as an arrow `binary(20)` column -- Files that
+        outlive the book (whose ids change whenever an address is added)
+        store these rather than ids and read them back with `ids`
+        """
+        raw = np.ascontiguousarray(self.raw[np.asarray(ids, dtype=np.int64)])
+        data = pa.py_buffer(raw.tobytes())
+
+        return pa.Array.from_buffers(pa.binary(20), len(raw), [None, data])
+
+    def ids(self, addresses):
+        """
+        The id of each address
+
+        Parameters
+        ----------
+        addresses : array-like(str) or pa.Array or pa.ChunkedArray
+            Anything accepted by `rawAddresses`
+
+        Returns
+        -------
+        ids : np.array(int32)
+        """
+        raw = rawAddresses(addresses)
+        idx = np.searchsorted(self.raw, raw)
+
+        found = idx < len(self.raw)
+        found[found] = self.raw[idx[found]] == raw[found]
+        if not found.all():
+            raise KeyError(f"{(~found).sum()} addresses aren't in the address book")
+
+        return idx.astype(np.int32)
+
+    def addresses(self, ids):
+        """
+        The checksum address of each id -- Each address is only
+        checksummed once per book
+
+        Parameters
+        ----------
+        ids : array-like(int)
+
+        Returns
+        -------
+        addresses : np.array(str)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        uniques, inverse = np.unique(ids, return_inverse=True)
+
+        names = []
+        for i in uniques:
+            name = self._checksums.get(i)
+            if name is None:
+                name = to_checksum_address(self.raw[i].ljust(20, b"\x00"))
+                self._checksums[i] = name
+            names.append(name)
+
+        return np.array(names, dtype=object)[inverse.reshape(-1)]
+
+    def zeroId(self):
+        "The id of the zero address (used when minting/burning)"
+        return int(self.ids([ZERO_ADDRESS])[0])
+
+    def toAddressIndex(self, x):
+        "Replace the (id) index of a Series/DataFrame with checksum addresses"
+        x = x.copy()
+        x.index = pd.Index(self.addresses(x.index.to_numpy()), name=x.index.name)
+
+        return x
@@ -0,0 +1,238 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+SECONDS_PER_DAY = 24*60*60
+
+# Number of blocks interpolated at a time when writing a store
+WRITE_CHUNK = 1_000_000
+
+
+def gridAnchors(dayBlocks, dayTimestamps):
+    """
+    Build (block, timestamp) anchors from a grid of the first block at or
+    after each of `dayTimestamps` (i.e. the rows of `raw/blocks.json`)
+
+    The block just before each grid block is anchored one second before
+    the grid timestamp, so blocks interpolated between two anchors always
+    fall on the correct side of every grid timestamp
+
+    Parameters
+    ----------
+    dayBlocks : array-like(int)
+        The first block at or after each timestamp
+    dayTimestamps : array-like(int)
+        The grid timestamps
+
+    Returns
+    -------
+    blocks : np.array(int64)
+    timestamps : np.array(int64)
+    """
+    dayBlocks = np.asarray(dayBlocks, dtype=np.int64)
+    dayTimestamps = np.asarray(dayTimestamps, dtype=np.int64)
+
+    blocks = np.concatenate([dayBlocks, dayBlocks - 1])
+    timestamps = np.concatenate([dayTimestamps, dayTimestamps - 1])
+
+    return blocks, timestamps
+
+
+def writeBlockStore(
+        directory, chainId, blocks, timestamps, firstBlock, lastBlock,
+        stepSeconds=SECONDS_PER_DAY
+    ):
+    """
+    Write a dense per-block timestamp array for `chainId` covering
+    `firstBlock` to `lastBlock` (inclusive)
+
+    Blocks whose timestamp is known (`blocks`/`timestamps`) are stored
+    exactly and the blocks in between are linearly interpolated (and
+    floored) between their neighbours. When the same block appears more
+    than once, the first timestamp given for it is used
+
+    Parameters
+    ----------
+    directory : str
+        The folder that holds the store for every chain
+    chainId : int
+        The chain the blocks belong to
+    blocks : array-like(int)
+        Blocks with a known timestamp
+    timestamps : array-like(int)
+        The timestamp of each of `blocks`
+    firstBlock : int
+        The first block in the store
+    lastBlock : int
+        The last block in the store (inclusive)
+    stepSeconds : int
+        The seconds between the grid timestamps that anchor the store (see
+        `gridAnchors`) -- Dates are only exact when a step divides a day
+    """
+    firstBlock, lastBlock = int(firstBlock), int(lastBlock)
+    assert(lastBlock >= firstBlock)
+    assert(SECONDS_PER_DAY % stepSeconds == 0)
+    os.makedirs(directory, exist_ok=True)
+
+    blocks = np.asarray(blocks, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    _, first = np.unique(blocks, return_index=True)
+    blocks, timestamps = blocks[first], timestamps[first]
+
+    # `np.unique` sorts by block -- Make sure that interpolation never
+    # produces timestamps that go backwards
+    timestamps = np.maximum.accumulate(timestamps)
+
+    path = os.path.join(directory, f"{chainId}.npy")
+    dense = np.lib.format.open_memmap(
+        path + ".tmp", mode="w+", dtype=np.uint32,
+        shape=(lastBlock - firstBlock + 1,)
+    )
+    for bs in range(firstBlock, lastBlock + 1, WRITE_CHUNK):
+        be = min(bs + WRITE_CHUNK, lastBlock + 1)
+        chunk = np.interp(np.arange(bs, be), blocks, timestamps)
+        dense[bs - firstBlock:be - firstBlock] = np.floor(chunk)
+    dense.flush()
+    del dense
+    os.replace(path + ".tmp", path)
+
+    with open(os.path.join(directory, f"{chainId}.json"), "w") as f:
+        json.dump(
+            {"firstBlock": firstBlock, "lastBlock": lastBlock, "stepSeconds": int(stepSeconds)},
+            f
+        )
+
+
+class BlockStore:
+    """
+    Memory-mapped per-chain block timestamps (written by `blocks.py`) and
+    the one place that blocks are converted into timestamps or dates
+
+    Every lookup is a vectorized gather from a dense `uint32` array
+    indexed by block number, so whole columns of blocks are resolved in a
+    single call
+
+    Parameters
+    ----------
+    directory : str
+        The folder that holds the store for every chain
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._chains = {}
+        self._dayStarts = {}
+
+    def _load(self, chainId):
+        if chainId not in self._chains:
+            with open(os.path.join(self.directory, f"{chainId}.json"), "r") as f:
+                meta = json.load(f)
+            # Day boundaries are only anchored when they fall on the grid
+            stepSeconds = meta.get("stepSeconds", SECONDS_PER_DAY)
+            if SECONDS_PER_DAY % stepSeconds != 0:
+                raise ValueError(
+                    f"The block store of chain {chainId} was built with a "
+                    f"{stepSeconds} second step that doesn't divide a day"
+                )
+            dense = np.load(
+                os.path.join(self.directory, f"{chainId}.npy"), mmap_mode="r"
+            )
+            self._chains[chainId] = (meta["firstBlock"], dense)
+
+        return self._chains[chainId]
+
+    def timestamps(self, chainId, blocks):
+        """
+        The timestamps of `blocks` on `chainId`
+
+        Parameters
+        ----------
+        chainId : int
+            The chain the blocks belong to
+        blocks : array-like(int)
+            Block numbers
+
+        Returns
+        -------
+        timestamps : np.array(int64)
+            UTC timestamps (in seconds)
+        """
+        firstBlock, dense = self._load(int(chainId))
+        idx = np.asarray(blocks, dtype=np.int64) - firstBlock
+
+        if (idx.size > 0) and ((idx.min() < 0) or (idx.max() >= len(dense))):
+            raise ValueError(
+                f"Blocks outside of {firstBlock} to "
+                f"{firstBlock + len(dense) - 1} on chain {chainId}"
+            )
+
+        return dense[idx].astype(np.int64)
+
+    def dates(self, chainIds, blocks, side="left"):
+        """
+        The date of each block -- A block gets the date of the first day
+        boundary (the first block of a day) at or after it, like the
+        `np.searchsorted` lookups over `raw/blocks.json` that it replaces
+
+        Parameters
+        ----------
+        chainIds : int or array-like(int)
+            The chain of each block (or a single chain for all of them)
+        blocks : array-like(int)
+            Block numbers
+        side : str
+            Passed to `np.searchsorted` -- With "left" the first block of
+            a day gets that day and with "right" it gets the next day
+
+        Returns
+        -------
+        dates : np.array(datetime64[ns])
+        """
+        assert(side in ["left", "right"])
+        blocks = np.asarray(blocks, dtype=np.int64)
+        chainIds = np.broadcast_to(np.asarray(chainIds), blocks.shape)
+
+        dates = np.empty(blocks.shape, dtype="datetime64[ns]")
+        for chainId in np.unique(chainIds):
+            mask = chainIds == chainId
+            days = self._dayStartsOf(int(chainId))
+            dayBlocks = days["block"].to_numpy()
+            idx = np.searchsorted(dayBlocks, blocks[mask], side=side)
+
+            if (idx.size > 0) and (idx.max() >= len(dayBlocks)):
+                raise ValueError(
+                    f"Blocks after the last day boundary ({dayBlocks[-1]}) "
+                    f"on chain {chainId}"
+                )
+            dates[mask] = days["date"].to_numpy()[idx]
+
+        return dates
+
+    def _dayStartsOf(self, chainId):
+        if chainId not in self._dayStarts:
+            self._dayStarts[chainId] = self.dayStarts(chainId)
+
+        return self._dayStarts[chainId]
+
+    def dayStarts(self, chainId):
+        """
+        The first block of each day in the store
+
+        Returns
+        -------
+        df : pd.DataFrame
+            The `block` and `date` of each day ordered by block (the same
+            layout as a single chain of `raw/blocks.json`)
+        """
+        firstBlock, dense = self._load(int(chainId))
+        days = np.asarray(dense) // SECONDS_PER_DAY
+
+        idx = np.concatenate([[0], np.flatnonzero(np.diff(days)) + 1])
+
+        return pd.DataFrame({
+            "block": firstBlock + idx,
+            "date": (days[idx].astype(np.int64)*SECONDS_PER_DAY)
+            .astype("datetime64[s]").astype("datetime64[ns]")
+        })
@@ -0,0 +1,159 @@
+import bisect
+import json
+import os
+
+from acx.rpc import batchRequest
+
+
+class BlockTimestamps:
+    """
+    Looks up (and remembers) the timestamps of blocks on a single chain
+
+    Headers are requested with batched `eth_getBlockByNumber` calls and
+    every timestamp that has been seen is kept in a sorted cache that can
+    be saved to (and loaded from) disk
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object with an HTTP provider for the chain
+    path : str, optional
+        A JSON file that the header cache is loaded from and saved to
+    nWorkers : int
+        The number of batches that are in flight at once
+    """
+    def __init__(self, w3, path=None, nWorkers=1):
+        self.w3 = w3
+        self.path = path
+        self.nWorkers = nWorkers
+
+        # Parallel sorted lists of block numbers and their timestamps
+        self.blocks = []
+        self.timestamps = []
+
+        if (path is not None) and os.path.exists(path):
+            with open(path, "r") as f:
+                cached = json.load(f)
+            self.blocks = [int(x) for x in cached["blocks"]]
+            self.timestamps = [int(x) for x in cached["timestamps"]]
+
+    def save(self):
+        "Write the header cache to `path`"
+        assert(self.path is not None)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump({"blocks": self.blocks, "timestamps": self.timestamps}, f)
+        os.replace(tmpPath, self.path)
+
+    def _insert(self, blocks, timestamps):
+        "Merge uncached blocks into the cache in a single pass"
+        merged = sorted(
+            list(zip(self.blocks, self.timestamps)) + list(zip(blocks, timestamps))
+        )
+        self.blocks = [b for (b, _) in merged]
+        self.timestamps = [ts for (_, ts) in merged]
+
+    def _isCached(self, block):
+        "Whether the timestamp of `block` is in the cache"
+        idx = bisect.bisect_left(self.blocks, block)
+        return (idx < len(self.blocks)) and (self.blocks[idx] == block)
+
+    def get(self, blocks):
+        """
+        Retrieve the timestamps of `blocks`, only blocks that aren't in
+        the cache are requested from the node
+        """
+        blocks = [int(x) for x in blocks]
+
+        missing = sorted(set(b for b in blocks if not self._isCached(b)))
+        if len(missing) > 0:
+            headers = batchRequest(
+                self.w3,
+                [("eth_getBlockByNumber", [hex(b), False]) for b in missing],
+                nWorkers=self.nWorkers
+            )
+            for (block, header) in zip(missing, headers):
+                if header is None:
+                    raise ValueError(f"Block {block} does not exist yet")
+            self._insert(missing, [int(x["timestamp"], 16) for x in headers])
+
+        return [self.timestamps[bisect.bisect_left(self.blocks, b)] for b in blocks]
+
+    def _bounds(self, ts):
+        """
+        The tightest cached (lo, hi) blocks with `timestamp(lo) < ts` and
+        `timestamp(hi) >= ts` -- Timestamps never decrease with the block
+        number so the cached timestamps are sorted too
+        """
+        idx = bisect.bisect_left(self.timestamps, ts)
+
+        return self.blocks[idx - 1], self.blocks[idx]
+
+    def findBlocksAfterTs(self, timestamps, firstBlock=0, lastBlock=None):
+        """
+        Find the first block produced at or after each of `timestamps`
+
+        All of the timestamps are resolved together: each round makes one
+        guess per unresolved timestamp and requests every guess in a
+        single batch, and every header that comes back narrows the search
+        for all of the other timestamps too. Guesses alternate between
+        interpolating on the timestamps and bisecting so that a search
+        takes at most twice as many rounds as a pure binary search
+
+        Parameters
+        ----------
+        timestamps : list(int)
+            UTC timestamps (in seconds)
+        firstBlock : int
+            The first block to search from
+        lastBlock : int, optional
+            The last block to search to, defaults to the latest block
+
+        Returns
+        -------
+        blocks : list(int)
+            The first block whose timestamp is at or after each timestamp
+            in the same order as `timestamps`
+        """
+        if lastBlock is None:
+            lastBlock = self.w3.eth.block_number
+        firstTs, lastTs = self.get([firstBlock, lastBlock])
+
+        out = {}
+        pending = set()
+        for ts in set(timestamps):
+            if ts <= firstTs:
+                out[ts] = firstBlock
+            elif ts > lastTs:
+                raise ValueError(f"No block after {ts} (latest is {lastTs})")
+            else:
+                pending.add(ts)
+
+        interpolate = True
+        while len(pending) > 0:
+            guesses = set()
+            for ts in list(pending):
+                lo, hi = self._bounds(ts)
+                if hi == lo + 1:
+                    out[ts] = hi
+                    pending.remove(ts)
+                    continue
+
+                if interpolate:
+                    loTs = self.timestamps[bisect.bisect_left(self.blocks, lo)]
+                    hiTs = self.timestamps[bisect.bisect_left(self.blocks, hi)]
+                    guess = lo + (ts - loTs)*(hi - lo) // (hiTs - loTs)
+                else:
+                    guess = (lo + hi) // 2
+                guesses.add(min(max(guess, lo + 1), hi - 1))
+
+            if len(guesses) > 0:
+                self.get(sorted(guesses))
+            interpolate = not interpolate
+
+        return [out[ts] for ts in timestamps]
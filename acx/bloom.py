@@ -0,0 +1,100 @@
+from eth_utils import event_abi_to_log_topic, keccak, to_canonical_address
+
+from acx.rpc import batchRequest
+
+
+# Number of bits in a block's `logsBloom`
+BLOOM_BITS = 2048
+
+# Number of headers requested (and tested) at a time while prescanning --
+# Only the blocks that may match are kept so memory use stays flat
+PRESCAN_CHUNK = 1_000
+
+
+def bloomMask(values):
+    """
+    Build the bit mask that a `logsBloom` must fully contain for all of
+    `values` (contract addresses and topics as bytes) to possibly appear
+    in a block
+
+    Each value sets the three bits picked by the low 11 bits of the first
+    three pairs of bytes of its keccak hash (see the yellow paper's `M3:2048`)
+    """
+    mask = 0
+    for value in values:
+        h = keccak(value)
+        for i in range(0, 6, 2):
+            mask |= 1 << (((h[i] << 8) | h[i + 1]) & (BLOOM_BITS - 1))
+
+    return mask
+
+
+def bloomMayContain(bloom, mask):
+    """
+    Whether a bloom (as an int) may contain every value in `mask` -- False
+    means that the block definitely doesn't contain a matching log
+    """
+    return (bloom & mask) == mask
+
+
+class BloomPrescan:
+    """
+    Finds the blocks in a range that may contain matching logs by
+    testing each block header's `logsBloom`
+
+    A block may contain a match when its bloom contains every value of
+    at least one of `alternatives` (i.e. a contract address and the
+    topic0 of one of its events). Headers are requested in JSON-RPC
+    batches, so skipping a range with no matches costs a handful of
+    batched header requests rather than an `eth_getLogs`. Instances are
+    passed as `prescan` to `acx.utils.findEvents` (and friends)
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object with an HTTP provider
+    alternatives : list(list(bytes))
+        Groups of values that must all be in a block's bloom
+    """
+    def __init__(self, w3, alternatives):
+        self.w3 = w3
+        self.masks = [bloomMask(values) for values in alternatives]
+
+    def _mayMatch(self, bloom):
+        return any(bloomMayContain(bloom, mask) for mask in self.masks)
+
+    def __call__(self, startBlock, endBlock):
+        """
+        The blocks between `startBlock` and `endBlock` (inclusive) whose
+        bloom may contain a match, in block order
+        """
+        out = []
+        for bs in range(startBlock, endBlock + 1, PRESCAN_CHUNK):
+            be = min(bs + PRESCAN_CHUNK - 1, endBlock)
+            headers = batchRequest(
+                self.w3,
+                [
+                    ("eth_getBlockByNumber", [hex(b), False])
+                    for b in range(bs, be + 1)
+                ]
+            )
+            for (block, header) in zip(range(bs, be + 1), headers):
+                if self._mayMatch(int(header["logsBloom"], 16)):
+                    out.append(block)
+
+        return out
+
+
+def eventPrescan(w3, events):
+    """
+    Build a `BloomPrescan` that looks for any of `events` (web3 contract
+    events, i.e. `contract.events.EVENT`) emitted by their contract
+    """
+    alternatives = []
+    for event in events:
+        alternatives.append([
+            to_canonical_address(event.address),
+            event_abi_to_log_topic(event._get_event_abi())
+        ])
+
+    return BloomPrescan(w3, alternatives)
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from eth_utils import encode_hex, event_abi_to_log_topic
+
+
+def mergeRanges(ranges):
+    """
+    Merge a list of inclusive (start, end) block ranges so that touching
+    or overlapping ranges become a single range
+    """
+    out = []
+    for (s, e) in sorted(ranges):
+        if (len(out) > 0) and (s <= out[-1][1] + 1):
+            out[-1] = (out[-1][0], max(out[-1][1], e))
+        else:
+            out.append((s, e))
+
+    return out
+
+
+def missingRanges(ranges, start, end):
+    """
+    Find the pieces of the inclusive range (`start`, `end`) that are not
+    covered by `ranges`
+
+    Parameters
+    ----------
+    ranges : list(tuple(int, int))
+        Inclusive block ranges that have already been covered
+    start : int
+        The first block of interest
+    end : int
+        The last block of interest (inclusive)
+
+    Returns
+    -------
+    gaps : list(tuple(int, int))
+        The inclusive block ranges that still need to be covered
+    """
+    gaps = []
+    bs = start
+    for (s, e) in mergeRanges(ranges):
+        if e < bs:
+            continue
+        if s > end:
+            break
+        if s > bs:
+            gaps.append((bs, s - 1))
+        bs = max(bs, e + 1)
+    if bs <= end:
+        gaps.append((bs, end))
+
+    return gaps
+
+
+class EventCache:
+    """
+    An on-disk cache of event logs that remembers which block ranges have
+    been completely downloaded
+
+    Events are stored under
+    `directory/{chainId}/{address}/{topic}[-{filterHash}]/` with one JSON
+    file per downloaded block range and a `ranges.ndjson` index that gets
+    one (startBlock, endBlock) line appended for every stored file. A
+    range is only appended to the index after its events have been
+    written so an interrupted run can resume from the last completed
+    range -- Files that were written but never recorded are ignored. Only
+    blocks up to the latest finalized block are ever recorded as complete.
+
+    The index of each key is read once and then kept in memory. Several
+    processes can share a cache because each line is a single append and
+    event files are written under a temporary name before being moved in
+    place
+
+    Parameters
+    ----------
+    directory : str
+        The folder that the cache lives in
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._chunks = {}
+
+    def key(self, chainId, address, topic, argFilters=None):
+        """
+        Build the cache key for an event
+
+        Parameters
+        ----------
+        chainId : int
+            The chain the contract lives on
+        address : str
+            The contract address
+        topic : str
+            The hex encoded topic0 of the event
+        argFilters : dict, optional
+            The filters applied on indexed arguments. Different filters
+            produce different results so they are part of the key
+        """
+        key = os.path.join(str(chainId), address.lower(), topic.lower())
+        if argFilters:
+            filterHash = hashlib.sha256(
+                json.dumps(argFilters, sort_keys=True).encode()
+            ).hexdigest()[:16]
+            key += f"-{filterHash}"
+
+        return key
+
+    def eventKey(self, w3, event, argFilters=None):
+        "Build the cache key for a web3 contract event"
+        topic = encode_hex(event_abi_to_log_topic(event._get_event_abi()))
+
+        return self.key(w3.eth.chainId, event.address, topic, argFilters)
+
+    def multiKey(self, w3, routes):
+        """
+        Build the cache key for a fused query over several
+        (address, topic0) pairs
+        """
+        routesHash = hashlib.sha256(
+            json.dumps(sorted((a.lower(), t.lower()) for (a, t) in routes))
+            .encode()
+        ).hexdigest()[:16]
+
+        return self.key(w3.eth.chainId, "fused", routesHash)
+
+    def _path(self, key, *args):
+        return os.path.join(self.directory, key, *args)
+
+    def _readIndex(self, key):
+        "The recorded ranges of `key` whose file exists"
+        chunks = []
+
+        # Caches written before the index was append only have a single
+        # `ranges.json` list
+        legacyPath = self._path(key, "ranges.json")
+        if os.path.exists(legacyPath):
+            with open(legacyPath, "r") as f:
+                chunks.extend(tuple(x) for x in json.load(f))
+
+        path = self._path(key, "ranges.ndjson")
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    # A process that died mid-append leaves a partial line
+                    try:
+                        bs, be = json.loads(line)
+                    except ValueError:
+                        continue
+                    chunks.append((bs, be))
+
+        return {
+            (bs, be) for (bs, be) in chunks
+            if os.path.exists(self._path(key, f"{bs}-{be}.json"))
+        }
+
+    def _loadedChunks(self, key):
+        "The in-memory set of ranges recorded for `key` (call with the lock)"
+        if key not in self._chunks:
+            self._chunks[key] = self._readIndex(key)
+
+        return self._chunks[key]
+
+    def storedChunks(self, key):
+        """
+        The inclusive (startBlock, endBlock) of every recorded range whose
+        file exists, ordered by block
+        """
+        with self._lock:
+            return sorted(self._loadedChunks(key))
+
+    def completedRanges(self, key):
+        "The (merged) inclusive block ranges that are complete for `key`"
+        return mergeRanges(self.storedChunks(key))
+
+    def missingRanges(self, key, start, end):
+        "The inclusive block ranges between `start` and `end` not yet cached"
+        return missingRanges(self.completedRanges(key), start, end)
+
+    def segments(self, key, start, end):
+        """
+        Break `start` to `end` (inclusive) into consecutive
+        (startBlock, endBlock, isCached) segments in block order
+        """
+        ranges = self.completedRanges(key)
+
+        cached = [
+            (max(s, start), min(e, end), True)
+            for (s, e) in mergeRanges(ranges)
+            if (e >= start) and (s <= end)
+        ]
+        gaps = [
+            (s, e, False) for (s, e) in missingRanges(ranges, start, end)
+        ]
+
+        return sorted(cached + gaps)
+
+    def store(self, key, startBlock, endBlock, events, finalizedBlock=None):
+        """
+        Save the events found between `startBlock` and `endBlock`
+        (inclusive) and mark that range as complete
+
+        Blocks after `finalizedBlock` may still be reorganized so the
+        range is cut short there (and nothing is stored when it starts
+        after it)
+        """
+        if finalizedBlock is not None:
+            if startBlock > finalizedBlock:
+                return
+            if endBlock > finalizedBlock:
+                endBlock = finalizedBlock
+                events = [x for x in events if x["blockNumber"] <= endBlock]
+
+        os.makedirs(self._path(key), exist_ok=True)
+
+        # Write the events before recording the range as complete -- The
+        # temporary name is unique so racing processes never move each
+        # other's half-written files in place
+        fd, tmpPath = tempfile.mkstemp(
+            suffix=".tmp", dir=self._path(key)
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(events, f)
+        os.replace(tmpPath, self._path(key, f"{startBlock}-{endBlock}.json"))
+
+        with self._lock:
+            chunks = self._loadedChunks(key)
+            if (startBlock, endBlock) in chunks:
+                return
+
+            with open(self._path(key, "ranges.ndjson"), "a") as f:
+                f.write(json.dumps([startBlock, endBlock]) + "\n")
+            chunks.add((startBlock, endBlock))
+
+    def chunkFiles(self, key, start, end):
+        """
+        The (startBlock, endBlock, path) of the recorded ranges that cover
+        `start` to `end`, ordered by block
+
+        Recorded ranges can overlap (i.e. when two runs raced each other)
+        so each block is only taken from the first range that covers it
+        -- The returned ranges never overlap
+        """
+        out = []
+        covered = start - 1
+        for (bs, be) in self.storedChunks(key):
+            if (be < start) or (bs > end) or (be <= covered):
+                continue
+
+            path = self._path(key, f"{bs}-{be}.json")
+            out.append((max(bs, covered + 1), min(be, end), path))
+            covered = min(be, end)
+
+        return out
+
+    def loadFile(self, path, start, end):
+        "Load the events in a single stored range between `start` and `end`"
+        with open(path, "r") as f:
+            chunk = json.load(f)
+
+        return [x for x in chunk if start <= x["blockNumber"] <= end]
+
+    def load(self, key, start, end):
+        """
+        Load all of the cached events between `start` and `end`
+        (inclusive) in block order
+        """
+        events = []
+        for (bs, be, path) in self.chunkFiles(key, start, end):
+            events.extend(self.loadFile(path, bs, be))
+
+        return events
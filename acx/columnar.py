@@ -0,0 +1,497 @@
+import os
+
+from decimal import Decimal
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from eth_utils import to_checksum_address
+
+from acx.decode import _flattenInputs, _isDynamic
+from acx.manifest import recordRead, recordWrite
+
+
+# Log fields stored (in this order) ahead of the event's arguments
+LOG_COLUMNS = [
+    ("blockNumber", pa.int64()),
+    ("transactionIndex", pa.int32()),
+    ("logIndex", pa.int32()),
+    ("transactionHash", pa.binary(32)),
+    ("blockHash", pa.binary(32)),
+    ("address", pa.binary(20)),
+]
+
+# Events are sorted by these columns within every batch that is written
+SORT_BY = ["blockNumber", "logIndex"]
+
+# Integers wider than 64 bits are stored exactly as decimals without a
+# fractional part -- 76 digits is the widest decimal arrow supports, which
+# is more than enough for any token amount (but not every uint256)
+BIG_INT = pa.decimal256(76, 0)
+BIG_INT_LIMIT = 10**76
+
+# Chain ids are `uint256`s in the ABIs but always fit in an int64 -- Used
+# as the default `overrides` of `eventSchema`
+NARROW_COLUMNS = {
+    "depositData.chainId": pa.int64(),
+    "originChainId": pa.int64(),
+    "destinationChainId": pa.int64(),
+}
+
+# The symbol of the pool/token an event belongs to
+SYMBOL = pa.dictionary(pa.int32(), pa.string())
+
+# Maximum number of events in each parquet row group and the number of
+# events converted to arrow at a time
+ROW_GROUP_SIZE = 100_000
+CONVERT_CHUNK = 100_000
+
+COMPRESSION = "zstd"
+
+
+def _arrowType(abiType):
+    """
+    The arrow type that a (non-tuple) ABI type is stored as -- Arrays are
+    stored as lists of their element's type
+    """
+    if abiType.endswith("]"):
+        return pa.list_(_arrowType(abiType[:abiType.rindex("[")]))
+    if abiType == "address":
+        return pa.binary(20)
+    if abiType == "bool":
+        return pa.bool_()
+    if abiType == "string":
+        return pa.string()
+    if abiType == "bytes":
+        return pa.binary()
+    if abiType.startswith("bytes"):
+        return pa.binary(int(abiType[len("bytes"):]))
+
+    if abiType.startswith("uint") or abiType.startswith("int"):
+        signed = abiType.startswith("int")
+        bits = int(abiType[len("int") + (not signed):] or 256)
+        if bits > 64:
+            return BIG_INT
+        width = next(x for x in [8, 16, 32, 64] if bits <= x)
+
+        return getattr(pa, f"{'int' if signed else 'uint'}{width}")()
+
+    raise ValueError(f"Can't store {abiType} in a column")
+
+
+def eventColumns(eventAbi):
+    """
+    The (name, abiType) of each argument column of an event -- Static
+    tuples are flattened into one column per component named
+    `{tuple}.{component}` (like `acx.decode.EventDecoder`) and indexed
+    dynamic values are stored as the hash that the log holds
+    """
+    out = []
+    for x in eventAbi["inputs"]:
+        if x["indexed"] and _isDynamic(x["type"]):
+            out.append((x["name"], "bytes32"))
+        else:
+            out.extend(_flattenInputs([x]))
+
+    return out
+
+
+def eventSchema(eventAbi, extra=None, overrides=NARROW_COLUMNS):
+    """
+    The arrow schema of a file of `eventAbi` events
+
+    Parameters
+    ----------
+    eventAbi : dict
+        The ABI of the event
+    extra : dict(str, pa.DataType)
+        Columns appended after the event's arguments (e.g. `symbol`)
+    overrides : dict(str, pa.DataType)
+        Types to use instead of the default for the columns (of those
+        named) that the event has -- Used to narrow `uint256` values that
+        are known to be small (chain ids)
+
+    Returns
+    -------
+    schema : pa.Schema
+    """
+    extra = extra if extra is not None else {}
+    overrides = overrides if overrides is not None else {}
+
+    fields = list(LOG_COLUMNS)
+    for (name, abiType) in eventColumns(eventAbi):
+        fields.append((name, _arrowType(abiType)))
+    fields.extend(extra.items())
+
+    names = [name for (name, _) in fields]
+    assert(len(set(names)) == len(names))
+
+    return pa.schema([(name, overrides.get(name, t)) for (name, t) in fields])
+
+
+def _argValue(args, path):
+    "The value of a (possibly flattened) argument of a JSON readable event"
+    value = args[path[0]]
+    for component in path[1:]:
+        if isinstance(value, dict):
+            value = value[component[0]]
+        else:
+            value = value[component[1]]
+
+    return value
+
+
+def _argPaths(eventAbi):
+    """
+    The path to each argument column's value in an event's `args` -- Tuple
+    components are found by name (dicts) or by position (lists)
+    """
+    def walk(inputs, prefix):
+        out = []
+        for (i, x) in enumerate(inputs):
+            step = prefix + [(x["name"], i)]
+            if x["type"] == "tuple":
+                out.extend(walk(x["components"], step))
+            else:
+                out.append(step)
+        return out
+
+    return [
+        [path[0][0]] + path[1:] for path in walk(eventAbi["inputs"], [])
+    ]
+
+
+def _fromHex(x):
+    "Bytes from a hex string with or without the `0x` prefix"
+    return bytes.fromhex(x[2:] if x.startswith("0x") else x)
+
+
+def _toArrow(values, t):
+    "Convert JSON readable values into an arrow array of type `t`"
+    if pa.types.is_list(t):
+        offsets = np.cumsum([0] + [len(x) for x in values], dtype=np.int32)
+        flat = _toArrow([v for x in values for v in x], t.value_type)
+
+        return pa.ListArray.from_arrays(pa.array(offsets), flat, type=t)
+    if pa.types.is_fixed_size_binary(t) or t == pa.binary():
+        values = [_fromHex(x) for x in values]
+    elif t == BIG_INT:
+        values = [int(x) for x in values]
+        if any(abs(x) >= BIG_INT_LIMIT for x in values):
+            raise ValueError("Integer too wide to store as a decimal")
+        values = [Decimal(x) for x in values]
+    elif pa.types.is_integer(t):
+        values = np.asarray(values, dtype=t.to_pandas_dtype())
+
+    return pa.array(values, type=t)
+
+
+def eventTable(events, schema, eventAbi, extraValues=None):
+    """
+    Convert JSON readable events (the output of `acx.utils.findEvents`)
+    into an arrow table with `schema` (see `eventSchema`)
+
+    Parameters
+    ----------
+    events : list(dict)
+        The events
+    schema : pa.Schema
+        The schema of the table
+    eventAbi : dict
+        The ABI of the event
+    extraValues : dict(str, list)
+        The values of the extra columns of `schema` for each event
+
+    Returns
+    -------
+    table : pa.Table
+    """
+    extraValues = extraValues if extraValues is not None else {}
+
+    columns = {}
+    for (name, _) in LOG_COLUMNS:
+        columns[name] = [event[name] for event in events]
+    for ((name, _), path) in zip(eventColumns(eventAbi), _argPaths(eventAbi)):
+        columns[name] = [_argValue(event["args"], path) for event in events]
+    for (name, values) in extraValues.items():
+        assert(len(values) == len(events))
+        columns[name] = list(values)
+
+    return pa.table(
+        [_toArrow(columns[field.name], field.type) for field in schema],
+        schema=schema
+    )
+
+
+class EventWriter:
+    """
+    Writes the events of a single type to a zstd compressed parquet file
+    with one typed column per log field and (flattened) argument
+
+    Addresses and hashes are stored as fixed size binary, integers of at
+    most 64 bits as (u)ints and wider integers exactly as decimals. Each
+    call to `write` sorts its events by `sortBy` before writing them in
+    row groups of at most `rowGroupSize` events, so the row group
+    statistics let readers skip block ranges that they don't need.
+    Events that are already in order can be streamed instead, so only one
+    chunk is ever held in memory. The file is written to a temporary path and only moved into place once
+    the writer is closed without an error
+
+    Parameters
+    ----------
+    path : str
+        The file to write
+    eventAbi : dict
+        The ABI of the event
+    extra : dict(str, pa.DataType)
+        Columns appended after the event's arguments
+    overrides : dict(str, pa.DataType)
+        Types to use instead of the default for some columns
+    sortBy : list(str)
+        The columns that events are sorted by
+    rowGroupSize : int
+        The maximum number of events in each row group
+    """
+    def __init__(
+            self, path, eventAbi, extra=None, overrides=NARROW_COLUMNS, sortBy=SORT_BY,
+            rowGroupSize=ROW_GROUP_SIZE
+        ):
+        self.path = path
+        self.eventAbi = eventAbi
+        self.schema = eventSchema(eventAbi, extra, overrides)
+        self.sortBy = sortBy
+        self.rowGroupSize = rowGroupSize
+        self.nWritten = 0
+        assert(all(name in self.schema.names for name in sortBy))
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._writer = pq.ParquetWriter(
+            path + ".tmp", self.schema, compression=COMPRESSION
+        )
+
+    def _sorted(self, table):
+        return table.sort_by([(name, "ascending") for name in self.sortBy])
+
+    def write(self, events, extraValues=None, presorted=False):
+        """
+        Sort and write a batch of JSON readable events
+
+        Parameters
+        ----------
+        events : iterable(dict)
+            The events -- Converted to arrow `CONVERT_CHUNK` at a time
+        extraValues : dict(str, list)
+            The values of the extra columns for each event
+        presorted : bool
+            Whether `events` are already ordered by `sortBy` (at least
+            from one chunk to the next) -- Each chunk is then sorted on
+            its own and written as soon as it is converted rather than
+            holding every event in memory for a single sort
+        """
+        extraValues = extraValues if extraValues is not None else {}
+        events = iter(events)
+
+        tables = []
+        start = 0
+        while True:
+            chunk = list(islice(events, CONVERT_CHUNK))
+            if len(chunk) == 0:
+                break
+            chunkExtra = {
+                k: v[start:start + len(chunk)] for (k, v) in extraValues.items()
+            }
+            table = eventTable(chunk, self.schema, self.eventAbi, chunkExtra)
+            start += len(chunk)
+
+            if presorted:
+                self._writer.write_table(
+                    self._sorted(table), row_group_size=self.rowGroupSize
+                )
+                self.nWritten += len(table)
+            else:
+                tables.append(table)
+
+        if presorted or (len(tables) == 0):
+            return start
+
+        table = self._sorted(pa.concat_tables(tables))
+        self._writer.write_table(table, row_group_size=self.rowGroupSize)
+        self.nWritten += len(table)
+
+        return len(table)
+
+    def close(self, commit=True):
+        self._writer.close()
+        if commit:
+            os.replace(self.path + ".tmp", self.path)
+            recordWrite(self.path, self.nWritten)
+        else:
+            os.remove(self.path + ".tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, *args):
+        self.close(commit=excType is None)
+
+
+def writeEvents(path, eventAbi, events, extra=None, extraValues=None, **kwargs):
+    """
+    Write a list of events with a single `EventWriter` (see it for the
+    keyword arguments) and return the number of events written
+    """
+    with EventWriter(path, eventAbi, extra=extra, **kwargs) as writer:
+        writer.write(events, extraValues)
+
+    return writer.nWritten
+
+
+def writeEventsBySymbol(path, eventAbi, eventsBySymbol, **kwargs):
+    """
+    Write the events of several pools (keyed by their token's symbol)
+    into a single file with a dictionary encoded `symbol` column
+
+    Parameters
+    ----------
+    path : str
+        The file to write
+    eventAbi : dict
+        The ABI of the event
+    eventsBySymbol : dict(str, list(dict))
+        The events of each symbol
+    """
+    events = [event for symbol in eventsBySymbol for event in eventsBySymbol[symbol]]
+    symbols = [
+        symbol for symbol in eventsBySymbol for _ in range(len(eventsBySymbol[symbol]))
+    ]
+
+    return writeEvents(
+        path, eventAbi, events, extra={"symbol": SYMBOL},
+        extraValues={"symbol": symbols}, **kwargs
+    )
+
+
+def readEvents(path, columns=None, filters=None):
+    """
+    Read the events written by `EventWriter` as an arrow table
+
+    Parameters
+    ----------
+    path : str
+        The file to read
+    columns : list(str)
+        Only read these columns (all of them by default)
+    filters : list(tuple)
+        Row filters in the format of `pyarrow.parquet.read_table` (e.g.
+        `[("blockNumber", ">=", startBlock)]`) -- Row groups that can't
+        match are never read
+
+    Returns
+    -------
+    table : pa.Table
+    """
+    table = pq.read_table(path, columns=columns, filters=filters)
+    recordRead(path, len(table))
+
+    return table
+
+
+def countEvents(path):
+    "The number of events in a file without reading any of them"
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def _decodeAddresses(column):
+    "Checksum address strings -- Each unique address is only encoded once"
+    uniques = pc.unique(column)
+    names = pa.array(
+        [to_checksum_address(x) for x in uniques.to_pylist()], type=pa.string()
+    )
+
+    return names.take(pc.index_in(column, uniques)).to_numpy(zero_copy_only=False)
+
+
+def _decodeHashes(column, size):
+    "`0x` prefixed hex strings of fixed size binary values"
+    raw = b"".join(
+        chunk.buffers()[1].to_pybytes()[chunk.offset*size:(chunk.offset + len(chunk))*size]
+        for chunk in column.chunks if len(chunk) > 0
+    ).hex()
+    width = 2*size
+
+    return np.array(
+        ["0x" + raw[width*i:width*(i + 1)] for i in range(len(column))],
+        dtype=object
+    )
+
+
+def _decodeColumn(column, t, addressBook=None):
+    "Convert an arrow column into the values of `eventFrame`"
+    if (t == pa.binary(20)) and (addressBook is not None):
+        return addressBook.ids(column)
+    if t == pa.binary(20):
+        return _decodeAddresses(column)
+    if pa.types.is_fixed_size_binary(t):
+        return _decodeHashes(column, t.byte_width)
+    if pa.types.is_decimal(t):
+        return np.array([int(x) for x in column.to_pylist()], dtype=object)
+    if pa.types.is_dictionary(t):
+        return column.to_pandas()
+    if pa.types.is_list(t):
+        # Each row becomes a list of its decoded elements
+        column = (
+            pa.concat_arrays(column.chunks) if len(column.chunks) > 0
+            else pa.array([], type=t)
+        )
+        values = _decodeColumn(
+            pa.chunked_array([column.flatten()], type=t.value_type), t.value_type,
+            addressBook
+        )
+        offsets = column.offsets.to_numpy()
+        offsets = offsets - offsets[0]
+        out = np.empty(len(column), dtype=object)
+        out[:] = [list(values[s:e]) for (s, e) in zip(offsets[:-1], offsets[1:])]
+
+        return out
+
+    return column.to_numpy()
+
+
+def eventFrame(table, addressBook=None):
+    """
+    Convert a table read with `readEvents` into a DataFrame with the
+    values in the same form as the JSON readable events -- Addresses are
+    checksum strings, hashes are hex strings, wide integers are exact
+    Python ints and symbols are categoricals
+
+    Parameters
+    ----------
+    table : pa.Table
+    addressBook : acx.addresses.AddressBook
+        When given, addresses are converted straight into their ids
+        rather than into checksum strings
+
+    Returns
+    -------
+    df : pd.DataFrame
+    """
+    columns = {
+        field.name: _decodeColumn(table.column(field.name), field.type, addressBook)
+        for field in table.schema
+    }
+
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(table)))
+
+
+def readEventFrame(path, columns=None, filters=None, addressBook=None):
+    "Read events (see `readEvents`) straight into a DataFrame (see `eventFrame`)"
+    return eventFrame(
+        readEvents(path, columns=columns, filters=filters), addressBook=addressBook
+    )
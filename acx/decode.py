@@ -0,0 +1,309 @@
+import numpy as np
+
+from eth_abi import decode_abi
+from eth_utils import (
+    encode_hex, event_abi_to_log_topic, to_checksum_address
+)
+from hexbytes import HexBytes
+
+
+# Number of bytes in an ABI word
+WORD = 32
+
+
+def _isDynamic(abiType):
+    "Whether an ABI type is encoded out of line (i.e. behind an offset)"
+    if abiType in ["bytes", "string"] or abiType.endswith("[]"):
+        return True
+    if abiType.endswith("]"):
+        return _isDynamic(abiType[:abiType.rindex("[")])
+
+    return False
+
+
+def _flattenInputs(inputs, prefix=""):
+    """
+    Flattens (possibly nested) static tuples into a list of
+    (columnName, abiType) pairs in the order in which they are encoded
+    """
+    out = []
+    for x in inputs:
+        name = prefix + x["name"]
+        if x["type"] == "tuple":
+            out.extend(_flattenInputs(x["components"], name + "."))
+        else:
+            out.append((name, x["type"]))
+
+    return out
+
+
+def _tupleType(x):
+    "Converts an ABI input into the type string understood by `eth_abi`"
+    if x["type"].startswith("tuple"):
+        inner = ",".join(_tupleType(c) for c in x["components"])
+        return f"({inner}){x['type'][len('tuple'):]}"
+
+    return x["type"]
+
+
+def _flattenValues(values, inputs, normalize):
+    """
+    Flattens nested tuples of decoded values to match `_flattenInputs` --
+    Every other value is passed through `normalize(value, input)`
+    """
+    out = []
+    for (v, x) in zip(values, inputs):
+        if x["type"] == "tuple":
+            out.extend(_flattenValues(v, x["components"], normalize))
+        else:
+            out.append(normalize(v, x))
+
+    return out
+
+
+def _hexToWords(hexStrings, nWords):
+    """
+    Converts a list of equal length hex strings into a
+    (len(hexStrings), nWords, 32) array of bytes
+    """
+    if len(hexStrings) == 0:
+        return np.zeros((0, nWords, WORD), dtype=np.uint8)
+
+    buffer = bytes.fromhex("".join(x[2:] for x in hexStrings))
+    words = np.frombuffer(buffer, dtype=np.uint8)
+
+    return words.reshape(len(hexStrings), -1, WORD)[:, :nWords, :]
+
+
+class EventDecoder:
+    """
+    Decodes the raw logs (as returned by `eth_getLogs`) of a single event
+    into typed columns
+
+    All of the logs in a chunk are decoded together -- Each ABI word is
+    sliced out of a single byte array rather than decoding one log at a
+    time. Static tuples (like the `depositData` of the v1 BridgePool
+    `DepositRelayed` event) are flattened into one column per component
+    named `{tuple}.{component}`.
+
+    Columns are numpy arrays: (u)int types of at most 64 bits are stored
+    as `uint64`/`int64`, bools as `bool` and everything else (addresses,
+    larger integers and bytes) as `object` arrays of checksum address
+    strings, exact Python ints and bytes respectively.
+
+    Parameters
+    ----------
+    eventAbi : dict
+        The ABI of the event
+    """
+    def __init__(self, eventAbi):
+        self.abi = eventAbi
+        self.name = eventAbi["name"]
+        self.topic = encode_hex(event_abi_to_log_topic(eventAbi))
+
+        self.indexedInputs = [x for x in eventAbi["inputs"] if x["indexed"]]
+        self.dataInputs = [x for x in eventAbi["inputs"] if not x["indexed"]]
+
+        # Indexed values are always a single word (dynamic types are
+        # replaced by their hash)
+        self.topicColumns = [
+            (x["name"], x["type"] if not _isDynamic(x["type"]) else "bytes32")
+            for x in self.indexedInputs
+        ]
+        self.dataColumns = _flattenInputs(self.dataInputs)
+        self.dynamic = any(
+            _isDynamic(_tupleType(x)) for x in self.dataInputs
+        )
+
+        self._addresses = {}
+
+    def _checksum(self, raw):
+        "Checksum addresses are expensive so they are memoized"
+        address = self._addresses.get(raw)
+        if address is None:
+            address = to_checksum_address(raw)
+            self._addresses[raw] = address
+
+        return address
+
+    def _normalize(self, value, x):
+        """
+        Converts a value decoded by `eth_abi` to the column layout --
+        Arrays (which `eth_abi` decodes as tuples) become lists and
+        addresses (which it leaves lowercase) are checksummed
+        """
+        abiType = x["type"]
+        if abiType.endswith("]"):
+            element = dict(x, type=abiType[:abiType.rindex("[")])
+            return [self._normalize(v, element) for v in value]
+        if abiType == "tuple":
+            return [self._normalize(v, c) for (v, c) in zip(value, x["components"])]
+        if abiType == "address":
+            return self._checksum(value)
+
+        return value
+
+    def _decodeWords(self, words, abiType):
+        "Decodes a (n, 32) array of words that share the same ABI type"
+        n = words.shape[0]
+
+        if abiType == "address":
+            raw = words[:, WORD - 20:].tobytes()
+            return np.array(
+                [self._checksum(raw[20*i:20*(i + 1)]) for i in range(n)],
+                dtype=object
+            )
+
+        if abiType == "bool":
+            return words[:, WORD - 1] != 0
+
+        if abiType.startswith("uint") or abiType.startswith("int"):
+            signed = abiType.startswith("int")
+            bits = int(abiType[len("int") + (not signed):] or 256)
+            if bits <= 64:
+                dtype = ">i8" if signed else ">u8"
+                return (
+                    np.ascontiguousarray(words[:, WORD - 8:])
+                    .view(dtype)
+                    .ravel()
+                    .astype(np.int64 if signed else np.uint64)
+                )
+
+            raw = np.ascontiguousarray(words).tobytes()
+            return np.array(
+                [
+                    int.from_bytes(
+                        raw[WORD*i:WORD*(i + 1)], "big", signed=signed
+                    )
+                    for i in range(n)
+                ],
+                dtype=object
+            )
+
+        if abiType.startswith("bytes"):
+            size = int(abiType[len("bytes"):])
+            raw = np.ascontiguousarray(words[:, :size]).tobytes()
+            return np.array(
+                [raw[size*i:size*(i + 1)] for i in range(n)], dtype=object
+            )
+
+        raise ValueError(f"Can't decode {abiType} from a single word")
+
+    def _decodeDynamic(self, logs):
+        "Falls back to `eth_abi` for events with dynamic data"
+        types = [_tupleType(x) for x in self.dataInputs]
+
+        rows = [
+            _flattenValues(
+                decode_abi(types, HexBytes(log["data"])), self.dataInputs,
+                self._normalize
+            )
+            for log in logs
+        ]
+
+        # Filled one value at a time so that arrays stay a single value
+        columns = {}
+        for (i, (name, _)) in enumerate(self.dataColumns):
+            columns[name] = np.empty(len(rows), dtype=object)
+            for (j, row) in enumerate(rows):
+                columns[name][j] = row[i]
+
+        return columns
+
+    def decode(self, logs):
+        """
+        Decode a list of raw logs
+
+        Parameters
+        ----------
+        logs : list(dict)
+            Raw logs as returned by `eth_getLogs` (hex strings for
+            `data`, `topics`, `blockNumber`, etc...). All logs must belong
+            to this event
+
+        Returns
+        -------
+        columns : dict(str, np.array)
+            Metadata columns (`blockNumber`, `logIndex`,
+            `transactionIndex`, `transactionHash`, `blockHash` and
+            `address`) followed by one column per (flattened) argument
+        """
+        n = len(logs)
+        columns = {
+            "blockNumber": np.array(
+                [int(x["blockNumber"], 16) for x in logs], dtype=np.int64
+            ),
+            "logIndex": np.array(
+                [int(x["logIndex"], 16) for x in logs], dtype=np.int64
+            ),
+            "transactionIndex": np.array(
+                [int(x["transactionIndex"], 16) for x in logs], dtype=np.int64
+            ),
+            "transactionHash": np.array(
+                [x["transactionHash"] for x in logs], dtype=object
+            ),
+            "blockHash": np.array([x["blockHash"] for x in logs], dtype=object),
+            "address": np.array(
+                [self._checksum(x["address"]) for x in logs], dtype=object
+            ),
+        }
+
+        # Indexed arguments -- topics[0] is the event signature
+        for (i, (name, abiType)) in enumerate(self.topicColumns):
+            words = _hexToWords([x["topics"][i + 1] for x in logs], 1)
+            columns[name] = self._decodeWords(words.reshape(n, WORD), abiType)
+
+        # Non-indexed arguments
+        if self.dynamic:
+            columns.update(self._decodeDynamic(logs))
+        else:
+            words = _hexToWords(
+                [x["data"] for x in logs], len(self.dataColumns)
+            )
+            for (i, (name, abiType)) in enumerate(self.dataColumns):
+                columns[name] = self._decodeWords(words[:, i, :], abiType)
+
+        return columns
+
+    def toEvents(self, columns):
+        """
+        Convert decoded columns back into the JSON readable dictionaries
+        produced by `acx.utils.findEvents`
+
+        Tuples are rebuilt as lists of their components and bytes are
+        hex encoded (without a leading `0x`) to match `Web3JsonEncoder`
+        """
+        def jsonable(x):
+            if isinstance(x, bytes):
+                return x.hex()
+            if isinstance(x, np.generic):
+                return x.item()
+            if isinstance(x, list):
+                return [jsonable(y) for y in x]
+
+            return x
+
+        def buildArg(x, row, prefix=""):
+            name = prefix + x["name"]
+            if x["type"] == "tuple" and not x.get("indexed", False):
+                return [buildArg(c, row, name + ".") for c in x["components"]]
+
+            return jsonable(columns[name][row])
+
+        events = []
+        for row in range(len(columns["blockNumber"])):
+            events.append({
+                "args": {
+                    x["name"]: buildArg(x, row) for x in self.abi["inputs"]
+                },
+                "event": self.name,
+                "logIndex": int(columns["logIndex"][row]),
+                "transactionIndex": int(columns["transactionIndex"][row]),
+                "transactionHash": columns["transactionHash"][row],
+                "address": columns["address"][row],
+                "blockHash": columns["blockHash"][row],
+                "blockNumber": int(columns["blockNumber"][row]),
+            })
+
+        return events
+
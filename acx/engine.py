@@ -0,0 +1,56 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+async def _runJobs(jobs, limits, defaultLimit):
+    loop = asyncio.get_running_loop()
+
+    # One semaphore per endpoint so that a chain with many jobs (i.e. many
+    # pools) can't hog the thread pool or hammer its RPC node
+    keys = set(key for (key, _) in jobs)
+    semaphores = {
+        key: asyncio.Semaphore(limits.get(key, defaultLimit)) for key in keys
+    }
+    nThreads = max(1, sum(limits.get(key, defaultLimit) for key in keys))
+
+    with ThreadPoolExecutor(max_workers=nThreads) as executor:
+        async def run(key, fn):
+            async with semaphores[key]:
+                return await loop.run_in_executor(executor, fn)
+
+        return await asyncio.gather(*[run(key, fn) for (key, fn) in jobs])
+
+
+def runJobs(jobs, limits=None, defaultLimit=1):
+    """
+    Run blocking collection jobs that talk to independent endpoints at the
+    same time
+
+    Each job is a zero argument callable (use `functools.partial` to bind
+    arguments) tagged with the endpoint it talks to, i.e. the chain's
+    short name. Jobs for different endpoints run concurrently while the
+    number of jobs running against a single endpoint is capped, so the
+    total time is roughly that of the slowest endpoint rather than the
+    sum over all endpoints
+
+    Parameters
+    ----------
+    jobs : list(tuple(str, callable))
+        Pairs of an endpoint key and the job to run
+    limits : dict(str, int), optional
+        The maximum number of jobs that can run at once for each endpoint
+        key (i.e. `params["rpc_concurrency"]`)
+    defaultLimit : int
+        The limit used for endpoint keys that aren't in `limits`
+
+    Returns
+    -------
+    results : list
+        The value returned by each job in the same order as `jobs`
+    """
+    jobs = list(jobs)
+    if len(jobs) == 0:
+        return []
+
+    return asyncio.run(_runJobs(jobs, limits or {}, defaultLimit))
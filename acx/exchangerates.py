@@ -0,0 +1,301 @@
+import numpy as np
+import pandas as pd
+
+from acx.addresses import ZERO_ADDRESS
+
+
+# Exchange rates, fee percentages and fee rates are fixed point numbers
+# with 18 decimals
+FIXED_POINT = 10**18
+
+# The changes to a pool that move its exchange rate -- Mints and burns of
+# LP tokens, LP fees that are allocated right after the accumulated fees
+# are updated (v1 `settleRelay`) and LP fees that are allocated without
+# updating them (v2 `executeRootBundle`)
+MINT = "mint"
+BURN = "burn"
+SETTLE = "settle"
+BUNDLE = "bundle"
+
+
+class PoolAccounting:
+    """
+    Replays the LP token accounting of a v1 BridgePool or of one of the
+    v2 HubPool's pooled tokens with the contracts' integer math
+
+    Both contracts value an LP token at (liquidReserves + utilizedReserves
+    - undistributedLpFees) / totalSupply. Moving tokens between liquid and
+    utilized reserves (relays, bridging, syncs) doesn't change the sum, so
+    only three things move the rate:
+
+    * Liquidity is added/removed at the current rate, which changes the
+      reserves and the supply but not the rate (up to rounding)
+    * LP fees are added to both the reserves and `undistributedLpFees`,
+      which doesn't change the rate either
+    * Every time the accumulated fees are updated `undistributedLpFees`
+      shrinks by `undistributedLpFees * lpFeeRatePerSecond * seconds since
+      the last update` (capped at all of them), which raises the rate
+
+    Parameters
+    ----------
+    lpFeeRatePerSecond : int
+        The pool's (fixed point) `lpFeeRatePerSecond`
+    createdAt : int
+        The timestamp that the pool was created (or the token enabled on
+        the hub) at -- Both contracts start `lastLpFeeUpdate` there and
+        `exchangeRateCurrent` doesn't move it while there are no LP tokens
+    """
+    def __init__(self, lpFeeRatePerSecond, createdAt):
+        self.lpFeeRatePerSecond = int(lpFeeRatePerSecond)
+        self.reserves = 0
+        self.undistributed = 0
+        self.supply = 0
+        self.lastUpdate = int(createdAt)
+
+    def accumulatedFees(self, timestamp):
+        "The fees that an update at `timestamp` would pay out (`_getAccumulatedFees`)"
+        if self.undistributed == 0:
+            return 0
+        elapsed = int(timestamp) - self.lastUpdate
+        fees = self.undistributed * self.lpFeeRatePerSecond * elapsed // FIXED_POINT
+
+        return min(fees, self.undistributed)
+
+    def update(self, timestamp):
+        "Pay out the accumulated fees (`_updateAccumulatedLpFees`)"
+        self.undistributed -= self.accumulatedFees(timestamp)
+        self.lastUpdate = int(timestamp)
+
+    def rate(self, timestamp):
+        """
+        The exchange rate that `exchangeRateCurrent` returns at
+        `timestamp` without changing the state (i.e. an `eth_call`)
+        """
+        if self.supply == 0:
+            return FIXED_POINT
+        undistributed = self.undistributed - self.accumulatedFees(timestamp)
+
+        return (self.reserves - undistributed) * FIXED_POINT // self.supply
+
+    def _exchangeRateCurrent(self, timestamp):
+        # The contracts return 1:1 without updating anything while there
+        # are no LP tokens
+        if self.supply == 0:
+            return FIXED_POINT
+        self.update(timestamp)
+
+        return (self.reserves - self.undistributed) * FIXED_POINT // self.supply
+
+    def apply(self, kind, amount, timestamp):
+        """
+        Apply one change to the pool
+
+        Parameters
+        ----------
+        kind : str
+            `MINT`, `BURN`, `SETTLE` or `BUNDLE`
+        amount : int
+            LP tokens minted/burnt or LP fees allocated
+        timestamp : int
+            The timestamp of the change's block
+        """
+        amount = int(amount)
+        if kind == MINT:
+            # `addLiquidity` mints `amount * 1e18 // rate` so the smallest
+            # deposit that mints `amount` LP tokens is added
+            rate = self._exchangeRateCurrent(timestamp)
+            self.reserves += -(-amount * rate // FIXED_POINT)
+            self.supply += amount
+        elif kind == BURN:
+            rate = self._exchangeRateCurrent(timestamp)
+            self.reserves -= amount * rate // FIXED_POINT
+            self.supply -= amount
+        elif kind in [SETTLE, BUNDLE]:
+            if kind == SETTLE:
+                self.update(timestamp)
+            self.reserves += amount
+            self.undistributed += amount
+        else:
+            raise ValueError(f"Unknown pool change {kind}")
+
+
+def exchangeRates(changes, lpFeeRatePerSecond, createdAt, blocks, timestamps):
+    """
+    Rebuild a pool's exchange rate at any blocks from its changes
+
+    Parameters
+    ----------
+    changes : pd.DataFrame
+        The `block`, `logIndex`, `kind`, `amount` and `timestamp` of every
+        change to the pool since it was created (see `v1PoolChanges` and
+        `v2PoolChanges`)
+    lpFeeRatePerSecond : int
+        The pool's `lpFeeRatePerSecond`
+    createdAt : int
+        The timestamp that the pool was created at (see `PoolAccounting`)
+    blocks : array-like(int)
+        The blocks to compute the rate at -- The rate at a block is the
+        one seen after all of the block's transactions (like an `eth_call`
+        at the block)
+    timestamps : array-like(int)
+        The timestamp of each of `blocks`
+
+    Returns
+    -------
+    rates : list(int)
+        The (fixed point) exchange rate at each of `blocks`
+    """
+    changes = changes.sort_values(["block", "logIndex"])
+    changeBlocks = changes["block"].to_numpy()
+    changeRows = list(zip(changes["kind"], changes["amount"], changes["timestamp"]))
+
+    blocks = np.asarray(blocks, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    order = np.argsort(blocks, kind="stable")
+
+    pool = PoolAccounting(lpFeeRatePerSecond, createdAt)
+    rates = [None]*len(blocks)
+    applied = 0
+    for i in order:
+        upto = np.searchsorted(changeBlocks, blocks[i], side="right")
+        for (kind, amount, timestamp) in changeRows[applied:upto]:
+            pool.apply(kind, amount, timestamp)
+        applied = max(applied, upto)
+        rates[i] = pool.rate(timestamps[i])
+
+    return rates
+
+
+def mintsAndBurns(transfers):
+    """
+    The mints (transfers from the zero address) and burns (transfers to
+    the zero address) of LP tokens
+
+    Parameters
+    ----------
+    transfers : pd.DataFrame
+        The `blockNumber`, `logIndex`, `from`, `to`, `value` and `symbol`
+        of each transfer (see `acx.columnar.readEventFrame`)
+    """
+    out = []
+    for (column, kind) in [("from", MINT), ("to", BURN)]:
+        x = transfers.loc[transfers[column] == ZERO_ADDRESS, :]
+        out.append(pd.DataFrame({
+            "symbol": x["symbol"].astype(str).to_numpy(),
+            "block": x["blockNumber"].to_numpy(),
+            "logIndex": x["logIndex"].to_numpy(),
+            "kind": kind,
+            "amount": x["value"].to_numpy(),
+        }))
+
+    return pd.concat(out, ignore_index=True)
+
+
+def v1PoolChanges(transfers, settled, relays):
+    """
+    Every change to the v1 BridgePools -- A settled relay allocates
+    `realizedLpFeePct * amount` of LP fees, where the amount comes from
+    the relay's `DepositRelayed` event
+
+    Parameters
+    ----------
+    transfers : pd.DataFrame
+        The pools' LP token transfers (see `mintsAndBurns`)
+    settled : pd.DataFrame
+        The `blockNumber`, `logIndex`, `depositHash`,
+        `relay.realizedLpFeePct` and `symbol` of each `RelaySettled` event
+    relays : pd.DataFrame
+        The `depositHash` and `depositData.amount` of each
+        `DepositRelayed` event
+
+    Returns
+    -------
+    changes : pd.DataFrame
+        The `symbol`, `block`, `logIndex`, `kind` and `amount` of each change
+    """
+    amounts = (
+        relays.drop_duplicates("depositHash")
+        .set_index("depositHash")["depositData.amount"]
+    )
+    missing = ~settled["depositHash"].isin(amounts.index)
+    if missing.any():
+        raise ValueError(f"{missing.sum()} settled relays have no DepositRelayed event")
+
+    settledAmounts = amounts.loc[settled["depositHash"]].to_numpy()
+    fees = [
+        int(pct) * int(amount) // FIXED_POINT
+        for (pct, amount) in zip(settled["relay.realizedLpFeePct"], settledAmounts)
+    ]
+    settles = pd.DataFrame({
+        "symbol": settled["symbol"].astype(str).to_numpy(),
+        "block": settled["blockNumber"].to_numpy(),
+        "logIndex": settled["logIndex"].to_numpy(),
+        "kind": SETTLE,
+        "amount": np.array(fees, dtype=object),
+    })
+
+    return pd.concat([mintsAndBurns(transfers), settles], ignore_index=True)
+
+
+def v2PoolChanges(transfers, bundles, feeCaptures, l1Tokens):
+    """
+    Every change to the v2 HubPool's pooled tokens -- Each executed root
+    bundle leaf allocates its `bundleLpFees` less the protocol's share
+    (the latest `ProtocolFeeCaptureSet` before it, none before the first)
+
+    Parameters
+    ----------
+    transfers : pd.DataFrame
+        The LP tokens' transfers (see `mintsAndBurns`)
+    bundles : pd.DataFrame
+        The `blockNumber`, `logIndex`, `l1Tokens` and `bundleLpFees` of
+        each `RootBundleExecuted` event
+    feeCaptures : pd.DataFrame
+        The `blockNumber`, `logIndex` and `newProtocolFeeCapturePct` of
+        each `ProtocolFeeCaptureSet` event
+    l1Tokens : dict(str, str)
+        The L1 token address of each symbol
+
+    Returns
+    -------
+    changes : pd.DataFrame
+        The `symbol`, `block`, `logIndex`, `kind` and `amount` of each change
+    """
+    symbols = {address.lower(): symbol for (symbol, address) in l1Tokens.items()}
+
+    # One row per (leaf, token) of the tracked tokens
+    leaves = (
+        bundles.loc[:, ["blockNumber", "logIndex", "l1Tokens", "bundleLpFees"]]
+        .explode(["l1Tokens", "bundleLpFees"])
+        .dropna(subset=["l1Tokens"])
+        .assign(symbol=lambda x: x["l1Tokens"].str.lower().map(symbols))
+        .dropna(subset=["symbol"])
+    )
+
+    # The protocol's share in effect when each leaf was executed -- Events
+    # are ordered by (block, log index)
+    def order(x):
+        return (
+            x["blockNumber"].to_numpy(dtype=np.int64) * 2**32
+            + x["logIndex"].to_numpy(dtype=np.int64)
+        )
+
+    captures = feeCaptures.sort_values(["blockNumber", "logIndex"])
+    capturePcts = [0] + [int(x) for x in captures["newProtocolFeeCapturePct"]]
+    pcts = [
+        capturePcts[i]
+        for i in np.searchsorted(order(captures), order(leaves), side="right")
+    ]
+    fees = [
+        int(fee) - int(fee) * pct // FIXED_POINT
+        for (fee, pct) in zip(leaves["bundleLpFees"], pcts)
+    ]
+    allocations = pd.DataFrame({
+        "symbol": leaves["symbol"].to_numpy(),
+        "block": leaves["blockNumber"].to_numpy(dtype=np.int64),
+        "logIndex": leaves["logIndex"].to_numpy(dtype=np.int64),
+        "kind": BUNDLE,
+        "amount": np.array(fees, dtype=object),
+    })
+
+    return pd.concat([mintsAndBurns(transfers), allocations], ignore_index=True)
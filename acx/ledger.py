@@ -0,0 +1,202 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from acx.manifest import recordRead, recordWrite
+
+
+# Every change point of a (symbol, lp) position
+LEDGER_COLUMNS = ["symbol", "lp", "block", "amount", "balance"]
+
+
+def buildLedger(transfers, symbols, exclude=()):
+    """
+    Build a sparse balance ledger from LP token transfers
+
+    The ledger holds one row for each block in which an LP's position in
+    a pool changed -- The transfers of a (symbol, lp) in the same block
+    are netted into a single `amount` and `balance` is the position after
+    the block. Blocks that net to zero are kept so that every address
+    that ever held (or moved) LP tokens is in the ledger. Rows are sorted
+    by symbol, lp and block
+
+    Parameters
+    ----------
+    transfers : pd.DataFrame
+        The `block`, `lp`, `symbol` and (signed) `amount` of each side of
+        every transfer (see `lp_cumulative.processTransfers`)
+    symbols : list(str)
+        The pools that are tracked -- Transfers of other symbols are
+        dropped
+    exclude : list(int)
+        LPs that aren't tracked (i.e. the zero address used when
+        minting/burning)
+
+    Returns
+    -------
+    ledger : pd.DataFrame
+        The `symbol`, `lp`, `block`, `amount` and `balance` of each change
+        point
+    """
+    keep = transfers["symbol"].isin(symbols) & ~transfers["lp"].isin(list(exclude))
+    ledger = (
+        transfers.loc[keep, ["symbol", "lp", "block", "amount"]]
+        .assign(symbol=lambda x: pd.Categorical(x["symbol"], categories=symbols))
+        .groupby(["symbol", "lp", "block"], observed=True, sort=True)
+        ["amount"]
+        .sum()
+        .reset_index()
+    )
+    ledger["balance"] = ledger.groupby(["symbol", "lp"], observed=True)["amount"].cumsum()
+
+    return ledger
+
+
+def writeLedger(path, ledger):
+    "Save a ledger built with `buildLedger` as a zstd compressed parquet file"
+    pq.write_table(
+        pa.Table.from_pandas(ledger.loc[:, LEDGER_COLUMNS], preserve_index=False),
+        path, compression="zstd"
+    )
+    recordWrite(path, len(ledger))
+
+
+def readLedger(path, columns=None, filters=None):
+    """
+    Read a ledger saved with `writeLedger`
+
+    Parameters
+    ----------
+    path : str
+        The file to read
+    columns : list(str)
+        Only read these columns (all of them by default)
+    filters : list(tuple)
+        Row filters in the format of `pyarrow.parquet.read_table` (e.g.
+        `[("block", "<=", block)]`)
+
+    Returns
+    -------
+    ledger : pd.DataFrame
+    """
+    ledger = pq.read_table(path, columns=columns, filters=filters).to_pandas()
+    recordRead(path, len(ledger))
+
+    return ledger
+
+
+def holders(ledger, lastBlock, threshold=1e-18):
+    "The LPs whose position in any pool exceeded `threshold` by `lastBlock`"
+    held = (ledger["block"] <= lastBlock) & (ledger["balance"] > threshold)
+
+    return ledger.loc[held, "lp"].unique()
+
+
+def ledgerBalances(ledger, block):
+    """
+    Every (symbol, lp) position after `block`
+
+    Returns
+    -------
+    balances : pd.DataFrame
+        The `symbol`, `lp` and `balance` of each position that had changed
+        by `block` (including positions that are back to zero)
+    """
+    return (
+        ledger.loc[ledger["block"] <= block, ["symbol", "lp", "block", "balance"]]
+        .sort_values(["symbol", "lp", "block"])
+        .groupby(["symbol", "lp"], observed=True)
+        .last()
+        .reset_index()
+        .loc[:, ["symbol", "lp", "balance"]]
+    )
+
+
+def ledgerHash(ledger, block, book):
+    """
+    A hash of the ledger's history through `block` -- The `symbol`, `lp`,
+    `block` and `amount` of every row at or before `block`
+
+    LPs are hashed as addresses since ids change whenever the address
+    book gains an address. An id's position matches its address's sorted
+    position, so rows are put in a canonical order without touching the
+    addresses themselves
+
+    Parameters
+    ----------
+    ledger : pd.DataFrame
+        The ledger (at least its `symbol`, `lp`, `block` and `amount`)
+    block : int
+        The last block of history that is hashed
+    book : AddressBook
+        Maps the ledger's LP ids to addresses
+
+    Returns
+    -------
+    hash : str
+        The hex sha256 digest of the rows
+    """
+    rows = ledger.loc[ledger["block"] <= block, ["symbol", "lp", "block", "amount"]]
+    symbols = rows["symbol"].cat.codes.to_numpy(dtype=np.int64)
+    lps = rows["lp"].to_numpy(dtype=np.int64)
+    blocks = rows["block"].to_numpy(dtype=np.int64)
+    amounts = rows["amount"].to_numpy(dtype=np.float64)
+    order = np.lexsort((amounts, blocks, lps, symbols))
+
+    h = hashlib.sha256()
+    h.update("\0".join(rows["symbol"].cat.categories.astype(str)).encode())
+    h.update(np.ascontiguousarray(symbols[order]).tobytes())
+    h.update(np.ascontiguousarray(book.raw[lps[order]]).tobytes())
+    h.update(np.ascontiguousarray(blocks[order]).tobytes())
+    h.update(np.ascontiguousarray(amounts[order]).tobytes())
+
+    return h.hexdigest()
+
+
+def changeIntervals(ledger):
+    """
+    The blocks that each ledger row's balance is held for
+
+    Returns
+    -------
+    start : np.array(int64)
+        The block that the balance was reached in
+    stop : np.array(int64)
+        The next block that the (symbol, lp) changed in (or the largest
+        int64 for the last change) -- The balance is held from `start` up
+        to, but not including, `stop`
+    """
+    start = ledger["block"].to_numpy(dtype=np.int64)
+    sameKey = (
+        (ledger["symbol"].to_numpy()[1:] == ledger["symbol"].to_numpy()[:-1]) &
+        (ledger["lp"].to_numpy()[1:] == ledger["lp"].to_numpy()[:-1])
+    )
+    stop = np.full(len(start), np.iinfo(np.int64).max, dtype=np.int64)
+    stop[:-1][sameKey] = start[1:][sameKey]
+
+    return start, stop
+
+
+def poolTotals(ledger):
+    """
+    The total position of every LP in each pool after each block that
+    any position changed in
+
+    Returns
+    -------
+    totals : pd.DataFrame
+        Indexed by block with one column per symbol
+    """
+    return (
+        ledger
+        .pivot_table(
+            index="block", columns="symbol", values="amount", aggfunc="sum",
+            observed=False
+        )
+        .fillna(0.0)
+        .sort_index()
+        .cumsum()
+    )
@@ -0,0 +1,667 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from acx.ledger import changeIntervals, ledgerBalances, ledgerHash, poolTotals
+
+
+def dayWindows(dayStarts, startBlock, endBlock):
+    """
+    The (inclusive) block window of each day between `startBlock` and
+    `endBlock` that LP rewards are paid over
+
+    A day runs from its first block to the block before the next day's
+    first block (clipped to `startBlock`/`endBlock`). Days that would be
+    a single block are skipped, like in `lp_rewards.computeLpRewards`
+
+    Parameters
+    ----------
+    dayStarts : pd.DataFrame
+        The first `block` of each `date` (see `BlockStore.dayStarts`)
+    startBlock : int
+        The block to start tracking rewards at
+    endBlock : int
+        The block to stop tracking rewards at
+
+    Returns
+    -------
+    windows : pd.DataFrame
+        The `date`, `start` and `end` block of each day
+    """
+    blocks = dayStarts["block"].to_numpy(dtype=np.int64)
+    startIdx = np.searchsorted(blocks, startBlock, side="right") - 1
+    endIdx = np.searchsorted(blocks, endBlock, side="right") - 1
+    assert(startIdx >= 0)
+
+    days = dayStarts.iloc[startIdx:endIdx + 1]
+    dayBlocks = days["block"].to_numpy(dtype=np.int64)
+
+    starts = np.maximum(startBlock, dayBlocks)
+    ends = np.append(np.minimum(dayBlocks[1:], endBlock) - 1, endBlock)
+    keep = starts != ends
+
+    return pd.DataFrame({
+        "date": days["date"].to_numpy()[keep],
+        "start": starts[keep],
+        "end": ends[keep],
+    })
+
+
+def dailyMultipliers(exchangeRates, prices):
+    """
+    The USD value of one LP token of each pool on each day (price times
+    exchange rate)
+
+    Parameters
+    ----------
+    exchangeRates : pd.DataFrame
+        The `date`, `symbol` and `exchangeRate` of each pool
+    prices : pd.DataFrame
+        The `price` of each token indexed by `date` and `symbol`
+
+    Returns
+    -------
+    multipliers : pd.DataFrame
+        Indexed by date with one column per symbol
+    """
+    return (
+        exchangeRates.loc[:, ["date", "symbol", "exchangeRate"]]
+        .merge(prices.loc[:, ["price"]].reset_index(), on=["date", "symbol"], how="left")
+        .assign(multiplier=lambda x: x["price"] * x["exchangeRate"])
+        .pivot_table(index="date", columns="symbol", values="multiplier", aggfunc="first", dropna=False)
+    )
+
+
+def rewardPoints(windows, changeBlocks):
+    """
+    The blocks at which the reward accumulator is updated -- The first
+    and last block of each day and every block in between in which a
+    position changed
+
+    Returns
+    -------
+    points : np.array(int64)
+        The blocks in increasing order
+    day : np.array(int64)
+        The position in `windows` of each point's day
+    weight : np.array(float)
+        The number of blocks each point's state is held for -- The last
+        block of each day is only held for itself
+    """
+    starts = windows["start"].to_numpy(dtype=np.int64)
+    ends = windows["end"].to_numpy(dtype=np.int64)
+
+    changeDay = np.searchsorted(starts, changeBlocks, side="right") - 1
+    inner = changeDay >= 0
+    inner[inner] = (
+        (changeBlocks[inner] > starts[changeDay[inner]]) &
+        (changeBlocks[inner] < ends[changeDay[inner]])
+    )
+
+    nDays = len(windows)
+    points = np.concatenate([starts, changeBlocks[inner], ends])
+    day = np.concatenate([np.arange(nDays), changeDay[inner], np.arange(nDays)])
+    isEnd = np.concatenate([
+        np.zeros(nDays + inner.sum(), dtype=bool), np.ones(nDays, dtype=bool)
+    ])
+
+    order = np.argsort(points, kind="stable")
+    points, day, isEnd = points[order], day[order], isEnd[order]
+    assert((len(points) == 0) or (np.diff(points) > 0).all())
+
+    weight = np.append(np.diff(points), 1).astype(float)
+    weight[isEnd] = 1.0
+
+    return points, day, weight
+
+
+def accumulatorRewards(ledger, windows, multipliers, rewardPerBlock):
+    """
+    Compute LP rewards with a cumulative reward-per-share accumulator
+
+    Each block pays out `rewardPerBlock` pro rata to the USD value of
+    every position, so a block adds `rewardPerBlock / (USD value of all
+    pools)` to the rewards earned by each USD of liquidity and `multiplier
+    * rewardPerBlock / (USD value of all pools)` to the rewards earned by
+    each LP token of a pool. These only change at the points of
+    `rewardPoints` (position changes and day boundaries, which is when
+    prices and exchange rates change), so the per-token accumulator of
+    each pool is a cumulative sum over the points. A ledger row then earns
+    its balance times the growth of its pool's accumulator over the blocks
+    it was held for. The cost scales with the number of ledger rows and
+    days rather than with the number of LPs. Gives the same rewards as
+    `lp_rewards.computeLpRewards`
+
+    Parameters
+    ----------
+    ledger : pd.DataFrame
+        The sparse balance ledger (see `acx.ledger.buildLedger`)
+    windows : pd.DataFrame
+        The block window of each day (see `dayWindows`)
+    multipliers : pd.DataFrame
+        The USD value of an LP token of each pool on each day (see
+        `dailyMultipliers`)
+    rewardPerBlock : float
+        The number of rewards paid out each block
+
+    Returns
+    -------
+    rewards : pd.Series
+        The rewards earned by each LP (indexed by address id)
+    """
+    symbols = list(ledger["symbol"].cat.categories.astype(str))
+    lps = ledger["lp"].to_numpy()
+    ledgerLps = np.unique(lps)
+    if (len(windows) == 0) or (len(ledgerLps) == 0):
+        return pd.Series(np.zeros(len(ledgerLps)), index=ledgerLps)
+
+    # Multiplier of each pool on each day
+    dailyMult = multipliers.reindex(index=windows["date"], columns=symbols).to_numpy()
+
+    # Total LP tokens of each pool at each point
+    totals = poolTotals(ledger).reindex(columns=symbols, fill_value=0.0)
+    changeBlocks = totals.index.to_numpy(dtype=np.int64)
+    points, day, weight = rewardPoints(windows, changeBlocks)
+
+    totalIdx = np.searchsorted(changeBlocks, points, side="right") - 1
+    pointTotals = totals.to_numpy()[np.maximum(totalIdx, 0), :] * (totalIdx >= 0)[:, None]
+
+    # Pools with liquidity need prices -- Empty pools don't matter
+    pointMult = dailyMult[day, :]
+    missing = np.isnan(pointMult) & (pointTotals != 0)
+    if missing.any():
+        raise ValueError("Missing prices/exchange rates and cannot compute LP rewards")
+    pointMult = np.nan_to_num(pointMult)
+
+    # Rewards per USD at each point -- Points without any liquidity don't
+    # pay out any rewards
+    usdTotals = (pointTotals * pointMult).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        perUsd = np.where(usdTotals > 0, weight * rewardPerBlock / usdTotals, 0.0)
+
+    # Cumulative rewards per LP token of each pool up to (but not
+    # including) each point
+    perToken = np.vstack([
+        np.zeros((1, len(symbols))), np.cumsum(pointMult * perUsd[:, None], axis=0)
+    ])
+
+    # Every row earns its balance times the growth of its pool's
+    # accumulator while it was held
+    rowStart, rowStop = changeIntervals(ledger)
+    codes = ledger["symbol"].cat.codes.to_numpy()
+    i0 = np.searchsorted(points, rowStart, side="left")
+    i1 = np.searchsorted(points, rowStop, side="left")
+    rowRewards = ledger["balance"].to_numpy() * (perToken[i1, codes] - perToken[i0, codes])
+
+    rewards = np.bincount(lps, weights=rowRewards, minlength=ledgerLps.max() + 1)
+
+    return pd.Series(rewards[ledgerLps], index=ledgerLps)
+
+
+class LedgerArrays:
+    """
+    The arrays of a ledger that each day's rewards are computed from --
+    They can be saved as `.npy` files that worker processes memory-map
+    rather than receiving pickled copies of the ledger
+
+    Parameters
+    ----------
+    arrays : dict(str, np.array)
+        Each of `NAMES`
+    """
+    NAMES = ["lp", "symbol", "start", "stop", "balance", "changeBlocks", "totals"]
+
+    def __init__(self, arrays):
+        assert(all(name in arrays for name in self.NAMES))
+        self.arrays = arrays
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    @classmethod
+    def fromLedger(cls, ledger):
+        "The arrays of a ledger built with `acx.ledger.buildLedger`"
+        start, stop = changeIntervals(ledger)
+        totals = poolTotals(ledger)
+
+        return cls({
+            "lp": ledger["lp"].to_numpy(dtype=np.int64),
+            "symbol": ledger["symbol"].cat.codes.to_numpy(dtype=np.int64),
+            "start": start,
+            "stop": stop,
+            "balance": ledger["balance"].to_numpy(dtype=float),
+            "changeBlocks": totals.index.to_numpy(dtype=np.int64),
+            # One column per symbol in the order of the ledger's categories
+            "totals": totals.to_numpy(dtype=float),
+        })
+
+    def save(self, directory):
+        "Write each array to `{directory}/{name}.npy`"
+        os.makedirs(directory, exist_ok=True)
+        for name in self.NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), self.arrays[name])
+
+    @classmethod
+    def load(cls, directory):
+        "Memory-map arrays written with `save`"
+        return cls({
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in cls.NAMES
+        })
+
+
+def windowRewards(arrays, dailyBlockStart, dailyBlockEnd, multiplier, rewardPerBlock):
+    """
+    The rewards earned by each LP between `dailyBlockStart` and
+    `dailyBlockEnd` (inclusive) -- A single day of
+    `lp_rewards.computeLpRewards`
+
+    Within a day the USD value of every pool (and so each position's pro
+    rata share) only changes at the blocks in which some position changed.
+    Each of those blocks is given a weight of (number of blocks until the
+    next change) / (USD value of all pools), so a position's rewards are
+    its USD value times the sum of the weights of the blocks it was held
+    for -- Only the ledger's change points are ever touched rather than
+    every (block, symbol, lp) cell
+
+    Parameters
+    ----------
+    arrays : LedgerArrays
+        The ledger
+    dailyBlockStart : int
+        The first block of the day
+    dailyBlockEnd : int
+        The last block of the day
+    multiplier : np.array(float)
+        The USD value of an LP token of each pool (in the order of the
+        ledger's symbols)
+    rewardPerBlock : float
+        The number of rewards paid out each block
+
+    Returns
+    -------
+    lps : np.array(int64)
+        The LPs that held a position during the day
+    rewards : np.array(float)
+        The rewards earned by each of `lps`
+    """
+    changeBlocks = arrays["changeBlocks"]
+
+    # Today's blocks are the first and last block of the day along
+    # with every block in between in which some position changed
+    inDay = (changeBlocks > dailyBlockStart) & (changeBlocks < dailyBlockEnd)
+    dailyBlocks = np.concatenate(
+        [[dailyBlockStart], changeBlocks[inDay], [dailyBlockEnd]]
+    )
+
+    # Compute the difference between each block to "how long that
+    # relative position was held" -- The final block was manually
+    # added so it will only be valid for a single block
+    blockDiff = np.hstack([np.diff(dailyBlocks), np.ones(1)])
+
+    # USD value of all pools at each of today's blocks (using the
+    # totals after the last change at or before each block)
+    totalIdx = np.searchsorted(changeBlocks, dailyBlocks, side="right") - 1
+    dailyTotals = (
+        arrays["totals"][np.maximum(totalIdx, 0), :]
+        * (totalIdx >= 0)[:, None]
+    )
+    usdTotals = dailyTotals @ multiplier
+
+    # Weight of each block -- Blocks without any liquidity don't pay
+    # out any rewards
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(usdTotals > 0, blockDiff / usdTotals, 0.0)
+    cumWeights = np.concatenate([[0.0], np.cumsum(weights)])
+
+    # Every row's balance collects the weights of the blocks that it
+    # was held for
+    held = np.flatnonzero(
+        (arrays["start"] <= dailyBlockEnd) & (arrays["stop"] > dailyBlockStart)
+    )
+    rowWeights = (
+        cumWeights[np.searchsorted(dailyBlocks, arrays["stop"][held], side="left")]
+        - cumWeights[np.searchsorted(dailyBlocks, arrays["start"][held], side="left")]
+    )
+    rowRewards = (
+        arrays["balance"][held] * rowWeights * rewardPerBlock
+        * multiplier[arrays["symbol"][held]]
+    )
+
+    # Sum all of the rewards for each LP
+    lps, inverse = np.unique(arrays["lp"][held], return_inverse=True)
+
+    return lps, np.bincount(inverse.reshape(-1), weights=rowRewards, minlength=len(lps))
+
+
+# Ledgers that have been memory-mapped by this (worker) process
+_WORKER_ARRAYS = {}
+
+
+def windowRewardsFromDisk(directory, *args):
+    """
+    `windowRewards` on the ledger saved in `directory` (see
+    `LedgerArrays.save`) -- Used by worker processes, which only map each
+    ledger once
+    """
+    if directory not in _WORKER_ARRAYS:
+        _WORKER_ARRAYS[directory] = LedgerArrays.load(directory)
+
+    return windowRewards(_WORKER_ARRAYS[directory], *args)
+
+
+class AccrualState:
+    """
+    The LP rewards accrued through the last block of the last complete
+    day of a run along with every position at that block, so that a later
+    run (with a later end block) only computes the days after it
+
+    Rewards are accrued per unit of `rewardPerBlock` because the reward
+    per block depends on the total number of blocks and so changes
+    whenever the end block moves -- Every day's rewards are linear in it
+
+    Parameters
+    ----------
+    startBlock : int
+        The block that rewards started accruing at
+    block : int
+        The block that rewards have been accrued through -- The last block
+        of a day (or `startBlock - 1` before any day has been accrued)
+    accrued : pd.Series
+        The rewards per unit of `rewardPerBlock` of each LP (indexed by
+        address id)
+    balances : pd.DataFrame
+        The `symbol`, `lp` and `balance` of each position after `block`
+        (see `acx.ledger.ledgerBalances`)
+    multipliers : pd.DataFrame
+        The multipliers that each accrued day was computed with (see
+        `dailyMultipliers`) -- A later run only resumes when they are
+        unchanged
+    ledgerHash : str
+        The hash of the ledger's rows at or before `block` (see
+        `acx.ledger.ledgerHash`) -- A later run only resumes when the
+        ledger's history is unchanged
+    """
+    def __init__(self, startBlock, block, accrued, balances, multipliers, ledgerHash):
+        assert(block >= startBlock - 1)
+        self.startBlock = startBlock
+        self.block = block
+        self.accrued = accrued
+        self.balances = balances
+        self.multipliers = multipliers
+        self.ledgerHash = ledgerHash
+
+    @property
+    def symbols(self):
+        return list(self.balances["symbol"].cat.categories.astype(str))
+
+    def totals(self):
+        "The total position in each pool after `block`"
+        return self.balances.groupby("symbol", observed=False)["balance"].sum()
+
+    @classmethod
+    def fresh(cls, ledger, startBlock, book):
+        "The state before any rewards have been accrued"
+        block = startBlock - 1
+        symbols = list(ledger["symbol"].cat.categories.astype(str))
+
+        return cls(
+            startBlock, block,
+            pd.Series(np.zeros(0), index=pd.Index([], dtype=np.int64)),
+            ledgerBalances(ledger, block),
+            pd.DataFrame(columns=symbols, dtype=float),
+            ledgerHash(ledger, block, book)
+        )
+
+    def ledger(self, rows):
+        """
+        The ledger from `block` on -- Each nonzero position becomes a row
+        at `block` (so its `amount` is its balance) followed by `rows`
+        after `block`
+
+        Parameters
+        ----------
+        rows : pd.DataFrame
+            The ledger (or at least every row after `block`)
+        """
+        opening = (
+            self.balances.loc[self.balances["balance"] != 0, :]
+            .assign(block=self.block, amount=lambda x: x["balance"])
+        )
+        ledger = pd.concat(
+            [opening, rows.loc[rows["block"] > self.block, :]], ignore_index=True
+        )
+        ledger["symbol"] = pd.Categorical(
+            ledger["symbol"].astype(str), categories=self.symbols
+        )
+
+        return (
+            ledger.loc[:, ["symbol", "lp", "block", "amount", "balance"]]
+            .sort_values(["symbol", "lp", "block"])
+            .reset_index(drop=True)
+        )
+
+    def advance(self, ledger, block, earned, multipliers, ledgerHash):
+        """
+        The state after accruing `earned` through `block`
+
+        Parameters
+        ----------
+        ledger : pd.DataFrame
+            The ledger from this state on (see `ledger`)
+        block : int
+            The last block that `earned` was accrued through
+        earned : pd.Series
+            The rewards per unit of `rewardPerBlock` of each LP from
+            `self.block + 1` through `block`
+        multipliers : pd.DataFrame
+            The multipliers of the days that were accrued
+        ledgerHash : str
+            The hash of the ledger's rows at or before `block`
+        """
+        assert(block > self.block)
+
+        return AccrualState(
+            self.startBlock, block,
+            self.accrued.add(earned, fill_value=0.0),
+            ledgerBalances(ledger, block),
+            pd.concat([self.multipliers, multipliers]),
+            ledgerHash
+        )
+
+    def staleReason(self, startBlock, endBlock, symbols, multipliers, ledgerHash):
+        """
+        Why rewards can't be resumed from this state (or None if they can)
+
+        Parameters
+        ----------
+        startBlock, endBlock : int
+            The blocks that rewards are computed between
+        symbols : list(str)
+            The pools of the ledger
+        multipliers : pd.DataFrame
+            The current multipliers of each day (see `dailyMultipliers`)
+        ledgerHash : str
+            The hash of the current ledger's rows at or before `block`
+        """
+        if startBlock != self.startBlock:
+            return f"the start block moved from {self.startBlock} to {startBlock}"
+        if endBlock < self.block:
+            return f"the end block {endBlock} is before the saved block {self.block}"
+        if list(symbols) != self.symbols:
+            return f"the pools changed from {self.symbols} to {list(symbols)}"
+        if ledgerHash != self.ledgerHash:
+            return "the ledger changed before the saved block"
+
+        current = multipliers.reindex(
+            index=self.multipliers.index, columns=self.multipliers.columns
+        )
+        if not np.allclose(
+                current.to_numpy(dtype=float), self.multipliers.to_numpy(dtype=float),
+                rtol=0.0, atol=0.0, equal_nan=True
+        ):
+            return "prices or exchange rates of an accrued day changed"
+
+        return None
+
+    def save(self, directory, book):
+        """
+        Write the state to `directory` -- LPs are saved as addresses since
+        ids change whenever the address book gains an address
+
+        The files are written to a temporary directory which then replaces
+        `directory`, so an interrupted run leaves the previous state intact
+        """
+        tmp = f"{directory}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        with open(os.path.join(tmp, "state.json"), "w") as f:
+            json.dump({
+                "startBlock": int(self.startBlock),
+                "block": int(self.block),
+                "ledgerHash": self.ledgerHash,
+                "symbols": self.symbols,
+                "totals": {k: float(v) for (k, v) in self.totals().items()},
+            }, f, indent=2)
+
+        pq.write_table(
+            pa.table({
+                "address": book.rawColumn(self.accrued.index.to_numpy()),
+                "accrued": pa.array(self.accrued.to_numpy(dtype=float)),
+            }),
+            os.path.join(tmp, "accrued.parquet"), compression="zstd"
+        )
+        pq.write_table(
+            pa.table({
+                "symbol": pa.array(self.balances["symbol"].astype(str).to_numpy()),
+                "address": book.rawColumn(self.balances["lp"].to_numpy()),
+                "balance": pa.array(self.balances["balance"].to_numpy(dtype=float)),
+            }),
+            os.path.join(tmp, "balances.parquet"), compression="zstd"
+        )
+        self.multipliers.rename_axis("date").to_parquet(
+            os.path.join(tmp, "multipliers.parquet")
+        )
+
+        old = f"{directory}.old"
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory, book):
+        """
+        Read a state saved with `save` (None if there isn't one)
+
+        Raises
+        ------
+        KeyError
+            If a saved LP isn't in `book`
+        """
+        if not os.path.exists(os.path.join(directory, "state.json")):
+            return None
+
+        with open(os.path.join(directory, "state.json"), "r") as f:
+            meta = json.load(f)
+
+        accrued = pq.read_table(os.path.join(directory, "accrued.parquet"))
+        balances = pq.read_table(os.path.join(directory, "balances.parquet"))
+        state = cls(
+            meta["startBlock"], meta["block"],
+            pd.Series(
+                accrued.column("accrued").to_numpy(),
+                index=book.ids(accrued.column("address")).astype(np.int64)
+            ),
+            pd.DataFrame({
+                "symbol": pd.Categorical(
+                    balances.column("symbol").to_numpy(zero_copy_only=False),
+                    categories=meta["symbols"]
+                ),
+                "lp": book.ids(balances.column("address")),
+                "balance": balances.column("balance").to_numpy(),
+            }),
+            pd.read_parquet(os.path.join(directory, "multipliers.parquet")),
+            meta.get("ledgerHash")
+        )
+
+        totals = state.totals().reindex(meta["symbols"]).to_numpy()
+        assert(np.allclose(totals, [meta["totals"][k] for k in meta["symbols"]]))
+
+        return state
+
+
+def accrueRewards(state, rows, dayStarts, endBlock, multipliers, historyHash, rewardsFn):
+    """
+    Accrue LP rewards from `state` through the last complete day at or
+    before `endBlock` and compute the rewards through `endBlock`
+
+    Only the days after `state.block` are computed -- The trailing partial
+    day (whose last block is `endBlock` rather than the block before the
+    next day) is computed but not accrued because a later run with a later
+    end block pays the whole day
+
+    Parameters
+    ----------
+    state : AccrualState
+        The state to resume from (see `AccrualState.fresh` for a full
+        computation)
+    rows : pd.DataFrame
+        The ledger (or at least every row after `state.block`)
+    dayStarts : pd.DataFrame
+        The first `block` of each `date` (see `BlockStore.dayStarts`)
+    endBlock : int
+        The block to stop tracking rewards at
+    multipliers : pd.DataFrame
+        The multipliers of each day (see `dailyMultipliers`)
+    historyHash : callable
+        Given a block, the hash of the ledger's rows at or before it (see
+        `acx.ledger.ledgerHash`)
+    rewardsFn : callable
+        Computes the rewards per unit of `rewardPerBlock` of a ledger
+        between a start and an end block (i.e. `accumulatorRewards`)
+
+    Returns
+    -------
+    state : AccrualState
+        The state after the last complete day
+    rewards : pd.Series
+        The rewards per unit of `rewardPerBlock` of each LP through
+        `endBlock` (indexed by address id)
+    """
+    assert(endBlock >= state.block)
+
+    # Only the last day can be cut short by `endBlock`
+    if endBlock > state.block:
+        windows = dayWindows(dayStarts, state.block + 1, endBlock)
+    else:
+        windows = pd.DataFrame({"date": [], "start": [], "end": []})
+    ends = windows["end"].to_numpy(dtype=np.int64)
+    complete = np.isin(ends + 1, dayStarts["block"].to_numpy(dtype=np.int64))
+    assert(complete[:-1].all())
+
+    ledger = state.ledger(rows)
+    if complete.any():
+        block = int(ends[complete].max())
+        earned = rewardsFn(ledger, state.block + 1, block)
+        dates = windows.loc[complete, "date"]
+        state = state.advance(
+            ledger, block, earned,
+            multipliers.reindex(index=dates, columns=state.symbols), historyHash(block)
+        )
+        ledger = state.ledger(rows)
+
+    rewards = state.accrued
+    if endBlock > state.block:
+        rewards = rewards.add(
+            rewardsFn(ledger, state.block + 1, endBlock), fill_value=0.0
+        )
+
+    return state, rewards
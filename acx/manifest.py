@@ -0,0 +1,284 @@
+import atexit
+import datetime as dt
+import json
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+
+# Setting `ACX_RUN_ID` groups every stage started with it into one run
+# (the makefile sets it once per `make`)
+ENV_RUN_ID = "ACX_RUN_ID"
+
+# Folders whose files are listed (with their size) in every manifest entry
+ARTIFACT_FOLDERS = ["raw", "intermediate", "final"]
+
+
+class RequestCounter:
+    """
+    Thread-safe counts of the HTTP requests (and the JSON-RPC calls inside
+    of them) sent to each host
+    """
+    def __init__(self):
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def count(self, url, body, status):
+        nCalls = 0
+        try:
+            payload = json.loads(body) if body else None
+            if isinstance(payload, list):
+                nCalls = len(payload)
+            elif isinstance(payload, dict) and ("method" in payload):
+                nCalls = 1
+        except (TypeError, ValueError):
+            pass
+
+        with self._lock:
+            counts = self.hosts.setdefault(
+                urlsplit(url).hostname, {"http": 0, "rpc": 0, "errors": 0}
+            )
+            counts["http"] += 1
+            counts["rpc"] += nCalls
+            counts["errors"] += status >= 400
+
+    def snapshot(self):
+        with self._lock:
+            return {k: dict(v) for (k, v) in self.hosts.items()}
+
+
+_REQUESTS = RequestCounter()
+
+
+def countRequest(url, request, response):
+    "Count a request sent through the shared session (see `acx.session`)"
+    _REQUESTS.count(url, request.body, response.status_code)
+
+
+def listArtifacts(since=None):
+    """
+    The size (in bytes) of every file in `raw/`, `intermediate/` and
+    `final/` and whether it was modified after `since`
+    """
+    out = {}
+    for folder in ARTIFACT_FOLDERS:
+        for (root, _, files) in os.walk(folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                out[path] = {
+                    "bytes": stat.st_size,
+                    "written": (since is not None) and (stat.st_mtime >= since),
+                }
+
+    return out
+
+
+def _childCpu():
+    "The CPU seconds used by the exited child processes of this process"
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageRun:
+    """
+    Measures a single run of a stage and appends it to the run manifest
+    (one JSON object per line) when the process exits
+
+    Each entry has the stage's wall and CPU time (including its worker
+    processes), the peak RSS of the stage and of its largest worker, the
+    rows it read and wrote (as reported with `read`/`wrote`), every
+    artifact in `raw/`, `intermediate/` and `final/` with its size, and
+    the HTTP requests/RPC calls sent to each host
+
+    The shared readers and writers (i.e. `acx.columnar.readEvents` or
+    `dumpJson`) report their rows to the current run themselves
+    (see `recordRead`/`recordWrite`), from any thread
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage
+    path : str
+        The manifest file
+    """
+    def __init__(self, stage, path):
+        self.stage = stage
+        self.path = path
+        self.rowsRead = {}
+        self.rowsWritten = {}
+        self.status = "ok"
+        self._finished = False
+        self._lock = threading.Lock()
+
+        self._startTime = time.time()
+        self._startWall = time.perf_counter()
+        self._startCpu = time.process_time()
+        self._startChildCpu = _childCpu()
+
+    def read(self, artifact, rows):
+        "Report that `rows` rows were read from `artifact`"
+        with self._lock:
+            self.rowsRead[artifact] = self.rowsRead.get(artifact, 0) + int(rows)
+
+    def wrote(self, artifact, rows):
+        "Report that `rows` rows were written to `artifact`"
+        with self._lock:
+            self.rowsWritten[artifact] = self.rowsWritten.get(artifact, 0) + int(rows)
+
+    def finish(self):
+        "Append this run to the manifest -- Only the first call does anything"
+        if self._finished:
+            return
+        self._finished = True
+
+        # Worker processes (i.e. a process pool) only show up in the
+        # children's usage once they have exited and been waited for
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        childCpu = _childCpu() - self._startChildCpu
+        entry = {
+            "run": os.environ.get(ENV_RUN_ID),
+            "stage": self.stage,
+            "status": self.status,
+            "host": socket.gethostname(),
+            "start": dt.datetime.fromtimestamp(
+                self._startTime, dt.timezone.utc
+            ).replace(tzinfo=None).isoformat(),
+            "wall": time.perf_counter() - self._startWall,
+            "cpu": time.process_time() - self._startCpu + childCpu,
+            "childCpu": childCpu,
+            # `ru_maxrss` is in kilobytes on linux -- The children's is the
+            # peak of the largest child
+            "peakRssMb": usage.ru_maxrss / 1024,
+            "childPeakRssMb": childUsage.ru_maxrss / 1024,
+            "rowsRead": self.rowsRead,
+            "rowsWritten": self.rowsWritten,
+            "artifacts": listArtifacts(since=self._startTime),
+            "requests": _REQUESTS.snapshot(),
+        }
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+# The run of the stage that this process is executing (see `startStage`)
+_CURRENT_RUN = None
+
+
+def recordRead(artifact, rows):
+    "Report a read to the current stage's run (if a stage has been started)"
+    if _CURRENT_RUN is not None:
+        _CURRENT_RUN.read(artifact, rows)
+
+
+def recordWrite(artifact, rows):
+    "Report a write to the current stage's run (if a stage has been started)"
+    if _CURRENT_RUN is not None:
+        _CURRENT_RUN.wrote(artifact, rows)
+
+
+# -------------------------------------
+# Stage I/O -- Every read/write is reported to the current stage's run
+# (see `startStage`)
+# -------------------------------------
+def loadJson(path):
+    "`json.load` the file at `path`"
+    with open(path, "r") as f:
+        out = json.load(f)
+    recordRead(path, len(out))
+
+    return out
+
+
+def dumpJson(obj, path, rows=None):
+    """
+    `json.dump` `obj` to `path` -- It is reported as `rows` rows (`len(obj)`
+    by default)
+    """
+    with open(path, "w") as f:
+        json.dump(obj, f)
+    recordWrite(path, len(obj) if rows is None else rows)
+
+
+def readJson(path, **kwargs):
+    "`pd.read_json` the file at `path` (keyword arguments are passed along)"
+    out = pd.read_json(path, **kwargs)
+    recordRead(path, len(out))
+
+    return out
+
+
+def writeJson(x, path, **kwargs):
+    "Write a DataFrame or Series with `to_json` (keyword arguments are passed along)"
+    x.to_json(path, **kwargs)
+    recordWrite(path, len(x))
+
+
+def readParquet(path, **kwargs):
+    "`pd.read_parquet` the file at `path` (keyword arguments are passed along)"
+    out = pd.read_parquet(path, **kwargs)
+    recordRead(path, len(out))
+
+    return out
+
+
+def writeParquet(df, path):
+    "Write a DataFrame with `to_parquet`"
+    df.to_parquet(path)
+    recordWrite(path, len(df))
+
+
+def startStage(stage, path):
+    """
+    Start measuring the current process as `stage` -- The entry is
+    written when the process exits and is marked as failed if it exits
+    with an uncaught exception (in the main thread or any other thread)
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage
+    path : str
+        The manifest file (`params["manifest"]`)
+
+    Returns
+    -------
+    run : StageRun
+    """
+    global _CURRENT_RUN
+    run = StageRun(stage, path)
+    _CURRENT_RUN = run
+
+    previousHook = sys.excepthook
+    def excepthook(*args):
+        run.status = "failed"
+        previousHook(*args)
+    sys.excepthook = excepthook
+
+    previousThreadHook = threading.excepthook
+    def threadExcepthook(args):
+        run.status = "failed"
+        previousThreadHook(args)
+    threading.excepthook = threadExcepthook
+
+    atexit.register(run.finish)
+
+    return run
+
+
+def readManifest(path):
+    "Every entry in the manifest at `path` in the order they were written"
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,484 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from acx.manifest import ENV_RUN_ID
+
+
+# The library that every stage imports -- A change to any of its modules
+# (or data files) reruns every stage
+PACKAGE = "acx"
+PACKAGE_SUFFIXES = (".py", ".json")
+
+
+class Stage:
+    """
+    A script in the pipeline along with what it reads and writes
+
+    Paths can refer to top-level parameters (i.e. `{block_store}`) and
+    may be folders. Only the parameters that change a stage's outputs are
+    listed -- Node URLs, concurrency, caches and block step sizes are left
+    out so changing them doesn't cause a rerun
+
+    Parameters
+    ----------
+    name : str
+        The stage's name, the script is `{name}.py`
+    inputs : list(str)
+        The files (or folders) the stage reads
+    outputs : list(str)
+        The files (or folders) the stage writes
+    params : list(str)
+        Dotted paths of the `parameters.yaml` subtrees the stage reads
+    always : bool
+        Whether the stage runs every time -- For stages whose outputs
+        depend on more than their inputs and parameters (i.e. the chain
+        head)
+    """
+    def __init__(self, name, inputs=(), outputs=(), params=(), always=False):
+        self.name = name
+        self.script = f"{name}.py"
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = list(params)
+        self.always = always
+
+
+STAGES = [
+    # Shared data -- The block store runs through the chain head until
+    # the day after `end_ts` has started, so blocks are always refreshed
+    Stage(
+        "blocks",
+        outputs=["raw/blocks.json", "{block_store}"],
+        params=["misc.block"],
+        always=True
+    ),
+    Stage(
+        "lp_exchange_rates",
+        inputs=[
+            "{block_store}",
+            # Only read when the rates are rebuilt from events
+            "raw/v1Transfers.parquet", "raw/v1PoolRelays.parquet",
+            "raw/v1RelaySettled.parquet", "raw/v2Transfers.parquet",
+            "raw/v2RootBundleExecuted.parquet", "raw/v2ProtocolFeeCaptureSet.parquet",
+            "raw/lpFeeRates.json"
+        ],
+        outputs=["raw/v1ExchangeRates.json", "raw/v2ExchangeRates.json"],
+        params=[
+            "across.v1.mainnet", "across.v2.mainnet", "lp.tokens",
+            "lp.v1_end_block", "lp.v2_end_block", "lp.v2_lp_token_creation_block",
+            "lp.exchange_rates"
+        ]
+    ),
+    Stage(
+        "prices",
+        outputs=["raw/prices.json"],
+        params=["misc.price"]
+    ),
+
+    # Bridgoor rewards
+    Stage(
+        "bridgoor_events",
+        outputs=["raw/v1DisputedRelays.parquet", "raw/v1Relays.parquet", "raw/v2Deposits.parquet"],
+        params=[
+            "across", "bridgoor.chains", "bridgoor.tokens", "bridgoor.v1_start_block",
+            "bridgoor.v1_end_block", "bridgoor.v2_start_block",
+            "traveler.travel_end_block"
+        ]
+    ),
+    Stage(
+        "bridgoor_normalize",
+        inputs=[
+            "raw/v1DisputedRelays.parquet", "raw/v1Relays.parquet", "raw/v2Deposits.parquet",
+            "intermediate/addresses.parquet"
+        ],
+        outputs=["intermediate/allAcrossTransactions.json", "intermediate/bridgoorTransactions.json"],
+        params=[
+            "bridgoor.v1_start_block", "bridgoor.v1_end_block",
+            "bridgoor.v2_start_block", "bridgoor.v2_end_block"
+        ]
+    ),
+    Stage(
+        "bridgoor_rewards",
+        inputs=[
+            "intermediate/bridgoorTransactions.json", "raw/prices.json", "{block_store}",
+            "intermediate/addresses.parquet"
+        ],
+        outputs=["final/bridgoor_rewards.json"],
+        params=["bridgoor.parameters"]
+    ),
+
+    # LP rewards
+    Stage(
+        "lp_events",
+        outputs=[
+            "raw/v1Transfers.parquet", "raw/v2Transfers.parquet",
+            "raw/v1PoolRelays.parquet", "raw/v1RelaySettled.parquet",
+            "raw/v2RootBundleExecuted.parquet", "raw/v2ProtocolFeeCaptureSet.parquet",
+            "raw/lpFeeRates.json"
+        ],
+        params=[
+            "across.v1.mainnet", "across.v2.mainnet", "lp.tokens",
+            "lp.v1_end_block", "lp.v2_end_block"
+        ]
+    ),
+    Stage(
+        "lp_cumulative",
+        inputs=[
+            "raw/v1Transfers.parquet", "raw/v2Transfers.parquet",
+            "intermediate/addresses.parquet"
+        ],
+        outputs=["intermediate/v1CumulativeLp.parquet", "intermediate/v2CumulativeLp.parquet"],
+        params=["lp.tokens"]
+    ),
+    Stage(
+        "lp_rewards",
+        inputs=[
+            "intermediate/v1CumulativeLp.parquet", "intermediate/v2CumulativeLp.parquet",
+            "raw/v1ExchangeRates.json", "raw/v2ExchangeRates.json",
+            "raw/prices.json", "{block_store}", "intermediate/addresses.parquet"
+        ],
+        outputs=["final/lp_rewards.json"],
+        params=[
+            "lp.v1_start_block", "lp.v1_end_block", "lp.v2_start_block",
+            "lp.v2_end_block", "lp.parameters"
+        ]
+    ),
+
+    # Bridge traveler rewards
+    Stage(
+        "bt_cbridge",
+        outputs=["raw/cbridge_transfers.parquet"],
+        params=["traveler.cbridge"]
+    ),
+    Stage(
+        "bt_hop",
+        outputs=["raw/hop_transfers.parquet"],
+        params=["traveler.chains", "traveler.hop"]
+    ),
+    Stage(
+        "bt_stargate",
+        outputs=["raw/stg_transfers.parquet"],
+        params=["traveler.stg"]
+    ),
+    Stage(
+        "bt_synapse",
+        outputs=["raw/synapse_transfers.parquet"],
+        params=["traveler.synapse"]
+    ),
+
+    # Shared dictionary of every address seen in the raw events
+    Stage(
+        "addresses",
+        inputs=[
+            "raw/v1Transfers.parquet", "raw/v2Transfers.parquet",
+            "raw/v1Relays.parquet", "raw/v2Deposits.parquet",
+            "raw/cbridge_transfers.parquet", "raw/hop_transfers.parquet",
+            "raw/stg_transfers.parquet", "raw/synapse_transfers.parquet",
+            "raw/sybil.json", "final/community_rewards.json"
+        ],
+        outputs=["intermediate/addresses.parquet"]
+    ),
+
+    Stage(
+        "bt_combine",
+        inputs=[
+            "raw/cbridge_transfers.parquet", "raw/hop_transfers.parquet",
+            "raw/stg_transfers.parquet", "raw/synapse_transfers.parquet",
+            "{block_store}", "intermediate/addresses.parquet"
+        ],
+        outputs=["intermediate/travelerTransfers.parquet"]
+    ),
+    Stage(
+        "bt_rewards",
+        inputs=[
+            "intermediate/travelerTransfers.parquet", "raw/prices.json",
+            "intermediate/bridgoorTransactions.json",
+            "intermediate/v1CumulativeLp.parquet", "intermediate/v2CumulativeLp.parquet",
+            "raw/sybil.json", "intermediate/addresses.parquet"
+        ],
+        outputs=["final/traveler_score.json"],
+        params=[
+            "traveler.travel_start_block", "traveler.travel_end_block",
+            "traveler.parameters.inclusion", "traveler.parameters.score"
+        ]
+    ),
+    Stage(
+        "bt_final",
+        inputs=[
+            "final/traveler_score.json", "intermediate/allAcrossTransactions.json",
+            "intermediate/addresses.parquet"
+        ],
+        outputs=["final/traveler_rewards.json"],
+        params=[
+            "bridgoor.v2_start_block", "traveler.travel_start_block",
+            "traveler.travel_end_block", "traveler.parameters.qualification",
+            "traveler.parameters.rewards"
+        ]
+    ),
+
+    # Everything
+    Stage(
+        "combine_rewards",
+        inputs=[
+            "final/bridgoor_rewards.json", "final/lp_rewards.json",
+            "final/traveler_rewards.json", "final/community_rewards.json",
+            "intermediate/addresses.parquet"
+        ],
+        outputs=["final/final_combined.json", "final/final_combined.csv", "final/mr.json"]
+    ),
+]
+
+
+def paramsSubtree(params, key):
+    "The value at a dotted path (i.e. `lp.tokens`) of `params`"
+    out = params
+    for part in key.split("."):
+        out = out[part]
+
+    return out
+
+
+def hashParams(params, keys):
+    "A hash of the `params` subtrees at each of `keys`"
+    subtrees = {key: paramsSubtree(params, key) for key in keys}
+    encoded = json.dumps(subtrees, sort_keys=True, default=str)
+
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class FileHasher:
+    """
+    Content hashes of files and folders -- A file is only read again when
+    its size or modification time changes
+
+    Parameters
+    ----------
+    known : dict, optional
+        Hashes from a previous run (see `known`)
+    """
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+
+    def _hashFile(self, path):
+        stat = os.stat(path)
+        key = [stat.st_size, stat.st_mtime_ns]
+        cached = self.known.get(path)
+        if (cached is not None) and (cached[:2] == key):
+            return cached[2]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.known[path] = key + [h.hexdigest()]
+
+        return h.hexdigest()
+
+    def hash(self, path, suffixes=None):
+        """
+        The hash of a file or folder, None if it doesn't exist -- Only
+        the files of a folder ending with one of `suffixes` are hashed
+        when they are given
+        """
+        if os.path.isfile(path):
+            return self._hashFile(path)
+        if not os.path.isdir(path):
+            return None
+
+        h = hashlib.sha256()
+        for (root, dirs, files) in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if (suffixes is not None) and not name.endswith(tuple(suffixes)):
+                    continue
+                filePath = os.path.join(root, name)
+                h.update(os.path.relpath(filePath, path).encode())
+                h.update(self._hashFile(filePath).encode())
+
+        return h.hexdigest()
+
+
+class Pipeline:
+    """
+    Runs stages as a DAG -- A stage runs once every stage that writes one
+    of its inputs has finished, independent stages run at the same time,
+    and a stage is skipped when its script, the `acx` package, its
+    inputs, parameters and outputs are unchanged since it last succeeded
+
+    Parameters
+    ----------
+    stages : list(Stage)
+        Every stage in the pipeline
+    params : dict
+        The contents of `parameters.yaml`
+    statePath : str
+        The file that stage fingerprints are kept in between runs
+    logDirectory : str
+        The folder that each stage's output is written to
+    """
+    def __init__(self, stages, params, statePath, logDirectory):
+        self.stages = {stage.name: stage for stage in stages}
+        self.params = params
+        self.statePath = statePath
+        self.logDirectory = logDirectory
+
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(statePath):
+            with open(statePath, "r") as f:
+                self.state = json.load(f)
+        self.hasher = FileHasher(self.state["files"])
+
+        # Map each output to the stage that writes it
+        self.producers = {}
+        for stage in stages:
+            for path in self._paths(stage.outputs):
+                assert(path not in self.producers)
+                self.producers[path] = stage.name
+
+    def _paths(self, paths):
+        return [path.format(**self.params) for path in paths]
+
+    def upstream(self, name):
+        "The stages that write one of the inputs of `name`"
+        return set(
+            self.producers[path] for path in self._paths(self.stages[name].inputs)
+            if path in self.producers
+        )
+
+    def plan(self, targets=None):
+        "`targets` (every stage by default) and everything upstream of them"
+        if targets is None:
+            return set(self.stages.keys())
+
+        out = set()
+        pending = list(targets)
+        while len(pending) > 0:
+            name = pending.pop()
+            if name not in out:
+                out.add(name)
+                pending.extend(self.upstream(name))
+
+        return out
+
+    def fingerprint(self, name):
+        "The hashes that decide whether `name` has to be run again"
+        stage = self.stages[name]
+        return {
+            "script": self.hasher.hash(stage.script),
+            "package": self.hasher.hash(PACKAGE, PACKAGE_SUFFIXES),
+            "params": hashParams(self.params, stage.params),
+            "inputs": {path: self.hasher.hash(path) for path in self._paths(stage.inputs)},
+        }
+
+    def isFresh(self, name, fingerprint):
+        "Whether `name` last succeeded with `fingerprint` and its outputs are untouched"
+        if self.stages[name].always:
+            return False
+
+        last = self.state["stages"].get(name)
+        if (last is None) or (last["fingerprint"] != fingerprint):
+            return False
+
+        return all(
+            self.hasher.hash(path) == digest
+            for (path, digest) in last["outputs"].items()
+        )
+
+    def _save(self):
+        directory = os.path.dirname(self.statePath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.state["files"] = self.hasher.known
+        with open(self.statePath + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(self.statePath + ".tmp", self.statePath)
+
+    def _runScript(self, name, env):
+        os.makedirs(self.logDirectory, exist_ok=True)
+        with open(os.path.join(self.logDirectory, f"{name}.log"), "w") as log:
+            proc = subprocess.run(
+                [sys.executable, self.stages[name].script],
+                stdout=log, stderr=subprocess.STDOUT, env=env
+            )
+
+        return proc.returncode
+
+    def run(self, targets=None, nWorkers=1, force=()):
+        """
+        Run the stages needed for `targets`
+
+        Parameters
+        ----------
+        targets : list(str), optional
+            The stages to bring up to date, defaults to all of them
+        nWorkers : int
+            The number of stages that run at the same time
+        force : list(str)
+            Stages that are run even if they are up to date
+
+        Returns
+        -------
+        status : dict(str, str)
+            What happened to each stage: `ran`, `skipped` (up to date),
+            `failed` or `blocked` (an upstream stage failed)
+        """
+        pending = self.plan(targets)
+        upstream = {name: self.upstream(name) & pending for name in pending}
+
+        env = dict(os.environ)
+        env.setdefault(ENV_RUN_ID, time.strftime("%Y%m%dT%H%M%S", time.gmtime()))
+
+        status = {}
+        running = {}
+        with ThreadPoolExecutor(nWorkers) as executor:
+            while (len(pending) > 0) or (len(running) > 0):
+                # Start (or skip) every stage whose upstream is done
+                for name in sorted(pending):
+                    if any(status.get(x) in ["failed", "blocked"] for x in upstream[name]):
+                        status[name] = "blocked"
+                        print(f"{name}: blocked")
+                    elif all(x in status for x in upstream[name]):
+                        fingerprint = self.fingerprint(name)
+                        if (name not in force) and self.isFresh(name, fingerprint):
+                            status[name] = "skipped"
+                            print(f"{name}: up to date")
+                        else:
+                            print(f"{name}: running")
+                            future = executor.submit(self._runScript, name, env)
+                            running[future] = (name, fingerprint, time.perf_counter())
+                    else:
+                        continue
+                    pending.remove(name)
+
+                if len(running) == 0:
+                    continue
+
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, fingerprint, start = running.pop(future)
+                    elapsed = time.perf_counter() - start
+
+                    if future.result() != 0:
+                        status[name] = "failed"
+                        self.state["stages"].pop(name, None)
+                        print(f"{name}: failed after {elapsed:.1f}s (see {self.logDirectory}/{name}.log)")
+                    else:
+                        status[name] = "ran"
+                        self.state["stages"][name] = {
+                            "fingerprint": fingerprint,
+                            "outputs": {
+                                path: self.hasher.hash(path)
+                                for path in self._paths(self.stages[name].outputs)
+                            },
+                        }
+                        print(f"{name}: finished in {elapsed:.1f}s")
+                    self._save()
+
+        return status
@@ -0,0 +1,124 @@
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+
+# Documented request quotas (requests per second, burst) of the APIs that
+# the collection scripts use -- The etherscan-family scanners allow 5
+# calls/second on a free key, CoinGecko's public API allows 10-30
+# calls/minute and The Graph's hosted service allows 1,000 queries every
+# 5 minutes
+HOST_RATE_LIMITS = {
+    "https://api.etherscan.io/": (5.0, 5),
+    "https://api-optimistic.etherscan.io/": (5.0, 5),
+    "https://api.polygonscan.com/": (5.0, 5),
+    "https://api.bobascan.com/": (5.0, 5),
+    "https://api.arbiscan.io/": (5.0, 5),
+    "https://api.coingecko.com/": (10 / 60, 5),
+    "https://api.thegraph.com/": (1_000 / 300, 10),
+}
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that lets requests through at a steady
+    `rate` while allowing short bursts of up to `capacity` requests
+
+    Callers that arrive when the bucket is empty reserve the next token
+    and sleep until it is available, so waiting callers are let through
+    in the order they arrived rather than all retrying at once
+
+    Parameters
+    ----------
+    rate : float
+        The number of tokens added to the bucket per second
+    capacity : int
+        The maximum number of tokens the bucket can hold
+    """
+    def __init__(self, rate, capacity=1):
+        assert(rate > 0)
+        assert(capacity >= 1)
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        "Take `n` tokens from the bucket, sleeping until they are available"
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last)*self.rate
+            )
+            self._last = now
+
+            # Tokens can go negative -- That is a reservation for a
+            # future token and sets how long this caller has to wait
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+_BUCKETS = {}
+_BUCKET_LOCK = threading.Lock()
+
+
+def _urlPrefix(url):
+    "Normalizes a host (`scheme://host/`) or endpoint URL to a prefix"
+    parts = urlsplit(url)
+    if parts.path in ["", "/"]:
+        return f"{parts.scheme}://{parts.netloc}/"
+
+    return url
+
+
+def setRateLimit(url, rate, capacity=1):
+    """
+    Limit the requests sent to `url` (and any URL that starts with it) to
+    `rate` requests per second
+
+    Parameters
+    ----------
+    url : str
+        A host (i.e. `https://api.etherscan.io/`) or a full endpoint (i.e.
+        an RPC node's URL)
+    rate : float
+        The number of requests allowed per second
+    capacity : int
+        The number of requests allowed in a burst
+    """
+    with _BUCKET_LOCK:
+        _BUCKETS[_urlPrefix(url)] = TokenBucket(rate, capacity)
+
+
+def getRateLimiter(url):
+    """
+    Find the token bucket for the longest configured prefix of `url`,
+    returns None if requests to `url` aren't limited
+    """
+    with _BUCKET_LOCK:
+        matches = [prefix for prefix in _BUCKETS.keys() if url.startswith(prefix)]
+        if len(matches) == 0:
+            return None
+
+        return _BUCKETS[max(matches, key=len)]
+
+
+def waitForRateLimit(url):
+    "Block until a request to `url` is allowed through"
+    bucket = getRateLimiter(url)
+    if bucket is None:
+        return 0.0
+
+    return bucket.acquire()
+
+
+for (_prefix, (_rate, _capacity)) in HOST_RATE_LIMITS.items():
+    setRateLimit(_prefix, _rate, _capacity)
@@ -0,0 +1,476 @@
+import bisect
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from acx.cache import missingRanges
+
+
+# Setting `ACX_RECORD` to a folder records every request/response that
+# goes through the shared session (see `acx.session`) and setting
+# `ACX_STANDIN` to the URL of a stand-in server sends every request to it
+ENV_RECORD = "ACX_RECORD"
+ENV_STANDIN = "ACX_STANDIN"
+
+# Hosts with their own stand-in -- Every other host is treated as an RPC
+# node
+HOST_TO_SERVICE = {
+    "api.coingecko.com": "coingecko",
+    "api.thegraph.com": "thegraph",
+    "api.etherscan.io": "scanner",
+    "api-optimistic.etherscan.io": "scanner",
+    "api.polygonscan.com": "scanner",
+    "api.bobascan.com": "scanner",
+    "api.arbiscan.io": "scanner",
+}
+
+# Query parameters that are never recorded (or matched on)
+SECRET_PARAMS = ["apikey"]
+
+
+def targetKey(url):
+    """
+    The key that requests to `url` are recorded under -- `host/path` for
+    the known APIs and a hash for RPC nodes (whose URLs usually contain an
+    API key)
+    """
+    parts = urlsplit(url)
+    if parts.hostname in HOST_TO_SERVICE.keys():
+        return f"{parts.hostname}{parts.path}"
+
+    endpoint = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return "rpc/" + hashlib.sha256(endpoint.encode()).hexdigest()[:16]
+
+
+def queryParams(url):
+    "The query parameters of `url` (without secrets) as a sorted list"
+    return sorted(
+        (k, v) for (k, v) in parse_qsl(urlsplit(url).query)
+        if k not in SECRET_PARAMS
+    )
+
+
+def standInUrl(url, standIn):
+    """
+    Rewrite `url` so that it is sent to the stand-in server at `standIn`
+    -- `https://host/path?q` becomes `{standIn}/https/host/path?q`
+    """
+    parts = urlsplit(url)
+    out = f"{standIn.rstrip('/')}/{parts.scheme}/{parts.netloc}{parts.path}"
+    if parts.query:
+        out += f"?{parts.query}"
+
+    return out
+
+
+def originalUrl(path):
+    "Undo `standInUrl` for the path that the stand-in server received"
+    scheme, rest = path.lstrip("/").split("/", 1)
+
+    return f"{scheme}://{rest}"
+
+
+class Recorder:
+    """
+    Appends every request/response pair to `directory/{pid}.ndjson`
+
+    Parameters
+    ----------
+    directory : str
+        The folder that recordings (a "cassette") are written to
+    """
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{os.getpid()}.ndjson")
+        self._lock = threading.Lock()
+
+    def record(self, url, request, response):
+        try:
+            body = json.loads(request.body) if request.body else None
+            result = response.json()
+        except ValueError:
+            return
+
+        line = json.dumps({
+            "target": targetKey(url),
+            "method": request.method,
+            "params": queryParams(url),
+            "body": body,
+            "status": response.status_code,
+            "response": result,
+        })
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+_RECORDER = Recorder(os.environ[ENV_RECORD]) if os.environ.get(ENV_RECORD) else None
+_STANDIN = os.environ.get(ENV_STANDIN) or None
+
+
+def startRecording(directory):
+    "Record every request made by this process to `directory`"
+    global _RECORDER
+    _RECORDER = Recorder(directory)
+
+
+def useStandIn(url):
+    "Send every request made by this process to the stand-in at `url`"
+    global _STANDIN
+    _STANDIN = url
+
+
+def redirectRequest(request):
+    "Point a prepared request at the stand-in server (if one is in use)"
+    if _STANDIN is not None:
+        request.url = standInUrl(request.url, _STANDIN)
+
+
+def recordExchange(url, request, response):
+    "Record a request to `url` and its response (if recording)"
+    if (_RECORDER is not None) and (_STANDIN is None):
+        _RECORDER.record(url, request, response)
+
+
+def _callKey(method, params):
+    return json.dumps([method, params], sort_keys=True)
+
+
+def _toBlock(x, default):
+    if (x is None) or (x in ["latest", "pending", "safe", "finalized"]):
+        return default
+    if x == "earliest":
+        return 0
+
+    return int(x, 16)
+
+
+def _asList(x):
+    return x if isinstance(x, list) else [x]
+
+
+def _lowerSet(x):
+    return set(y.lower() for y in _asList(x))
+
+
+def _filterCovers(recorded, logFilter):
+    """
+    Whether every log matching `logFilter` also matches the `recorded`
+    filter (ignoring block ranges) -- i.e. the recorded request was for
+    the same or more addresses and topics
+    """
+    if recorded.get("address") is not None:
+        if logFilter.get("address") is None:
+            return False
+        if not (_lowerSet(logFilter["address"]) <= _lowerSet(recorded["address"])):
+            return False
+
+    topics = logFilter.get("topics") or []
+    for (i, wanted) in enumerate(recorded.get("topics") or []):
+        if wanted is None:
+            continue
+        if (i >= len(topics)) or (topics[i] is None):
+            return False
+        if not (_lowerSet(topics[i]) <= _lowerSet(wanted)):
+            return False
+
+    return True
+
+
+class Cassette:
+    """
+    The recorded responses in a folder, indexed so they can be served
+
+    `eth_getLogs` responses are merged into a single set of logs per RPC
+    node so that any block range (or address/topic filter) that was
+    covered by the recording can be answered, not only the exact
+    requests that were recorded. The filters of the recorded requests are
+    kept so that requests reaching outside of them fail rather than
+    looking like there were no events. Every other request is matched
+    exactly
+
+    Parameters
+    ----------
+    directory : str
+        The folder that `Recorder`s wrote to
+    """
+    def __init__(self, directory):
+        self.calls = {}
+        self.logs = {}
+        self.logFilters = {}
+        self.http = {}
+
+        for path in sorted(glob.glob(os.path.join(directory, "*.ndjson"))):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+        # Sort the logs of each node so block ranges can be bisected
+        for (target, logs) in self.logs.items():
+            ordered = sorted(
+                logs.values(),
+                key=lambda x: (int(x["blockNumber"], 16), int(x["logIndex"], 16))
+            )
+            self.logs[target] = (
+                [int(x["blockNumber"], 16) for x in ordered], ordered
+            )
+
+    def _add(self, record):
+        target = record["target"]
+
+        if not target.startswith("rpc/"):
+            key = (target, record["method"], self._httpKey(record))
+            self.http[key] = (record["status"], record["response"])
+            return
+
+        if record["status"] != 200:
+            return
+
+        calls = _asList(record["body"])
+        responses = {x.get("id"): x for x in _asList(record["response"])}
+        for call in calls:
+            response = responses.get(call.get("id"))
+            if (response is None) or ("result" not in response):
+                continue
+
+            if call["method"] == "eth_getLogs":
+                self.logFilters.setdefault(target, []).append(call["params"][0])
+                logs = self.logs.setdefault(target, {})
+                for log in response["result"]:
+                    logs[(log["blockHash"], log["logIndex"])] = log
+            else:
+                self.calls[(target, _callKey(call["method"], call["params"]))] = (
+                    response["result"]
+                )
+
+    @staticmethod
+    def _httpKey(record):
+        return json.dumps([record["params"], record["body"]], sort_keys=True)
+
+    def _blockRange(self, target, logFilter):
+        "The inclusive (fromBlock, toBlock) of an `eth_getLogs` filter"
+        blocks, _ = self.logs.get(target, ([], []))
+
+        return (
+            _toBlock(logFilter.get("fromBlock"), 0),
+            _toBlock(logFilter.get("toBlock"), blocks[-1] if blocks else 0)
+        )
+
+    def uncovered(self, target, logFilter):
+        """
+        The inclusive block ranges of an `eth_getLogs` filter that no
+        recorded request (with the same or a broader filter) covered
+        """
+        fromBlock, toBlock = self._blockRange(target, logFilter)
+        covered = [
+            self._blockRange(target, recorded)
+            for recorded in self.logFilters.get(target, [])
+            if _filterCovers(recorded, logFilter)
+        ]
+
+        return missingRanges(covered, fromBlock, toBlock)
+
+    def getLogs(self, target, logFilter):
+        "The recorded logs of `target` that match an `eth_getLogs` filter"
+        blocks, logs = self.logs.get(target, ([], []))
+        fromBlock, toBlock = self._blockRange(target, logFilter)
+
+        addresses = None
+        if logFilter.get("address") is not None:
+            addresses = set(x.lower() for x in _asList(logFilter["address"]))
+        topics = logFilter.get("topics") or []
+
+        out = []
+        lo = bisect.bisect_left(blocks, fromBlock)
+        hi = bisect.bisect_right(blocks, toBlock)
+        for log in logs[lo:hi]:
+            if (addresses is not None) and (log["address"].lower() not in addresses):
+                continue
+
+            match = True
+            for (i, wanted) in enumerate(topics):
+                if wanted is None:
+                    continue
+                if (i >= len(log["topics"])) or (
+                    log["topics"][i].lower() not in [x.lower() for x in _asList(wanted)]
+                ):
+                    match = False
+                    break
+            if match:
+                out.append(log)
+
+        return out
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    A local HTTP server that answers RPC, The Graph, CoinGecko and
+    scanner requests from a `Cassette`
+
+    Parameters
+    ----------
+    address : tuple(str, int)
+        The (host, port) to listen on -- Port 0 picks a free port
+    cassette : Cassette
+        The recorded responses
+    latency : float
+        Seconds slept before answering each HTTP request
+    maxResults : int, optional
+        `eth_getLogs` calls matching more logs than this return the
+        "query returned more than N results" error that providers use
+    errorRate : float
+        The fraction of HTTP requests answered with a 429
+    seed : int
+        Seed for choosing which requests get a 429
+    """
+    daemon_threads = True
+
+    def __init__(
+            self, address, cassette, latency=0.0, maxResults=None,
+            errorRate=0.0, seed=0
+        ):
+        super().__init__(address, StandInHandler)
+        self.cassette = cassette
+        self.latency = latency
+        self.maxResults = maxResults
+        self.errorRate = errorRate
+        self.nRequests = 0
+        self.nThrottled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def throttle(self):
+        "Whether the current request should get a 429"
+        with self._lock:
+            self.nRequests += 1
+            throttled = self._random.random() < self.errorRate
+            self.nThrottled += throttled
+
+        return throttled
+
+    def rpcCall(self, target, call):
+        "Answer a single JSON-RPC call"
+        method, params = call.get("method"), call.get("params", [])
+        out = {"jsonrpc": "2.0", "id": call.get("id")}
+
+        if method == "eth_getLogs":
+            # Blocks that were never recorded can't be told apart from
+            # blocks without events so they are an error
+            gaps = self.cassette.uncovered(target, params[0])
+            if len(gaps) > 0:
+                out["error"] = {
+                    "code": -32000,
+                    "message": f"eth_getLogs was not recorded for blocks {gaps[0][0]} to {gaps[0][1]}"
+                }
+                return out
+
+            logs = self.cassette.getLogs(target, params[0])
+            if (self.maxResults is not None) and (len(logs) > self.maxResults):
+                out["error"] = {
+                    "code": -32005,
+                    "message": f"query returned more than {self.maxResults} results"
+                }
+            else:
+                out["result"] = logs
+            return out
+
+        key = (target, _callKey(method, params))
+        if key in self.cassette.calls:
+            out["result"] = self.cassette.calls[key]
+        else:
+            out["error"] = {"code": -32000, "message": f"{method} was not recorded"}
+
+        return out
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    "Routes requests that were rewritten by `standInUrl`"
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        server = self.server
+        if server.latency > 0:
+            time.sleep(server.latency)
+        if server.throttle():
+            return self._respond(429, {"error": "Too Many Requests"})
+
+        url = originalUrl(self.path)
+        target = targetKey(url)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length > 0 else None
+
+        if target.startswith("rpc/"):
+            if isinstance(body, list):
+                return self._respond(200, [server.rpcCall(target, x) for x in body])
+            return self._respond(200, server.rpcCall(target, body))
+
+        key = (
+            target, method,
+            json.dumps([queryParams(url), body], sort_keys=True)
+        )
+        if key not in server.cassette.http:
+            return self._respond(404, {"error": f"{url} was not recorded"})
+
+        return self._respond(*server.cassette.http[key])
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def createStandIn(
+        directory, host="127.0.0.1", port=0, latency=0.0, maxResults=None,
+        errorRate=0.0, seed=0
+    ):
+    """
+    Create a stand-in server for the cassette in `directory`
+
+    Takes the same arguments as `StandInServer`. Use `server.url` with
+    `useStandIn` (or the `ACX_STANDIN` environment variable) to send
+    requests to it
+
+    Returns
+    -------
+    server : StandInServer
+    """
+    return StandInServer(
+        (host, port), Cassette(directory), latency=latency,
+        maxResults=maxResults, errorRate=errorRate, seed=seed
+    )
+
+
+def startStandIn(directory, **kwargs):
+    """
+    Serve the cassette in `directory` from a background thread (see
+    `createStandIn`) -- Stop it with `server.shutdown()`
+    """
+    server = createStandIn(directory, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
@@ -0,0 +1,395 @@
+import itertools
+import numbers
+import time
+
+from hexbytes import HexBytes
+from web3._utils.abi import get_abi_output_types
+
+from acx.abis import getABI
+from acx.ratelimit import getRateLimiter
+from acx.session import getSession
+from acx.utils import getProviderSemaphore, isRateLimitError, mapChunks
+
+
+# Number of calls packed into a single JSON-RPC batch -- Most providers
+# accept (at least) 100 requests per batch
+BATCH_SIZE = 100
+
+# Pieces of the error messages that nodes answer a whole batch with when
+# it holds too many requests -- i.e. geth's "batch too large" and
+# Alchemy's "Batch size is too large"
+BATCH_SIZE_ERROR_MESSAGES = ["batch too large", "batch size", "batch limit"]
+
+# Infura's "limit exceeded" -- A whole batch answered with it is throttled
+LIMIT_EXCEEDED_CODE = -32005
+
+
+def _toBlockIdentifier(block):
+    "Converts a block number to the hex format used in JSON-RPC params"
+    if isinstance(block, numbers.Integral):
+        return hex(block)
+
+    return block
+
+
+def _isRevert(error):
+    "Whether a JSON-RPC error is an `eth_call` revert (which retrying won't fix)"
+    return (error.get("code") == 3) or ("revert" in str(error.get("message", "")).lower())
+
+
+def _isBatchSizeError(error):
+    "Whether a JSON-RPC error rejects a batch for holding too many requests"
+    msg = str(error.get("message", "")).lower()
+
+    return any(x in msg for x in BATCH_SIZE_ERROR_MESSAGES)
+
+
+def _isThrottled(error):
+    "Whether a JSON-RPC error means that the node is rate limiting requests"
+    return (
+        (error.get("code") == LIMIT_EXCEEDED_CODE) or isRateLimitError(ValueError(error))
+    )
+
+
+def batchRequest(
+        w3, rpcRequests, batchSize=BATCH_SIZE, nWorkers=1, nRetries=3,
+        backoffFactor=1.0, allowReverts=False
+    ):
+    """
+    Sends a list of JSON-RPC requests to the endpoint behind `w3` packed
+    into batches of `batchSize` requests
+
+    Requests that come back with an error (other than a revert) or don't
+    come back at all are resent together after backing off. Batches that
+    the node rejects for their size (a 400/413 response or a batch size
+    error) are split in half and resent. Throttled batches (a 429 response
+    or a single rate limit error object) are resent whole after backing
+    off so that a node that is rate limiting doesn't get more requests
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object with an HTTP provider
+    rpcRequests : list(tuple(str, list))
+        The (method, params) of each request
+    batchSize : int
+        The number of requests sent in each HTTP request
+    nWorkers : int
+        The number of batches that are in flight at once (also capped by
+        the provider's concurrency limit)
+    nRetries : int
+        The number of times failed requests are resent
+    backoffFactor : float
+        Seconds slept before resending are `backoffFactor * 2**attempt`
+    allowReverts : bool
+        Whether requests that revert give a `None` result rather than
+        raising a ValueError -- Requests that still fail for any other
+        reason after `nRetries` always raise
+
+    Returns
+    -------
+    results : list
+        The `result` of each request in the same order as `rpcRequests`
+    """
+    assert(isinstance(batchSize, int) and batchSize > 0)
+
+    endpoint = w3.provider.endpoint_uri
+    timeout = w3.provider.get_request_kwargs().get("timeout", 60)
+    semaphore = getProviderSemaphore(w3)
+    session = getSession()
+    bucket = getRateLimiter(endpoint)
+
+    rpcRequests = list(rpcRequests)
+    batches = [
+        list(range(i, min(i + batchSize, len(rpcRequests))))
+        for i in range(0, len(rpcRequests), batchSize)
+    ]
+
+    def post(ids):
+        """
+        The responses keyed by id -- None when the batch is too large and
+        should be split. An error for the whole batch is that error for
+        each of its requests
+        """
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": rpcRequests[i][0],
+                "params": rpcRequests[i][1]
+            }
+            for i in ids
+        ]
+        # Nodes count every call in a batch against their quota -- The
+        # session takes the token for the HTTP request itself
+        if (bucket is not None) and (len(ids) > 1):
+            bucket.acquire(len(ids) - 1)
+        try:
+            with semaphore:
+                res = session.post(endpoint, json=payload, timeout=timeout)
+            if (res.status_code in [400, 413]) and (len(ids) > 1):
+                return None
+            res.raise_for_status()
+        except Exception as err:
+            # The session gives up on 429s with an error -- Those are
+            # backed off from like any other throttled batch
+            if not isRateLimitError(err):
+                raise
+            return {i: {"error": {"code": 429, "message": str(err)}} for i in ids}
+
+        body = res.json()
+        if not isinstance(body, list):
+            if not (isinstance(body, dict) and isinstance(body.get("error"), dict)):
+                body = {"error": {"message": f"unexpected response {body}"}}
+            error = body["error"]
+            if (len(ids) > 1) and _isBatchSizeError(error) and not _isThrottled(error):
+                return None
+            return {i: body for i in ids}
+
+        # Responses within a batch may come back in any order
+        return {x.get("id"): x for x in body if isinstance(x, dict)}
+
+    def collect(ids):
+        "The result (or final error) of each of `ids`"
+        results = {}
+        errors = {}
+        pending = list(ids)
+        for attempt in range(nRetries + 1):
+            if attempt > 0:
+                time.sleep(backoffFactor * 2**(attempt - 1))
+
+            responses = post(pending)
+            if responses is None:
+                mid = len(pending) // 2
+                for half in [pending[:mid], pending[mid:]]:
+                    halfResults, halfErrors = collect(half)
+                    results.update(halfResults)
+                    errors.update(halfErrors)
+                return results, errors
+
+            retry = []
+            for i in pending:
+                response = responses.get(i)
+                if response is None:
+                    errors[i] = {"message": "no response"}
+                    retry.append(i)
+                elif "error" in response:
+                    errors[i] = response["error"]
+                    if not _isRevert(response["error"]):
+                        retry.append(i)
+                else:
+                    results[i] = response.get("result")
+                    errors.pop(i, None)
+
+            pending = retry
+            if len(pending) == 0:
+                break
+
+        return results, errors
+
+    def sendBatch(ids):
+        results, errors = collect(ids)
+
+        # Only reverts can be given back as missing results -- Anything
+        # else (i.e. a timeout or node error) would silently drop data
+        failed = {
+            i: error for (i, error) in errors.items()
+            if not (allowReverts and _isRevert(error))
+        }
+        if len(failed) > 0:
+            i = min(failed.keys())
+            raise ValueError(
+                f"{len(failed)} of {len(ids)} JSON-RPC requests failed after "
+                f"{nRetries} retries -- {rpcRequests[i][0]} {rpcRequests[i][1]} "
+                f"gave {failed[i]}"
+            )
+
+        return [results.get(i) for i in ids]
+
+    return list(
+        itertools.chain.from_iterable(mapChunks(sendBatch, batches, nWorkers))
+    )
+
+
+def decodeOutput(w3, fn, result):
+    """
+    Decode the raw result of an `eth_call` to `fn` the same way that
+    `fn.call()` does -- Functions with a single output return that value
+    """
+    outputTypes = get_abi_output_types(fn.abi)
+    decoded = w3.codec.decode_abi(outputTypes, HexBytes(result))
+
+    if len(decoded) == 1:
+        return decoded[0]
+
+    return decoded
+
+
+def batchCall(w3, calls, batchSize=BATCH_SIZE, nWorkers=1, allowReverts=False):
+    """
+    Make many (historical) `eth_call`s with JSON-RPC batch requests
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object with an HTTP provider
+    calls : list(tuple(web3.contract.ContractFunction, int))
+        Pairs of a prepared contract function (i.e.
+        `pool.functions.exchangeRateCurrent()`) and the block the call
+        should be made at
+    batchSize : int
+        The number of calls sent in each HTTP request
+    nWorkers : int
+        The number of batches that are in flight at once
+    allowReverts : bool
+        Whether calls that revert give `None` rather than raising a
+        ValueError -- Other failures always raise (see `batchRequest`)
+
+    Returns
+    -------
+    results : list
+        The decoded output of each call in the same order as `calls`
+    """
+    calls = list(calls)
+    rpcRequests = [
+        (
+            "eth_call",
+            [
+                {"to": fn.address, "data": fn._encode_transaction_data()},
+                _toBlockIdentifier(block)
+            ]
+        )
+        for (fn, block) in calls
+    ]
+    results = batchRequest(
+        w3, rpcRequests, batchSize, nWorkers, allowReverts=allowReverts
+    )
+
+    return [
+        decodeOutput(w3, fn, result) if result is not None else None
+        for ((fn, _), result) in zip(calls, results)
+    ]
+
+
+def aggregateCalls(
+        w3, blockCalls, multicallAddress=None, multicallFirstBlock=None,
+        batchSize=BATCH_SIZE, nWorkers=1, allowFailure=False
+    ):
+    """
+    Read several pieces of contract state at each of several blocks
+
+    For blocks at or after `multicallFirstBlock` all of the calls for a
+    block are aggregated into a single `aggregate3` call to the Multicall3
+    contract at `multicallAddress`. Blocks before the aggregator existed
+    (or every block, if no aggregator is given) fall back to one
+    `eth_call` per function. Either way, all of the `eth_call`s are sent
+    in JSON-RPC batches
+
+    Aggregated calls are allowed to fail on their own so that one
+    reverting call (i.e. `exchangeRateCurrent` before a pool existed)
+    doesn't fail every other call at that block. Failed calls are retried
+    as plain `eth_call`s and the ones that still revert are either
+    reported with a ValueError or, with `allowFailure`, returned as
+    `None`. Requests that fail for any other reason (i.e. timeouts or node
+    errors that persist through the retries) always raise
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object with an HTTP provider
+    blockCalls : list(tuple(int, list(web3.contract.ContractFunction)))
+        Pairs of a block and the prepared contract functions to call at
+        that block
+    multicallAddress : str, optional
+        The address of the Multicall3 aggregator
+    multicallFirstBlock : int, optional
+        The block that the aggregator was deployed at
+    batchSize : int
+        The number of `eth_call`s sent in each HTTP request
+    nWorkers : int
+        The number of batches that are in flight at once
+    allowFailure : bool
+        Whether calls that revert give `None` rather than raising
+
+    Returns
+    -------
+    results : list(list)
+        The decoded output of each call grouped the same way as
+        `blockCalls`
+    """
+    blockCalls = list(blockCalls)
+
+    multicall = None
+    if multicallAddress is not None:
+        multicall = w3.eth.contract(
+            address=multicallAddress, abi=getABI("Multicall3")
+        )
+
+    def useMulticall(block):
+        if multicall is None:
+            return False
+        # Named blocks (i.e. "latest") are always after deployment
+        if (multicallFirstBlock is None) or not isinstance(
+            block, numbers.Integral
+        ):
+            return True
+
+        return block >= multicallFirstBlock
+
+    # Build the list of `eth_call`s -- One per block when using the
+    # aggregator and one per function otherwise
+    calls = []
+    for (block, fns) in blockCalls:
+        if useMulticall(block):
+            aggregate = multicall.functions.aggregate3(
+                [
+                    (fn.address, True, fn._encode_transaction_data())
+                    for fn in fns
+                ]
+            )
+            calls.append((aggregate, block))
+        else:
+            calls.extend((fn, block) for fn in fns)
+
+    results = iter(batchCall(w3, calls, batchSize, nWorkers, allowReverts=True))
+
+    # Unpack the results in the same order that the calls were built
+    out = []
+    failed = []
+    for (i, (block, fns)) in enumerate(blockCalls):
+        if useMulticall(block):
+            returnData = next(results)
+            if returnData is None:
+                returnData = [(False, b"")]*len(fns)
+            values = [
+                decodeOutput(w3, fn, data) if success else None
+                for (fn, (success, data)) in zip(fns, returnData)
+            ]
+        else:
+            values = [next(results) for _ in fns]
+
+        failed.extend((i, j) for (j, x) in enumerate(values) if x is None)
+        out.append(values)
+
+    # Failed aggregated calls get a second chance on their own
+    aggregated = [(i, j) for (i, j) in failed if useMulticall(blockCalls[i][0])]
+    if len(aggregated) > 0:
+        retried = batchCall(
+            w3,
+            [(blockCalls[i][1][j], blockCalls[i][0]) for (i, j) in aggregated],
+            batchSize, nWorkers, allowReverts=True
+        )
+        for ((i, j), x) in zip(aggregated, retried):
+            out[i][j] = x
+        failed = [(i, j) for (i, j) in failed if out[i][j] is None]
+
+    if (len(failed) > 0) and not allowFailure:
+        i, j = failed[0]
+        fn = blockCalls[i][1][j]
+        raise ValueError(
+            f"{len(failed)} of {sum(len(fns) for (_, fns) in blockCalls)} calls "
+            f"failed -- i.e. {fn.fn_name} on {fn.address} "
+            f"at block {blockCalls[i][0]}"
+        )
+
+    return out
@@ -0,0 +1,164 @@
+import threading
+
+from urllib.parse import urlsplit
+
+import requests
+import web3
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from acx.manifest import countRequest
+from acx.ratelimit import setRateLimit, waitForRateLimit
+from acx.replay import recordExchange, redirectRequest
+
+
+# Number of keep-alive connections kept open per host unless a host has
+# been given its own size with `setHostPoolSize`
+POOL_SIZE = 10
+
+# Number of hosts whose connection pools are kept around at once
+N_POOLS = 32
+
+_SESSIONS = {}
+_HOST_POOL_SIZES = {}
+_SESSION_LOCK = threading.Lock()
+
+
+def _hostPrefix(url):
+    "The `scheme://host/` prefix that adapters are mounted on"
+    parts = urlsplit(url)
+    assert(parts.scheme in ["http", "https"])
+
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    An `HTTPAdapter` that waits for the rate limit of the destination
+    (see `acx.ratelimit`) before sending each request
+
+    Requests are counted for the run manifest (see `acx.manifest`) and
+    are also recorded or sent to a stand-in server when `acx.replay` is
+    switched on
+    """
+    def send(self, request, **kwargs):
+        url = request.url
+        waitForRateLimit(url)
+        redirectRequest(request)
+
+        response = super().send(request, **kwargs)
+        countRequest(url, request, response)
+        recordExchange(url, request, response)
+
+        return response
+
+
+def _createAdapter(nRetries, backoffFactor, poolSize):
+    retry_strategy = Retry(
+        total=nRetries,
+        backoff_factor=backoffFactor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"]
+    )
+
+    return RateLimitedAdapter(
+        max_retries=retry_strategy,
+        pool_connections=N_POOLS,
+        pool_maxsize=poolSize
+    )
+
+
+def getSession(nRetries=5, backoffFactor=1.0):
+    """
+    Get the process-wide `requests.Session` for a retry policy
+
+    Every caller with the same retry policy shares one session, so
+    connections (and their TLS handshakes) are reused across requests
+    through keep-alive rather than being set up for every request.
+    Responses are requested gzip compressed
+
+    Parameters
+    ----------
+    nRetries : int
+        The number of times a failed request (connection errors and
+        429/5xx responses) is retried
+    backoffFactor : float
+        The urllib3 backoff factor between retries
+
+    Returns
+    -------
+    session : requests.Session
+        A thread-safe (for sending requests) session
+    """
+    with _SESSION_LOCK:
+        session = _SESSIONS.get((nRetries, backoffFactor))
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+            adapter = _createAdapter(nRetries, backoffFactor, POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+
+            # Hosts with their own pool size get their own adapter --
+            # requests uses the longest matching prefix
+            for (prefix, poolSize) in _HOST_POOL_SIZES.items():
+                session.mount(
+                    prefix, _createAdapter(nRetries, backoffFactor, poolSize)
+                )
+
+            _SESSIONS[(nRetries, backoffFactor)] = session
+
+    return session
+
+
+def setHostPoolSize(url, poolSize):
+    """
+    Set the number of keep-alive connections kept open to the host of
+    `url` (i.e. to match the number of concurrent requests made to an
+    RPC endpoint)
+
+    Parameters
+    ----------
+    url : str
+        Any URL on the host
+    poolSize : int
+        The maximum number of connections kept open to that host
+    """
+    assert(isinstance(poolSize, int) and poolSize > 0)
+    prefix = _hostPrefix(url)
+
+    with _SESSION_LOCK:
+        _HOST_POOL_SIZES[prefix] = poolSize
+        for ((nRetries, backoffFactor), session) in _SESSIONS.items():
+            session.mount(
+                prefix, _createAdapter(nRetries, backoffFactor, poolSize)
+            )
+
+
+def createProvider(endpoint, timeout=60, rateLimit=None):
+    """
+    Create a web3 HTTP provider for `endpoint` that sends its requests
+    through the shared session
+
+    Parameters
+    ----------
+    endpoint : str
+        The RPC node's URL
+    timeout : int
+        The number of seconds to wait for a response
+    rateLimit : float, optional
+        The number of requests per second allowed to `endpoint`
+
+    Returns
+    -------
+    provider : web3.HTTPProvider
+        The provider
+    """
+    if rateLimit is not None:
+        setRateLimit(endpoint, rateLimit, max(1, int(rateLimit)))
+
+    return web3.Web3.HTTPProvider(
+        endpoint, request_kwargs={"timeout": timeout}, session=getSession()
+    )
@@ -0,0 +1,80 @@
+import json
+import os
+
+
+class NdjsonSink:
+    """
+    An append-only file that stores one JSON encoded event per line
+
+    Each call to `write` appends and flushes a chunk of events, so the
+    events that have been collected are on disk even if a run is
+    interrupted and memory use doesn't grow with the number of events
+
+    Parameters
+    ----------
+    path : str
+        The file to write to
+    overwrite : bool
+        Whether to truncate `path` when the sink is opened rather than
+        appending to it
+    """
+    def __init__(self, path, overwrite=True):
+        self.path = path
+        self.nWritten = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._f = open(path, "w" if overwrite else "a")
+
+    def write(self, events):
+        "Append a list of JSON readable events to the file"
+        for event in events:
+            self._f.write(json.dumps(event))
+            self._f.write("\n")
+        self._f.flush()
+
+        self.nWritten += len(events)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def streamEvents(chunks, sink):
+    """
+    Write each chunk of events produced by `acx.utils.iterEvents` to
+    `sink` as soon as it arrives
+
+    Parameters
+    ----------
+    chunks : iterable(list(dict))
+        Chunks of JSON readable events
+    sink : NdjsonSink
+        Where the events are written
+
+    Returns
+    -------
+    nEvents : int
+        The number of events that were written
+    """
+    nEvents = 0
+    for events in chunks:
+        sink.write(events)
+        nEvents += len(events)
+
+    return nEvents
+
+
+def readNdjson(path):
+    "Iterate through the events stored in an NDJSON file one at a time"
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
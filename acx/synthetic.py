@@ -0,0 +1,697 @@
+import datetime as dt
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from eth_utils import to_checksum_address
+
+from acx.abis import getEventABI
+from acx.blockstore import SECONDS_PER_DAY, gridAnchors, writeBlockStore
+from acx.columnar import EventWriter, writeEventsBySymbol
+from acx.data.chains import ID_TO_SHORTNAME, SHORTNAME_TO_ID
+from acx.data.tokens import SYMBOL_TO_CHAIN_TO_ADDRESS, SYMBOL_TO_DECIMALS
+
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# Dates that the traveler blocks in `parameters.yaml` are pinned to -- The
+# synapse `first_block`s are 2022-01-01T00:00, `travel_end_block`s are
+# 2022-11-22T00:00 and the hop `last_block`s are 2022-09-01T00:00
+FIRST_BLOCK_TS = 1640995200
+TRAVEL_END_TS = 1669075200
+HOP_LAST_TS = 1661990400
+
+# Rough prices that synthetic amounts and prices are drawn around
+REFERENCE_PRICES = {
+    "DAI": 1.0,
+    "USDC": 1.0,
+    "USDT": 1.0,
+    "nUSD": 1.0,
+    "ETH": 1_500.0,
+    "WETH": 1_500.0,
+    "SGETH": 1_500.0,
+    "nETH": 1_500.0,
+    "WBTC": 20_000.0,
+}
+
+# Number of events that are built before being written out
+GENERATE_CHUNK = 100_000
+
+# Changed whenever the files that are generated change so that data
+# generated by an earlier version is never reused (see `benchmark.py`)
+FORMAT_VERSION = 2
+
+
+class ChainClock:
+    """
+    A linear block -> timestamp model for a single chain that runs through
+    two (block, timestamp) anchors
+
+    Parameters
+    ----------
+    block0, ts0 : int
+        The first anchor
+    block1, ts1 : int
+        The second anchor
+    """
+    def __init__(self, block0, ts0, block1, ts1):
+        assert(block1 > block0)
+
+        self.block0 = block0
+        self.ts0 = ts0
+        self.secondsPerBlock = (ts1 - ts0) / (block1 - block0)
+
+    def timestamps(self, blocks):
+        "The timestamp of each of `blocks`"
+        blocks = np.asarray(blocks, dtype=np.int64)
+        return np.floor(
+            self.ts0 + (blocks - self.block0)*self.secondsPerBlock
+        ).astype(np.int64)
+
+    def blocksAfterTs(self, timestamps):
+        "The first block at or after each of `timestamps`"
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        return (
+            self.block0 +
+            np.ceil((timestamps - self.ts0) / self.secondsPerBlock)
+        ).astype(np.int64)
+
+
+def chainClocks(params):
+    """
+    Build a `ChainClock` for every chain that the offline stages look up
+    blocks on from the dated blocks in `params`
+
+    Returns
+    -------
+    clocks : dict(int, ChainClock)
+    """
+    traveler = params["traveler"]
+
+    clocks = {}
+    for (chainId, info) in traveler["synapse"]["contract_info"].items():
+        clocks[chainId] = ChainClock(
+            info["first_block"], FIRST_BLOCK_TS,
+            traveler["travel_end_block"][chainId], TRAVEL_END_TS
+        )
+
+    # Hop is the only source with chains that aren't in the synapse list
+    for (chainId, fb) in traveler["hop"]["first_block"].items():
+        if chainId not in clocks:
+            clocks[chainId] = ChainClock(
+                fb, FIRST_BLOCK_TS, traveler["hop"]["last_block"][chainId],
+                HOP_LAST_TS
+            )
+
+    return clocks
+
+
+def _dayGrid(params, clocks):
+    "The (chainId, day timestamps, day blocks) that `blocks.py` would find"
+    blockParams = params["misc"]["block"]
+
+    out = []
+    for chain in blockParams["chains"]:
+        chainId = SHORTNAME_TO_ID[chain]
+        start = (
+            blockParams["start_ts_mainnet"] if chainId == 1
+            else blockParams["start_ts_nonmainnet"]
+        )
+        dayTimestamps = np.arange(
+            start, blockParams["end_ts"] + 1, blockParams["step_seconds"]
+        )
+        out.append((chainId, dayTimestamps, clocks[chainId].blocksAfterTs(dayTimestamps)))
+
+    return out
+
+
+def writeBlocks(params, clocks, directory):
+    "Write `raw/blocks.json` for the synthetic chains"
+    blockData = []
+    for (chainId, dayTimestamps, dayBlocks) in _dayGrid(params, clocks):
+        for (ts, block) in zip(dayTimestamps, dayBlocks):
+            blockData.append({
+                "chain": ID_TO_SHORTNAME[chainId],
+                "chainId": chainId,
+                "date": dt.datetime.utcfromtimestamp(int(ts)).strftime("%Y-%m-%dT%H:%M"),
+                "block": int(block)
+            })
+
+    with open(os.path.join(directory, "raw", "blocks.json"), "w") as f:
+        json.dump(blockData, f)
+
+
+def writeSyntheticBlockStore(params, clocks, directory):
+    """
+    Write a block store for the synthetic chains to `directory` -- The
+    grid blocks are anchored with `gridAnchors` the same way `blocks.py`
+    anchors the blocks it finds
+    """
+    for (chainId, dayTimestamps, dayBlocks) in _dayGrid(params, clocks):
+        firstBlock, lastBlock = dayBlocks[0], dayBlocks[-1]
+        blocks, timestamps = gridAnchors(dayBlocks, dayTimestamps)
+
+        ends = np.array([firstBlock, lastBlock])
+        writeBlockStore(
+            directory, chainId,
+            np.concatenate([blocks, ends]),
+            np.concatenate([timestamps, clocks[chainId].timestamps(ends)]),
+            firstBlock, lastBlock, params["misc"]["block"]["step_seconds"]
+        )
+
+
+def randomAddresses(rng, n):
+    "`n` distinct random checksum addresses"
+    raw = rng.bytes(20*n).hex()
+    out = list(dict.fromkeys(
+        to_checksum_address("0x" + raw[40*i:40*(i + 1)]) for i in range(n)
+    ))
+    assert(len(out) == n)
+
+    return out
+
+
+def randomHashes(rng, n):
+    "`n` random transaction hashes"
+    raw = rng.bytes(32*n).hex()
+    return ["0x" + raw[64*i:64*(i + 1)] for i in range(n)]
+
+
+def skewedChoice(rng, n, size):
+    """
+    Pick `size` indices from `range(n)` where low indices are picked far
+    more often -- A handful of users make most of the transfers
+    """
+    return np.minimum((n * rng.random(size)**3).astype(np.int64), n - 1)
+
+
+def sortedBlocks(rng, firstBlock, lastBlock, size):
+    "`size` random blocks between `firstBlock` and `lastBlock` in order"
+    return np.sort(rng.integers(firstBlock, lastBlock + 1, size))
+
+
+def tokenAmounts(rng, symbols):
+    "Log-normal USD sized amounts (in token units) of each of `symbols`"
+    usd = rng.lognormal(np.log(1_500), 1.6, len(symbols))
+    prices = np.array([REFERENCE_PRICES[s] for s in symbols])
+
+    return usd / prices
+
+
+def _event(name, address, args, block, tx, logIndex):
+    "An event in the layout that `acx.utils.findEvents` saves"
+    return {
+        "args": args,
+        "event": name,
+        "logIndex": logIndex,
+        "transactionIndex": 0,
+        "transactionHash": tx,
+        "address": address,
+        "blockHash": tx,
+        "blockNumber": int(block),
+    }
+
+
+def lpTransfers(rng, lps, tokens, pools, n):
+    """
+    Simulate LP token `Transfer`s of the pools in `pools` -- LPs mint,
+    partially burn, exit and hand their tokens to other LPs so that no
+    balance goes negative
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+    lps : list(str)
+        The LP population
+    tokens : list(str)
+        The symbol of each pool
+    pools : dict(str, tuple(str, int, int))
+        The address, first block and last block of each token's pool
+    n : int
+        The total number of transfers
+
+    Returns
+    -------
+    transfers : dict(str, list(dict))
+        The transfers of each token (the layout that `lp_events.py`
+        collects them in)
+    """
+    out = {}
+    for token in tokens:
+        address, firstBlock, lastBlock = pools[token]
+        nToken = n // len(tokens)
+        decimals = SYMBOL_TO_DECIMALS[token]
+
+        blocks = sortedBlocks(rng, firstBlock, lastBlock, nToken)
+        txs = randomHashes(rng, nToken)
+        who = skewedChoice(rng, len(lps), nToken)
+        to = skewedChoice(rng, len(lps), nToken)
+        action = rng.random(nToken)
+        minted = tokenAmounts(rng, [token]*nToken)
+
+        balances = {}
+        events = []
+        for i in range(nToken):
+            lp = lps[who[i]]
+            balance = balances.get(lp, 0)
+
+            if (balance > 0) and (action[i] < 0.15):
+                src, dest, value = lp, ZERO_ADDRESS, balance
+            elif (balance > 0) and (action[i] < 0.30):
+                src, dest, value = lp, ZERO_ADDRESS, balance // 2
+            elif (balance > 0) and (action[i] < 0.35) and (lps[to[i]] != lp):
+                src, dest, value = lp, lps[to[i]], balance // 2
+            else:
+                src, dest, value = ZERO_ADDRESS, lp, int(minted[i] * 10**decimals)
+
+            if src != ZERO_ADDRESS:
+                balances[src] = balances[src] - value
+            if dest != ZERO_ADDRESS:
+                balances[dest] = balances.get(dest, 0) + value
+
+            events.append(_event(
+                "Transfer", address, {"from": src, "to": dest, "value": value},
+                blocks[i], txs[i], 0
+            ))
+
+        out[token] = events
+
+    return out
+
+
+def v1Relays(rng, bridgoors, tokens, pools, firstBlock, lastBlock, n, nDisputes):
+    """
+    Simulate v1 `DepositRelayed` events (and a few disputes) of each token
+    in the layout that `bridgoor_events.py` collects them in
+    """
+    relays = {token: [] for token in tokens}
+    disputes = {token: [] for token in tokens}
+
+    symbols = [tokens[i] for i in rng.integers(0, len(tokens), n)]
+    amounts = tokenAmounts(rng, symbols)
+    blocks = sortedBlocks(rng, firstBlock, lastBlock, n)
+    origins = rng.choice([10, 288, 42161], n)
+    senders = skewedChoice(rng, len(bridgoors), n)
+    txs = randomHashes(rng, n)
+    depositHashes = randomHashes(rng, n)
+    disputed = set(rng.choice(n, min(nDisputes, n), replace=False))
+
+    for i in range(n):
+        token = symbols[i]
+        sender = bridgoors[senders[i]]
+        depositData = [
+            int(origins[i]), i, sender, sender,
+            int(amounts[i] * 10**SYMBOL_TO_DECIMALS[token]), 0, 0, 0
+        ]
+        args = {
+            "depositHash": depositHashes[i],
+            "depositData": depositData,
+            "relay": [0, sender, 0, 0, 0, 0, 0],
+            "relayAncillaryDataHash": txs[i],
+        }
+        event = _event("DepositRelayed", pools[token], args, blocks[i], txs[i], 0)
+        relays[token].append(event)
+
+        if i in disputed:
+            disputes[token].append(_event(
+                "RelayDisputed", pools[token],
+                {"depositHash": depositHashes[i], "relayHash": txs[i],
+                 "disputer": sender},
+                blocks[i] + 1, txs[i], 1
+            ))
+
+    return relays, disputes
+
+
+def v2Deposits(rng, bridgoors, tokens, spokes, blockRanges, n):
+    """
+    Simulate v2 `FundsDeposited` events in the layout of the JSON readable
+    events that `bridgoor_events.py` collects, yielded in chunks -- Each
+    origin chain's deposits are yielded together and in block order
+
+    Parameters
+    ----------
+    spokes : dict(int, str)
+        The spoke pool address on each origin chain
+    blockRanges : dict(int, tuple(int, int))
+        The blocks that deposits are made in on each origin chain
+    """
+    chains = list(spokes.keys())
+    nChain = np.bincount(rng.integers(0, len(chains), n), minlength=len(chains))
+
+    depositId = 0
+    for (origin, nOrigin) in zip(chains, nChain):
+        fb, lb = blockRanges[origin]
+        blocks = sortedBlocks(rng, fb, lb, nOrigin)
+
+        for start in range(0, nOrigin, GENERATE_CHUNK):
+            size = min(GENERATE_CHUNK, nOrigin - start)
+
+            symbols = [tokens[i] for i in rng.integers(0, len(tokens), size)]
+            amounts = tokenAmounts(rng, symbols)
+            destinations = [chains[i] for i in rng.integers(0, len(chains), size)]
+            depositors = skewedChoice(rng, len(bridgoors), size)
+            others = rng.integers(0, len(bridgoors), size)
+            sameRecipient = rng.random(size) < 0.9
+            txs = randomHashes(rng, size)
+
+            chunk = []
+            for i in range(size):
+                depositor = bridgoors[depositors[i]]
+                args = {
+                    "amount": int(amounts[i] * 10**SYMBOL_TO_DECIMALS[symbols[i]]),
+                    "originChainId": origin,
+                    "destinationChainId": destinations[i],
+                    "relayerFeePct": 0,
+                    "quoteTimestamp": 0,
+                    "depositId": depositId,
+                    "originToken": SYMBOL_TO_CHAIN_TO_ADDRESS[symbols[i]][origin],
+                    "recipient": depositor if sameRecipient[i] else bridgoors[others[i]],
+                    "depositor": depositor,
+                }
+                chunk.append(_event(
+                    "FundsDeposited", spokes[origin], args,
+                    blocks[start + i], txs[i], 0
+                ))
+                depositId += 1
+
+            yield chunk
+
+
+def travelerTransfers(rng, travelers, sources, n, extra=None):
+    """
+    Simulate the transfers of another bridge as a DataFrame
+
+    Parameters
+    ----------
+    travelers : list(str)
+        The traveler population
+    sources : list(tuple(int, str, int, int))
+        The (chainId, symbol, first block, last block) of each contract
+        that transfers come from
+    n : int
+        The number of transfers
+    extra : callable, optional
+        Adds bridge specific columns to the DataFrame
+
+    Returns
+    -------
+    df : pd.DataFrame
+        Columns `chainId`, `block`, `tx`, `traveler`, `symbol` and
+        `amount` (plus whatever `extra` adds)
+    """
+    source = rng.integers(0, len(sources), n)
+    fb = np.array([x[2] for x in sources])[source]
+    lb = np.array([x[3] for x in sources])[source]
+    symbols = [sources[i][1] for i in source]
+
+    df = pd.DataFrame({
+        "chainId": np.array([x[0] for x in sources])[source],
+        "block": fb + (rng.random(n)*(lb - fb)).astype(np.int64),
+        "tx": randomHashes(rng, n),
+        "traveler": [travelers[i] for i in skewedChoice(rng, len(travelers), n)],
+        "symbol": symbols,
+        "amount": tokenAmounts(rng, symbols),
+    })
+    if extra is not None:
+        extra(df)
+
+    return df.sort_values(["chainId", "block"], ignore_index=True)
+
+
+def writeTravelerTransfers(params, rng, clocks, travelers, volume, directory):
+    "Write the `raw/*_transfers.parquet` files of the other bridges"
+    traveler = params["traveler"]
+    raw = os.path.join(directory, "raw")
+
+    # cBridge -- Relays on the destination chain
+    cbridgeInfo = traveler["cbridge"]["contract_info"]
+    cbridgeSources = [
+        (chainId, token, info["first_block"], info["last_block"])
+        for (chainId, info) in cbridgeInfo.items()
+        for token in ["DAI", "USDC", "USDT", "WETH"]
+    ]
+    def cbridgeExtra(df):
+        df["originChainId"] = rng.choice(list(cbridgeInfo.keys()), len(df))
+        df["transferId"] = randomHashes(rng, len(df))
+        df["sender"] = df["traveler"]
+    (
+        travelerTransfers(
+            rng, travelers, cbridgeSources, volume["cbridge_transfers"],
+            cbridgeExtra
+        )
+        .rename(columns={"chainId": "destinationChainId", "traveler": "receiver"})
+        .loc[:, [
+            "block", "tx", "originChainId", "destinationChainId",
+            "transferId", "sender", "receiver", "symbol", "amount"
+        ]]
+        .to_parquet(os.path.join(raw, "cbridge_transfers.parquet"))
+    )
+
+    # Hop -- Transfers from the subgraph come with their timestamp
+    hopInfo = traveler["hop"]
+    hopSources = [
+        (chainId, token, fb, hopInfo["last_block"][chainId])
+        for (chainId, fb) in hopInfo["first_block"].items()
+        for token in ["DAI", "USDC", "USDT", "ETH"]
+    ]
+    def hopExtra(df):
+        df["timestamp"] = np.zeros(len(df), dtype=np.int64)
+        for chainId in df["chainId"].unique():
+            mask = df["chainId"] == chainId
+            df.loc[mask, "timestamp"] = clocks[chainId].timestamps(df.loc[mask, "block"])
+        df["destinationChainId"] = rng.choice(list(hopInfo["first_block"].keys()), len(df))
+        df["sender"] = df["traveler"]
+    hop = (
+        travelerTransfers(
+            rng, travelers, hopSources, volume["hop_transfers"], hopExtra
+        )
+        .rename(columns={
+            "chainId": "originChainId", "block": "blockNumber",
+            "traveler": "recipient"
+        })
+    )
+    hop["dt"] = pd.to_datetime(hop["timestamp"], unit="s")
+    hop.to_parquet(os.path.join(raw, "hop_transfers.parquet"))
+
+    # Stargate -- `SwapRemote`s of each pool
+    stgSources = [
+        (chainId, token, info["first_block"], info["last_block"])
+        for (chainId, pools) in traveler["stg"]["contract_info"].items()
+        for (token, info) in pools.items()
+    ]
+    (
+        travelerTransfers(rng, travelers, stgSources, volume["stg_transfers"])
+        .rename(columns={"chainId": "destinationChainId", "traveler": "to"})
+        .loc[:, ["block", "tx", "destinationChainId", "to", "symbol", "amount"]]
+        .to_parquet(os.path.join(raw, "stg_transfers.parquet"))
+    )
+
+    # Synapse -- `TokenMint`s/`TokenWithdraw`s on the destination chain
+    synapseSources = [
+        (chainId, token, info["first_block"], info["last_block"])
+        for (chainId, info) in traveler["synapse"]["contract_info"].items()
+        for token in ["USDC", "nUSD", "nETH", "WETH"]
+    ]
+    def synapseExtra(df):
+        df["eventName"] = rng.choice(["TokenMint", "TokenWithdrawAndRemove"], len(df))
+        df["kappa"] = randomHashes(rng, len(df))
+        df["fee"] = df["amount"] * 0.0005
+    (
+        travelerTransfers(
+            rng, travelers, synapseSources, volume["synapse_transfers"],
+            synapseExtra
+        )
+        .rename(columns={"traveler": "recipient"})
+        .loc[:, [
+            "eventName", "kappa", "block", "tx", "chainId", "recipient",
+            "symbol", "amount", "fee"
+        ]]
+        .to_parquet(os.path.join(raw, "synapse_transfers.parquet"))
+    )
+
+
+def writePrices(params, rng, directory):
+    "Write `raw/prices.json` with a daily random walk around each price"
+    priceParams = params["misc"]["price"]
+    days = np.arange(priceParams["start_ts"], priceParams["end_ts"] + 1, SECONDS_PER_DAY)
+
+    dfs = []
+    for token in priceParams["tokens"]:
+        ref = REFERENCE_PRICES[token]
+        sigma = 0.001 if ref == 1.0 else 0.03
+        prices = pd.DataFrame({
+            "date": [dt.datetime.utcfromtimestamp(int(x)).date() for x in days],
+            "symbol": token,
+            "price": ref * np.exp(np.cumsum(rng.normal(0.0, sigma, len(days)))),
+        })
+        dfs.append(prices)
+
+    priceDf = pd.concat(dfs, axis=0)
+    priceDf.to_json(os.path.join(directory, "raw", "prices.json"), orient="records")
+
+
+def writeExchangeRates(params, clocks, directory):
+    """
+    Write `raw/v{1,2}ExchangeRates.json` -- Rates are zero outside of the
+    pools' lifetimes and grow slowly from 1 as fees accrue
+    """
+    (_, dayTimestamps, dayBlocks) = [
+        x for x in _dayGrid(params, clocks) if x[0] == 1
+    ][0]
+    lpParams = params["lp"]
+
+    for version in [1, 2]:
+        rows = []
+        for token in lpParams["tokens"]:
+            if version == 1:
+                firstBlock = params["across"]["v1"]["mainnet"]["bridge"][token]["first_block"]
+                lastBlock = lpParams["v1_end_block"]
+            else:
+                firstBlock = lpParams["v2_lp_token_creation_block"][token]
+                lastBlock = lpParams["v2_end_block"]
+
+            firstTs = clocks[1].timestamps([firstBlock])[0]
+            for (ts, block) in zip(dayTimestamps, dayBlocks):
+                active = firstBlock <= block <= lastBlock
+                rows.append({
+                    "date": dt.datetime.utcfromtimestamp(int(ts)).strftime("%Y-%m-%d"),
+                    "block": int(block),
+                    "symbol": token,
+                    "exchangeRate": (
+                        1.0 + 0.0002*(ts - firstTs) / SECONDS_PER_DAY if active else 0.0
+                    )
+                })
+
+        with open(os.path.join(directory, "raw", f"v{version}ExchangeRates.json"), "w") as f:
+            json.dump(rows, f)
+
+
+def generate(params, scale, directory, seed=0):
+    """
+    Write synthetic `raw/` inputs (and the `final/community_rewards.json`
+    that is maintained by hand) for the offline stages to `directory`
+
+    Every volume in `params["benchmark"]["volume"]` is multiplied by
+    `scale`. The block store is not written (see `writeSyntheticBlockStore`)
+    because it doesn't depend on the scale
+
+    Parameters
+    ----------
+    params : dict
+        The contents of `parameters.yaml`
+    scale : float
+        Multiple of the base volumes to generate
+    directory : str
+        The folder that `raw/`, `intermediate/` and `final/` are created in
+    seed : int
+        Seed for the random number generator
+
+    Returns
+    -------
+    counts : dict(str, int)
+        The number of records generated of each kind
+    """
+    rng = np.random.default_rng(seed)
+    volume = {k: max(1, int(v * scale)) for (k, v) in params["benchmark"]["volume"].items()}
+    for folder in ["raw", "intermediate", "final"]:
+        os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+    clocks = chainClocks(params)
+    writeBlocks(params, clocks, directory)
+    writePrices(params, rng, directory)
+    writeExchangeRates(params, clocks, directory)
+
+    # Populations overlap so that the exclusions in `bt_rewards.py` (Across
+    # users and LPs) and `bt_final.py` (travelers who used Across) apply
+    nLps, nBridgoors, nTravelers = volume["lps"], volume["bridgoors"], volume["travelers"]
+    bridgoorStart = nLps // 2
+    travelerStart = bridgoorStart + nBridgoors // 2
+    addresses = randomAddresses(rng, max(bridgoorStart + nBridgoors, travelerStart + nTravelers))
+    lps = addresses[:nLps]
+    bridgoors = addresses[bridgoorStart:bridgoorStart + nBridgoors]
+    travelers = addresses[travelerStart:travelerStart + nTravelers]
+
+    # LP transfers
+    lpParams = params["lp"]
+    tokens = lpParams["tokens"]
+    v1Bridges = params["across"]["v1"]["mainnet"]["bridge"]
+    v1Pools = {
+        token: (v1Bridges[token]["address"], v1Bridges[token]["first_block"], lpParams["v1_end_block"])
+        for token in tokens
+    }
+    lpTokens = randomAddresses(rng, len(tokens))
+    v2Pools = {
+        token: (lpTokens[i], lpParams["v2_lp_token_creation_block"][token], lpParams["v2_end_block"])
+        for (i, token) in enumerate(tokens)
+    }
+    for (version, pools) in [(1, v1Pools), (2, v2Pools)]:
+        transfers = lpTransfers(rng, lps, tokens, pools, volume[f"v{version}_lp_transfers"])
+        writeEventsBySymbol(
+            os.path.join(directory, "raw", f"v{version}Transfers.parquet"),
+            getEventABI("BridgePool" if version == 1 else "ERC20", "Transfer"),
+            transfers
+        )
+
+    # Across relays and deposits
+    bridgoorParams = params["bridgoor"]
+    relays, disputes = v1Relays(
+        rng, bridgoors, bridgoorParams["tokens"],
+        {token: v1Bridges[token]["address"] for token in bridgoorParams["tokens"]},
+        bridgoorParams["v1_start_block"], bridgoorParams["v1_end_block"],
+        volume["v1_relays"], volume["v1_disputes"]
+    )
+    writeEventsBySymbol(
+        os.path.join(directory, "raw", "v1Relays.parquet"),
+        getEventABI("BridgePool", "DepositRelayed"), relays
+    )
+    writeEventsBySymbol(
+        os.path.join(directory, "raw", "v1DisputedRelays.parquet"),
+        getEventABI("BridgePool", "RelayDisputed"), disputes
+    )
+
+    # Deposits run until the end of the traveler window so that travelers
+    # can complete their Across transfers
+    spokes = {
+        SHORTNAME_TO_ID[chain]: info["spoke"]["address"]
+        for (chain, info) in params["across"]["v2"].items()
+    }
+    blockRanges = {
+        chainId: (bridgoorParams["v2_start_block"][chainId], params["traveler"]["travel_end_block"][chainId])
+        for chainId in spokes.keys()
+    }
+    with EventWriter(
+            os.path.join(directory, "raw", "v2Deposits.parquet"),
+            getEventABI("SpokePool", "FundsDeposited"),
+            sortBy=["originChainId", "blockNumber", "logIndex"]
+        ) as writer:
+        for chunk in v2Deposits(
+            rng, bridgoors + travelers[:nTravelers // 10], bridgoorParams["tokens"],
+            spokes, blockRanges, volume["v2_deposits"]
+        ):
+            writer.write(chunk)
+
+    # Other bridges
+    writeTravelerTransfers(params, rng, clocks, travelers, volume, directory)
+
+    # Hand maintained lists
+    sybils = [travelers[i] for i in rng.choice(nTravelers, min(volume["sybils"], nTravelers), replace=False)]
+    with open(os.path.join(directory, "raw", "sybil.json"), "w") as f:
+        json.dump(sybils, f)
+
+    community = rng.choice(len(addresses), min(volume["community"], len(addresses)), replace=False)
+    with open(os.path.join(directory, "final", "community_rewards.json"), "w") as f:
+        json.dump({addresses[i]: float(rng.choice([2_000, 3_000, 5_000])) for i in community}, f)
+
+    return {
+        "lps": nLps,
+        "bridgoors": nBridgoors,
+        "travelers": nTravelers,
+        "lpTransfers": volume["v1_lp_transfers"] + volume["v2_lp_transfers"],
+        "acrossTransfers": volume["v1_relays"] + volume["v2_deposits"],
+        "travelerTransfers": sum(
+            volume[f"{bridge}_transfers"] for bridge in ["cbridge", "hop", "stg", "synapse"]
+        ),
+    }
@@ -3,7 +3,7 @@ import time
 
 import requests
 
-from acx.utils import createSessionWithRetries
+from acx.session import getSession
 
 
 THEGRAPHURL = "https://api.thegraph.com/"
@@ -136,8 +136,8 @@ def submit_single_query(table, variables, arguments, organization, subgraph):
     subgraph : str
         The subgraph the table belongs to
     """
-    # Requests session with retries
-    session = createSessionWithRetries(nRetries=5, backoffFactor=1.0)
+    # Shared requests session with retries (reuses open connections)
+    session = getSession(nRetries=5, backoffFactor=1.0)
 
     # Build query
     query = build_query(table, variables, arguments)
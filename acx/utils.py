@@ -1,7 +1,11 @@
 import json
 import requests
+import threading
 import time
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -10,9 +14,14 @@ import web3
 from typing import Any, Dict, Union
 
 from eth_typing import HexStr
+from eth_utils import to_checksum_address
 from hexbytes import HexBytes
 from web3.datastructures import AttributeDict
 from web3._utils.encoding import FriendlyJsonSerde
+from web3._utils.filters import construct_event_topic_set
+
+from acx.decode import EventDecoder
+from acx.session import POOL_SIZE, getSession, setHostPoolSize
 
 
 class Web3JsonEncoder(json.JSONEncoder):
@@ -36,10 +45,416 @@ def to_json(obj: Dict[Any, Any]) -> str:
     return FriendlyJsonSerde().json_encode(obj, cls=Web3JsonEncoder)
 
 
-def findEvents(w3, event, startBlock, endBlock, blockStep, argFilters, v=False):
+def toJsonable(obj: Any) -> Any:
+    """
+    Convert a complex object (like an event log) into plain dicts, lists,
+    strings and numbers -- Gives the same result as
+    `json.loads(to_json(obj))` without building the intermediate string
+    """
+    if isinstance(obj, (dict, AttributeDict)):
+        return {str(k): toJsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [toJsonable(x) for x in obj]
+    if isinstance(obj, HexBytes):
+        return HexStr(obj.hex())
+    if isinstance(obj, bytes):
+        return obj.hex()
+
+    return obj
+
+
+# Default number of requests that may be in flight against a single RPC
+# endpoint at once -- Can be changed per provider with
+# `setProviderConcurrency`
+PROVIDER_CONCURRENCY = 4
+
+_PROVIDER_SEMAPHORES = {}
+_PROVIDER_LOCK = threading.Lock()
+
+
+def _providerKey(w3):
+    "Identifies the endpoint that a web3 object sends its requests to"
+    return getattr(w3.provider, "endpoint_uri", None) or id(w3.provider)
+
+
+def setProviderConcurrency(w3, limit):
+    """
+    Set the maximum number of concurrent requests that will be sent to
+    the endpoint behind `w3`
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object
+    limit : int
+        The maximum number of requests in flight for that endpoint
+    """
+    assert(isinstance(limit, int) and limit > 0)
+
+    with _PROVIDER_LOCK:
+        _PROVIDER_SEMAPHORES[_providerKey(w3)] = threading.BoundedSemaphore(limit)
+
+    # Keep enough connections open that requests don't wait on the pool
+    endpoint = getattr(w3.provider, "endpoint_uri", None)
+    if (endpoint is not None) and (limit > POOL_SIZE):
+        setHostPoolSize(endpoint, limit)
+
+
+def getProviderSemaphore(w3):
+    "Retrieve (or create) the semaphore that guards the endpoint behind `w3`"
+    key = _providerKey(w3)
+    with _PROVIDER_LOCK:
+        if key not in _PROVIDER_SEMAPHORES:
+            _PROVIDER_SEMAPHORES[key] = threading.BoundedSemaphore(
+                PROVIDER_CONCURRENCY
+            )
+
+        return _PROVIDER_SEMAPHORES[key]
+
+
+def mapChunks(fn, chunks, nWorkers=1):
+    """
+    Apply `fn` to each element of `chunks` and yield the results in the
+    same order as `chunks`
+
+    When `nWorkers > 1` the calls are made from a pool of threads and at
+    most `2 * nWorkers` chunks are in flight at a time so that results
+    that come back early don't pile up in memory
+
+    Parameters
+    ----------
+    fn : callable
+        Function applied to each chunk
+    chunks : iterable
+        The chunks to process
+    nWorkers : int
+        The number of threads used to process chunks
+    """
+    assert(isinstance(nWorkers, int) and nWorkers > 0)
+
+    if nWorkers == 1:
+        for chunk in chunks:
+            yield fn(chunk)
+        return
+
+    with ThreadPoolExecutor(max_workers=nWorkers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(fn, chunk))
+
+            if len(pending) >= 2*nWorkers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+# Pieces of the error messages that providers return when a request for
+# logs covered too many blocks/results or took too long to answer -- For
+# example, Infura responds with "query returned more than 10000 results"
+# and Alchemy with "Log response size exceeded". Generic words like
+# "exceeded" also show up in rate limit errors so they aren't used
+RANGE_ERROR_MESSAGES = [
+    "returned more than", "response size", "block range", "range is too",
+    "range too large", "too many logs", "too many results", "timeout",
+    "timed out",
+]
+
+# Pieces of the error messages (and the JSON-RPC/HTTP codes) that
+# providers return when requests are being throttled -- i.e. Infura's
+# "project ID request rate exceeded" or "daily request count exceeded"
+RATE_LIMIT_MESSAGES = [
+    "rate limit", "rate exceeded", "request rate", "too many requests",
+    "count exceeded", "daily limit", "capacity", "throttl",
+]
+RATE_LIMIT_CODES = [429, -32029]
+
+# Blocks behind the head that are treated as final on chains whose
+# nodes don't support the `finalized` block tag
+FINALITY_DEPTH = 256
+
+# Adaptive block steps are never allowed to grow beyond this multiple of
+# the `blockStep` that a caller asked for
+ADAPTIVE_MAX_MULTIPLIER = 32
+
+# Adaptive block steps are doubled whenever a range contains fewer than
+# this many events
+ADAPTIVE_SPARSE_EVENTS = 1_000
+
+
+def _rpcError(err):
+    "The (code, lowercase message) of the JSON-RPC error that web3 raised"
+    # web3 raises a ValueError with the JSON-RPC error as its argument
+    if isinstance(err, ValueError) and len(err.args) > 0:
+        msg = err.args[0]
+        code = None
+        if isinstance(msg, dict):
+            code = msg.get("code")
+            msg = msg.get("message", "")
+
+        return code, str(msg).lower()
+
+    return None, None
+
+
+def isRateLimitError(err):
+    """
+    Determines whether an exception raised while requesting logs means
+    that the provider is throttling requests -- The same range should be
+    retried after backing off rather than split
+    """
+    # The session retries 429s (and 5xx responses) itself (see
+    # `acx.session`) and gives up with a RetryError
+    if isinstance(err, requests.exceptions.RetryError):
+        return True
+    if isinstance(err, requests.exceptions.HTTPError):
+        return (err.response is not None) and (err.response.status_code == 429)
+
+    code, msg = _rpcError(err)
+    if msg is None:
+        return False
+
+    return (code in RATE_LIMIT_CODES) or any(x in msg for x in RATE_LIMIT_MESSAGES)
+
+
+def isRangeError(err):
+    """
+    Determines whether an exception raised while requesting logs means
+    that the requested range was too large (or too slow) and should be
+    split into smaller ranges
+    """
+    if isinstance(err, requests.exceptions.Timeout):
+        return True
+    if isRateLimitError(err):
+        return False
+
+    _, msg = _rpcError(err)
+    if msg is None:
+        return False
+
+    return any(x in msg for x in RANGE_ERROR_MESSAGES)
+
+
+def finalizedBlock(w3):
+    """
+    The latest block that can't be reorganized anymore -- The node's
+    `finalized` block or, if it doesn't know that tag, `FINALITY_DEPTH`
+    blocks behind the latest block
+    """
+    try:
+        return w3.eth.get_block("finalized")["number"]
+    except Exception:
+        return max(0, w3.eth.block_number - FINALITY_DEPTH)
+
+
+def getLogsSplitting(getLogs, bs, be, nRetries=5, backoffFactor=1.0, v=False):
+    """
+    Calls `getLogs(bs, be)` and, if the provider complains that the range
+    is too large, splits the range in half and requests each half
+    separately. Throttled requests are retried with the same range after
+    backing off
+
+    Parameters
+    ----------
+    getLogs : callable
+        A function that takes a (fromBlock, toBlock) pair and returns the
+        logs in that range
+    bs : int
+        The first block of the range
+    be : int
+        The last block of the range (inclusive)
+    nRetries : int
+        The number of times a single block (or a throttled request) is
+        retried before giving up
+    backoffFactor : float
+        Seconds slept before retrying are `backoffFactor * 2**attempt`
+    v : bool
+        Verbose
+
+    Returns
+    -------
+    logs : list
+        The logs between `bs` and `be` in the order the provider returned
+        them
+    nSplits : int
+        The number of times that the range had to be split
+    """
+    attempt = 0
+    while True:
+        try:
+            return getLogs(bs, be), 0
+        except Exception as err:
+            # Splitting would only send more requests while throttled
+            if isRateLimitError(err):
+                if attempt >= nRetries:
+                    raise
+                if v:
+                    print(f"Throttled on blocks {bs} to {be}: {err}")
+                time.sleep(backoffFactor * 2**attempt)
+                attempt += 1
+                continue
+
+            if not isRangeError(err):
+                raise
+
+            # Split ranges that contain more than one block and retry each
+            # half -- The halves are concatenated so ordering is preserved
+            if bs < be:
+                mid = (bs + be) // 2
+                if v:
+                    print(f"Splitting blocks {bs} to {be} at {mid}: {err}")
+
+                left, nLeft = getLogsSplitting(
+                    getLogs, bs, mid, nRetries, backoffFactor, v
+                )
+                right, nRight = getLogsSplitting(
+                    getLogs, mid + 1, be, nRetries, backoffFactor, v
+                )
+
+                return left + right, 1 + nLeft + nRight
+
+            # Single blocks can't be split so all we can do is wait
+            if attempt >= nRetries:
+                raise
+            time.sleep(backoffFactor * 2**attempt)
+            attempt += 1
+
+
+def iterLogRanges(
+        w3, getLogs, process, startBlock, endBlock, blockStep, v=False,
+        nWorkers=1, adaptive=False, cache=None, cacheKey=None, prescan=None
+    ):
+    """
+    Splits `startBlock` to `endBlock` (inclusive) into block ranges,
+    requests the logs of each range with `getLogs` and yields
+    `process(logs)` for each range in block order
+
+    This is the machinery shared by `iterEvents` and `iterEventsMulti`
+    -- See `iterEvents` for a description of `blockStep`, `nWorkers`,
+    `adaptive`, `cache` and `prescan`
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object
+    getLogs : callable
+        Takes a (fromBlock, toBlock) pair and returns the logs in that
+        range
+    process : callable
+        Converts the list of logs for a range into the yielded value
+    cache : acx.cache.EventCache, optional
+        An on-disk cache -- `process` must return a list of JSON
+        readable events when a cache is used
+    cacheKey : str, optional
+        The key that the events are stored under in `cache`
+    """
+    # Make sure block arguments are meaningful... i.e. >0 and an integer
+    assert(isinstance(startBlock, int) and startBlock >= 0)
+    assert(isinstance(endBlock, int) and endBlock > 0)
+    assert(isinstance(blockStep, int) and blockStep > 0)
+    assert(startBlock < endBlock)
+
+    semaphore = getProviderSemaphore(w3)
+
+    # The step is shared between the range generator and the workers so
+    # that workers can widen/narrow the ranges that haven't been issued --
+    # Workers update it concurrently so every access holds the lock
+    state = {"step": blockStep}
+    stepLock = threading.Lock()
+    maxStep = ADAPTIVE_MAX_MULTIPLIER * blockStep if adaptive else blockStep
+
+    # Cached ranges are read from disk and only the gaps are downloaded --
+    # Blocks that may still be reorganized are never cached
+    finalized = None
+    if cache is not None:
+        segments = cache.segments(cacheKey, startBlock, endBlock)
+        if any(not isCached for (_, _, isCached) in segments):
+            finalized = finalizedBlock(w3)
+    else:
+        segments = [(startBlock, endBlock, False)]
+
+    def blockRanges():
+        for (segmentStart, segmentEnd, isCached) in segments:
+            if isCached:
+                for (bs, be, path) in cache.chunkFiles(
+                    cacheKey, segmentStart, segmentEnd
+                ):
+                    yield (max(bs, segmentStart), min(be, segmentEnd), path)
+                continue
+
+            bs = segmentStart
+            while bs <= segmentEnd:
+                with stepLock:
+                    step = state["step"]
+                be = min(bs + step - 1, segmentEnd)
+                yield (bs, be, None)
+                bs = be + 1
+
+    def getLogsLimited(fromBlock, toBlock):
+        with semaphore:
+            return getLogs(fromBlock, toBlock)
+
+    def getChunk(blockRange):
+        bs, be, cachePath = blockRange
+
+        if cachePath is not None:
+            return cache.loadFile(cachePath, bs, be)
+
+        if v:
+            print(
+                f"Beginning block {bs}\n"
+                f"Ending block {be}"
+            )
+
+        # Only request the span between the first and last blocks that
+        # may contain a match -- Ranges without any are skipped entirely
+        if prescan is not None:
+            candidates = prescan(bs, be)
+            if len(candidates) == 0:
+                logs, nSplits = [], 0
+            else:
+                logs, nSplits = getLogsSplitting(
+                    getLogsLimited, candidates[0], candidates[-1], v=v
+                )
+        else:
+            logs, nSplits = getLogsSplitting(getLogsLimited, bs, be, v=v)
+        nOccurrences = len(logs)
+
+        if v:
+            print(f"Blocks {bs} to {be} contained {nOccurrences} transactions")
+
+        if adaptive:
+            with stepLock:
+                if nSplits > 0:
+                    state["step"] = max(blockStep, state["step"] // 2)
+                elif nOccurrences < ADAPTIVE_SPARSE_EVENTS:
+                    state["step"] = min(maxStep, state["step"] * 2)
+
+        out = process(logs)
+
+        if cache is not None:
+            cache.store(cacheKey, bs, be, out, finalizedBlock=finalized)
+
+        return out
+
+    yield from mapChunks(getChunk, blockRanges(), nWorkers)
+
+
+def iterEvents(
+        w3, event, startBlock, endBlock, blockStep, argFilters, v=False,
+        nWorkers=1, adaptive=False, cache=None, prescan=None
+    ):
     """
     Find all instances of a particular event between `startBlock` and
-    `endBlock`
+    `endBlock` and yield them one block range at a time so that only a
+    few ranges are ever held in memory
+
+    Ranges that the provider refuses to serve (too many results or a
+    timeout) are split in half and retried. If a `cache` is given then
+    only the block ranges that it doesn't already hold are requested.
+    Logs are requested with raw `eth_getLogs` calls and all of the logs
+    in a range are decoded together by an `acx.decode.EventDecoder`
+    rather than formatting each one with web3
 
     Parameters
     ----------
@@ -50,7 +465,7 @@ def findEvents(w3, event, startBlock, endBlock, blockStep, argFilters, v=False):
     startBlock : int
         The block to start searching on
     endBlock : int
-        The block to stop searching on
+        The block to stop searching on (inclusive)
     blockStep : int
         The number of blocks to download at a time -- This could be
         "infinite" if the RPC provider could deliver sufficient
@@ -62,46 +477,248 @@ def findEvents(w3, event, startBlock, endBlock, blockStep, argFilters, v=False):
         The filters to be applied on indexed arguments
     v : bool
         Verbose
+    nWorkers : int
+        The number of block ranges to request at the same time. The
+        number of requests in flight is also capped by the provider's
+        concurrency limit (see `setProviderConcurrency`). Events are
+        returned in the same order regardless of the number of workers
+    adaptive : bool
+        Whether the number of blocks requested at a time should track
+        the density of events. The step is doubled (up to
+        `ADAPTIVE_MAX_MULTIPLIER * blockStep`) after ranges with few
+        events and halved (down to `blockStep`) after a range had to be
+        split
+    cache : acx.cache.EventCache, optional
+        An on-disk cache -- Each completed block range is saved as soon
+        as it is downloaded so that an interrupted run can be resumed
+        and extending `endBlock` only downloads the new blocks
+    prescan : callable, optional
+        Takes a (fromBlock, toBlock) pair and returns the blocks in that
+        range that may contain matching logs (see `acx.bloom`). Ranges
+        without any are skipped and the others are narrowed to the span
+        of those blocks -- Useful for sparse contracts on chains with
+        many blocks
+
+    Yields
+    ------
+    events : list(dict)
+        A list of dictionaries that contain the event information for a
+        single block range -- Ranges are yielded in block order
+    """
+    eventAbi = event._get_event_abi()
+    decoder = EventDecoder(eventAbi)
+
+    # Indexed argument filters are turned into topics the same way web3
+    # does when calling `event.getLogs`
+    topics = construct_event_topic_set(eventAbi, w3.codec, argFilters)
+
+    def getLogs(fromBlock, toBlock):
+        return getLogsRaw(
+            w3,
+            {
+                "address": event.address,
+                "topics": topics,
+                "fromBlock": fromBlock,
+                "toBlock": toBlock,
+            }
+        )
+
+    def process(logs):
+        # The same JSON readable events that web3 would give
+        return decoder.toEvents(decoder.decode(logs))
+
+    cacheKey = None
+    if cache is not None:
+        cacheKey = cache.eventKey(w3, event, argFilters)
+
+    yield from iterLogRanges(
+        w3, getLogs, process, startBlock, endBlock, blockStep, v,
+        nWorkers=nWorkers, adaptive=adaptive, cache=cache, cacheKey=cacheKey,
+        prescan=prescan
+    )
+
+
+def findEvents(
+        w3, event, startBlock, endBlock, blockStep, argFilters, v=False,
+        nWorkers=1, adaptive=False, cache=None, prescan=None
+    ):
+    """
+    Find all instances of a particular event between `startBlock` and
+    `endBlock`
+
+    Takes the same arguments as `iterEvents` but collects all of the
+    events into a single list
 
     Returns
     -------
     events : list(dict)
         A list of dictionaries that contain the event information
     """
-    # Make sure block arguments are meaningful... i.e. >0 and an integer
-    assert(isinstance(startBlock, int) and startBlock >= 0)
-    assert(isinstance(endBlock, int) and endBlock > 0)
-    assert(isinstance(blockStep, int) and blockStep > 0)
-    assert(startBlock < endBlock)
-
     events = []
-    blockStarts = range(startBlock, endBlock, blockStep)
-    for bs in blockStarts:
-        be = min(bs + blockStep - 1, endBlock)
+    for eventOccurrences in iterEvents(
+        w3, event, startBlock, endBlock, blockStep, argFilters, v,
+        nWorkers=nWorkers, adaptive=adaptive, cache=cache, prescan=prescan
+    ):
+        events.extend(eventOccurrences)
 
-        if v:
-            print(
-                f"Beginning block {bs}\n"
-                f"Ending block {be}"
-            )
+    return events
+
+
+def iterEventsMulti(
+        w3, events, startBlock, endBlock, blockStep, v=False,
+        nWorkers=1, adaptive=False, cache=None, prescan=None
+    ):
+    """
+    Find all instances of several events (possibly emitted by several
+    contracts) between `startBlock` and `endBlock` with a single
+    `eth_getLogs` request per block range
+
+    Each request ORs together the contract addresses and the topic0 of
+    every event and the returned logs are routed back to the
+    (address, event) pair they belong to. Logs for (address, event)
+    pairs that weren't asked for are dropped. Indexed argument filters
+    aren't supported. Takes the same `blockStep`, `v`, `nWorkers`,
+    `adaptive`, `cache` and `prescan` arguments as `iterEvents`
 
-        eventOccurrences = event.getLogs(
-            fromBlock=bs, toBlock=be, argument_filters=argFilters
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object
+    events : list(web3.Contract.Event)
+        The events to look for (i.e. [pool.events.A, pool.events.B, ...])
+    startBlock : int
+        The block to start searching on
+    endBlock : int
+        The block to stop searching on (inclusive)
+
+    Yields
+    ------
+    events : dict(tuple(str, str), list(dict))
+        The events found in a single block range keyed by
+        (contract address, event name). Every requested pair is a key
+        and each list is in block/logIndex order
+    """
+    # Map each (address, topic0) pair to the decoder of its event
+    routes = {}
+    for event in events:
+        decoder = EventDecoder(event._get_event_abi())
+        routes[(event.address, decoder.topic)] = decoder
+
+    addresses = sorted(set(address for (address, _) in routes.keys()))
+    topics = sorted(set(topic for (_, topic) in routes.keys()))
+
+    def getLogs(fromBlock, toBlock):
+        return getLogsRaw(
+            w3,
+            {
+                "address": addresses,
+                "topics": [topics],
+                "fromBlock": fromBlock,
+                "toBlock": toBlock,
+            }
         )
-        nOccurrences = len(eventOccurrences)
 
-        if v:
-            print(f"Blocks {bs} to {be} contained {nOccurrences} transactions")
+    # Raw logs have lowercase addresses
+    checksums = {}
+
+    def process(logs):
+        # The logs of each route are decoded together and put back in
+        # the order the provider returned them
+        rows = {}
+        for (i, log) in enumerate(logs):
+            address = checksums.get(log["address"])
+            if address is None:
+                address = to_checksum_address(log["address"])
+                checksums[log["address"]] = address
+            route = (address, log["topics"][0].lower())
+            if route in routes:
+                rows.setdefault(route, []).append(i)
+
+        out = [None]*len(logs)
+        for (route, idx) in rows.items():
+            decoder = routes[route]
+            decoded = decoder.toEvents(decoder.decode([logs[i] for i in idx]))
+            for (i, x) in zip(idx, decoded):
+                out[i] = x
+
+        return [x for x in out if x is not None]
+
+    cacheKey = None
+    if cache is not None:
+        cacheKey = cache.multiKey(w3, routes.keys())
+
+    keys = [
+        (address, decoder.name)
+        for ((address, _), decoder) in routes.items()
+    ]
+    for chunk in iterLogRanges(
+        w3, getLogs, process, startBlock, endBlock, blockStep, v,
+        nWorkers=nWorkers, adaptive=adaptive, cache=cache, cacheKey=cacheKey,
+        prescan=prescan
+    ):
+        routed = {k: [] for k in keys}
+        for event in chunk:
+            routed[(event["address"], event["event"])].append(event)
+
+        yield routed
+
+
+def findEventsMulti(
+        w3, events, startBlock, endBlock, blockStep, v=False,
+        nWorkers=1, adaptive=False, cache=None, prescan=None
+    ):
+    """
+    Find all instances of several events between `startBlock` and
+    `endBlock` with a single `eth_getLogs` request per block range
 
-        if nOccurrences > 0:
-            # Convert everything to JSON readable
-            eventOccurrences = [
-                json.loads(to_json(x)) for x in eventOccurrences
-            ]
+    Takes the same arguments as `iterEventsMulti` but collects the events
+    of every block range
 
-            events.extend(eventOccurrences)
+    Returns
+    -------
+    events : dict(tuple(str, str), list(dict))
+        The events keyed by (contract address, event name)
+    """
+    out = {}
+    for routed in iterEventsMulti(
+        w3, events, startBlock, endBlock, blockStep, v,
+        nWorkers=nWorkers, adaptive=adaptive, cache=cache, prescan=prescan
+    ):
+        for (k, eventOccurrences) in routed.items():
+            out.setdefault(k, []).extend(eventOccurrences)
 
-    return events
+    return out
+
+
+def getLogsRaw(w3, logFilter):
+    """
+    Calls `eth_getLogs` directly so that the logs come back as plain
+    JSON (hex strings) rather than being formatted by web3
+
+    Parameters
+    ----------
+    w3 : web3.Web3
+        A web3 object
+    logFilter : dict
+        The filter object -- `fromBlock`/`toBlock` may be integers
+
+    Returns
+    -------
+    logs : list(dict)
+        The raw logs
+    """
+    logFilter = dict(logFilter)
+    for k in ["fromBlock", "toBlock"]:
+        if isinstance(logFilter.get(k), int):
+            logFilter[k] = hex(logFilter[k])
+
+    response = w3.provider.make_request("eth_getLogs", [logFilter])
+
+    # Raise the same error that web3 would so range errors are detected
+    if "error" in response:
+        raise ValueError(response["error"])
+
+    return response["result"]
 
 
 def scaleDecimals(x, decimals=18):
@@ -130,10 +747,10 @@ def createSessionWithRetries(nRetries=5, backoffFactor=1.0):
     return session
 
 
-def getWithRetries(url, params, nRetries=5, backoffFactor=1.0, preSleep=0.0):
-    session = createSessionWithRetries(nRetries, backoffFactor)
+def getWithRetries(url, params, nRetries=5, backoffFactor=1.0):
+    # Requests are paced by the per-host rate limits in `acx.ratelimit`
+    session = getSession(nRetries, backoffFactor)
 
-    time.sleep(preSleep)
     res = session.get(url, params=params)
 
     return res
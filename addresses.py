@@ -0,0 +1,46 @@
+from pyaml_env import parse_config
+
+from acx.addresses import AddressBook
+from acx.columnar import readEvents
+from acx.manifest import loadJson, readParquet, startStage
+
+
+# The address columns of each raw event file
+EVENT_ADDRESSES = {
+    "raw/v1Transfers.parquet": ["from", "to"],
+    "raw/v2Transfers.parquet": ["from", "to"],
+    "raw/v1Relays.parquet": ["depositData.l1Recipient", "depositData.l2Sender"],
+    "raw/v2Deposits.parquet": ["depositor", "recipient"],
+}
+
+# The traveler column of each of the other bridges' transfers
+TRAVELER_ADDRESSES = {
+    "raw/cbridge_transfers.parquet": "receiver",
+    "raw/hop_transfers.parquet": "recipient",
+    "raw/stg_transfers.parquet": "to",
+    "raw/synapse_transfers.parquet": "recipient",
+}
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    startStage("addresses", params["manifest"])
+
+    # Every address that a later stage can see -- Only the address
+    # columns of each file are read
+    addresses = []
+    for (path, columns) in EVENT_ADDRESSES.items():
+        table = readEvents(path, columns=columns)
+        addresses.extend(table.column(column) for column in columns)
+
+    for (path, column) in TRAVELER_ADDRESSES.items():
+        travelers = readParquet(path, columns=[column])[column]
+        addresses.append(travelers.unique())
+
+    # Hand maintained lists
+    addresses.append(loadJson("raw/sybil.json"))
+    addresses.append(list(loadJson("final/community_rewards.json").keys()))
+
+    book = AddressBook.fromAddresses(*addresses)
+    book.save("intermediate/addresses.parquet")
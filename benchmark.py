@@ -0,0 +1,211 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import yaml
+
+from pyaml_env import parse_config
+
+from acx.synthetic import FORMAT_VERSION, chainClocks, generate, writeSyntheticBlockStore
+
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# The offline stages in the order the makefile runs them, the stages whose
+# outputs they read and the synthetic records they process
+STAGES = [
+    ("addresses", [], ["lpTransfers", "acrossTransfers", "travelerTransfers"]),
+    ("lp_cumulative", ["addresses"], ["lpTransfers"]),
+    ("lp_rewards", ["lp_cumulative"], ["lpTransfers"]),
+    ("bridgoor_normalize", ["addresses"], ["acrossTransfers"]),
+    ("bridgoor_rewards", ["bridgoor_normalize"], ["acrossTransfers"]),
+    ("bt_combine", ["addresses"], ["travelerTransfers"]),
+    ("bt_rewards", ["bt_combine", "bridgoor_normalize", "lp_cumulative"], ["travelerTransfers"]),
+    ("bt_final", ["bt_rewards"], ["acrossTransfers"]),
+    ("combine_rewards", ["lp_rewards", "bridgoor_rewards", "bt_final"], ["lps", "bridgoors", "travelers"]),
+]
+
+
+def prepareScale(params, scale, directory, storeDirectory, seed):
+    """
+    Generate the synthetic inputs for `scale` in `directory` along with a
+    `parameters.yaml` that points at the shared block store -- Inputs that
+    were already generated with the same volumes and seed are reused
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Every run computes all of the LP reward days rather than resuming
+    # from the previous run's accrual state
+    scaleParams = dict(
+        params, block_store=storeDirectory,
+        lp=dict(params["lp"], state=dict(params["lp"]["state"], directory=None))
+    )
+    with open(os.path.join(directory, "parameters.yaml"), "w") as f:
+        yaml.safe_dump(scaleParams, f)
+
+    manifestPath = os.path.join(directory, "synthetic.json")
+    wanted = {
+        "format": FORMAT_VERSION, "scale": scale, "seed": seed,
+        "volume": params["benchmark"]["volume"]
+    }
+    if os.path.exists(manifestPath):
+        with open(manifestPath, "r") as f:
+            manifest = json.load(f)
+        if all(manifest.get(k) == v for (k, v) in wanted.items()):
+            return manifest["counts"]
+
+    print(f"Generating synthetic data at {scale}x")
+    counts = generate(params, scale, directory, seed=seed)
+    with open(manifestPath, "w") as f:
+        json.dump(dict(wanted, counts=counts), f)
+
+    return counts
+
+
+def runStage(stage, directory, timeout=None, memoryLimitGb=None):
+    """
+    Run a stage's script from `directory` and measure it
+
+    Returns
+    -------
+    result : dict
+        The `status` (ok, failed or timeout), `wall` and `cpu` seconds and
+        `peakRssMb` of the stage's process
+    """
+    def limitMemory():
+        if memoryLimitGb is not None:
+            limit = int(memoryLimitGb * 1024**3)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [REPO] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+
+    os.makedirs(os.path.join(directory, "logs"), exist_ok=True)
+    with open(os.path.join(directory, "logs", f"{stage}.log"), "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(REPO, f"{stage}.py")],
+            cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT,
+            preexec_fn=limitMemory
+        )
+
+        timedOut = threading.Event()
+        def kill():
+            timedOut.set()
+            proc.kill()
+        timer = threading.Timer(timeout, kill) if timeout is not None else None
+        if timer is not None:
+            timer.start()
+
+        # `wait4` reports the resources used by this child alone
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if timer is not None:
+            timer.cancel()
+
+    if timedOut.is_set():
+        outcome = "timeout"
+    else:
+        outcome = "ok" if proc.returncode == 0 else "failed"
+
+    return {
+        "status": outcome,
+        "wall": wall,
+        "cpu": usage.ru_utime + usage.ru_stime,
+        # `ru_maxrss` is in kilobytes on linux
+        "peakRssMb": usage.ru_maxrss / 1024,
+    }
+
+
+def runScale(scale, counts, directory, timeout, memoryLimitGb):
+    "Run every stage at `scale` -- Stages whose inputs failed are skipped"
+    results = []
+    succeeded = set()
+    for (stage, dependencies, rowKinds) in STAGES:
+        rows = sum(counts[k] for k in rowKinds)
+        row = {"scale": scale, "stage": stage, "rows": rows}
+
+        if not all(x in succeeded for x in dependencies):
+            row.update({"status": "skipped", "wall": None, "cpu": None, "peakRssMb": None})
+        else:
+            print(f"Running {stage} at {scale}x")
+            row.update(runStage(stage, directory, timeout, memoryLimitGb))
+            if row["status"] == "ok":
+                succeeded.add(stage)
+
+        row["rowsPerSecond"] = rows / row["wall"] if row["status"] == "ok" else None
+        results.append(row)
+
+    return results
+
+
+def _fmt(x, spec, width):
+    return format(x, spec) if x is not None else "-".rjust(width)
+
+
+def printReport(results, previous):
+    "Print a table of the results and the change in wall time since `previous`"
+    before = {(x["scale"], x["stage"]): x for x in previous}
+
+    print(
+        f"{'scale':>6} {'stage':<20} {'status':<8} {'rows':>12} {'wall (s)':>10} "
+        f"{'rows/s':>12} {'rss (MB)':>10} {'vs last':>8}"
+    )
+    for row in results:
+        last = before.get((row["scale"], row["stage"]))
+        change = "-"
+        if (last is not None) and last["wall"] and (row["status"] == "ok"):
+            change = f"{row['wall'] / last['wall']:.2f}x"
+
+        print(
+            f"{str(row['scale']) + 'x':>6} {row['stage']:<20} {row['status']:<8} "
+            f"{row['rows']:>12,} {_fmt(row['wall'], '>10.2f', 10)} "
+            f"{_fmt(row['rowsPerSecond'], '>12,.0f', 12)} "
+            f"{_fmt(row['peakRssMb'], '>10.1f', 10)} {change:>8}"
+        )
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    benchParams = params["benchmark"]
+
+    directory = benchParams["directory"]
+    storeDirectory = os.path.abspath(os.path.join(directory, "blocktimes"))
+    os.makedirs(directory, exist_ok=True)
+
+    # The block store only depends on the (fixed) block parameters so it
+    # is shared by every scale
+    if not os.path.exists(storeDirectory):
+        print("Writing synthetic block store")
+        writeSyntheticBlockStore(params, chainClocks(params), storeDirectory)
+
+    results = []
+    for scale in benchParams["scales"]:
+        scaleDirectory = os.path.join(directory, f"{scale}x")
+        counts = prepareScale(
+            params, scale, scaleDirectory, storeDirectory, benchParams["seed"]
+        )
+        results.extend(
+            runScale(
+                scale, counts, scaleDirectory,
+                benchParams["timeout"], benchParams["memory_limit_gb"]
+            )
+        )
+
+    # Compare against the last report before replacing it
+    reportPath = os.path.join(directory, "report.json")
+    previous = []
+    if os.path.exists(reportPath):
+        with open(reportPath, "r") as f:
+            previous = json.load(f)
+    printReport(results, previous)
+
+    with open(reportPath, "w") as f:
+        json.dump(results, f, indent=2)
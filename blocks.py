@@ -1,107 +1,92 @@
 import datetime as dt
-import json
-import time
+
+import numpy as np
+import web3
 
 from pyaml_env import parse_config
 
+from acx.blockstore import SECONDS_PER_DAY, gridAnchors, writeBlockStore
+from acx.blocktime import BlockTimestamps
 from acx.data.chains import SHORTNAME_TO_ID
-from acx.utils import getWithRetries
-
-
-CHAIN_TO_URL = {
-    # ETHERSCAN
-    1: "https://api.etherscan.io/api",
-    # OPTIMISTIC ETHERSCAN
-    10: "https://api-optimistic.etherscan.io/api",
-    # POLYGONSCAN
-    137: "https://api.polygonscan.com/api",
-    # BOBASCAN
-    288: "https://api.bobascan.com/api",
-    # ARBISCAN
-    42161: "https://api.arbiscan.io/api"
-}
-
-
-def findMostRecentBlockAfterTs(ts: int, chainId: int=1, key=""):
-    """
-    Finds the most recent block that occurs after a particular UTC
-    timestamp
-
-    This requires that the `action=getblocknobytime` api command is
-    defined
-
-    Parameters
-    ----------
-    ts : int
-        The timestamp that we want to find the block after
-    chainId : int
-        The identifier for the chain of interest
-    """
-    apiurl = CHAIN_TO_URL[chainId]
-
-    params = {
-        "module": "block",
-        "action": "getblocknobytime",
-        "closest": "after",
-        "timestamp": ts,
-        "apikey": key
-    }
-    res = getWithRetries(apiurl, params=params, backoffFactor=1.5, preSleep=0.5)
-
-    if res.json()["status"] == "1":
-        return int(res.json()["result"])
-    else:
-        print(res.json())
-        raise ValueError("Failed to find block")
+from acx.manifest import dumpJson, startStage
+from acx.session import createProvider
+from acx.utils import setProviderConcurrency
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("blocks", params["manifest"])
+    blockParams = params["misc"]["block"]
+
+    # Dates come from the grid blocks so every midnight has to be on it
+    stepSeconds = blockParams["step_seconds"]
+    assert(SECONDS_PER_DAY % stepSeconds == 0)
+    assert(blockParams["start_ts_mainnet"] % stepSeconds == 0)
+    assert(blockParams["start_ts_nonmainnet"] % stepSeconds == 0)
 
     # Find relevant blocks for all chains
     blockData = []
-    for chain in params["misc"]["block"]["chains"]:
+    for chain in blockParams["chains"]:
         print(f"Starting on chain: {chain}")
 
-        # Get chain id and scan api key
+        # Block timestamps come straight from the chain's rpc node
         chainId = SHORTNAME_TO_ID[chain]
-        someScanKey = params["etherscan_keys"][chain]
-
+        provider = createProvider(
+            params["rpc_node"][chain],
+            rateLimit=params["rpc_rate_limit"][chain]
+        )
+        w3 = web3.Web3(provider)
+        nWorkers = params["rpc_concurrency"][chain]
+        setProviderConcurrency(w3, nWorkers)
+        headers = BlockTimestamps(
+            w3, f"{blockParams['header_cache']}/{chainId}.json", nWorkers
+        )
 
         # Get timestamps to start searching for
         if chain == "mainnet":
-            blockStartTs = params["misc"]["block"]["start_ts_mainnet"]
+            blockStartTs = blockParams["start_ts_mainnet"]
         else:
-            blockStartTs = params["misc"]["block"]["start_ts_nonmainnet"]
-        blockEndTs = params["misc"]["block"]["end_ts"]
-
-        # Get the block number for each day between (blockStartTs, blockEndTs)
-        dateStarts = range(blockStartTs, blockEndTs+1, 24*60*60)
-        for _ts in dateStarts:
-            # Optimism - June 1, 2022
-            if (_ts == 1654041600) and (chain == "optimism"):
-                block = 9621060
-            # Optimism June 2, 2022
-            elif (_ts == 1654128000) and (chain == "optimism"):
-                block = 10108895
-            # Optimism - August 6, 2022
-            elif (_ts == 1659744000) and (chain == "optimism"):
-                block = 17974360
-            # Boba - March 6, 2022
-            elif (_ts == 1646524800) and (chain == "boba"):
-                block = 382645
-            else:
-                block = findMostRecentBlockAfterTs(_ts, chainId, key=someScanKey)
-
+            blockStartTs = blockParams["start_ts_nonmainnet"]
+        blockEndTs = blockParams["end_ts"]
+
+        # Get the first block at or after each step (a day unless
+        # configured otherwise) between (blockStartTs, blockEndTs) -- All
+        # of the timestamps are resolved together
+        dateStarts = list(
+            range(blockStartTs, blockEndTs+1, stepSeconds)
+        )
+        blocks = headers.findBlocksAfterTs(dateStarts)
+
+        # The block store runs through the block before the next step after
+        # blockEndTs (or through the latest block if that hasn't happened
+        # yet) so that every block of the final step has a date
+        nextTs = dateStarts[-1] + stepSeconds
+        latestBlock = w3.eth.block_number
+        if headers.get([latestBlock])[0] >= nextTs:
+            storeEnd = headers.findBlocksAfterTs([nextTs], blocks[-1])[0] - 1
+        else:
+            storeEnd = latestBlock
+        headers.save()
+
+        # Headers seen during the search are exact -- The grid anchors
+        # make sure every block lands on the right side of each step
+        gridBlocks, gridTimestamps = gridAnchors(blocks, dateStarts)
+        writeBlockStore(
+            params["block_store"], chainId,
+            np.concatenate([headers.blocks, gridBlocks]),
+            np.concatenate([headers.timestamps, gridTimestamps]),
+            blocks[0], storeEnd, stepSeconds
+        )
+
+        for (_ts, block) in zip(dateStarts, blocks):
             row = {
                 "chain": chain,
                 "chainId": chainId,
-                "date": dt.datetime.utcfromtimestamp(_ts).strftime("%Y-%m-%dT00:00"),
+                "date": dt.datetime.utcfromtimestamp(_ts).strftime("%Y-%m-%dT%H:%M"),
                 "block": block
             }
             blockData.append(row)
             print(row)
 
-    with open("raw/blocks.json", "w") as f:
-        json.dump(blockData, f)
+    dumpJson(blockData, "raw/blocks.json")
@@ -1,98 +1,155 @@
-import json
+import os
+
+from functools import partial
 
 import pandas as pd
 import web3
 
 from pyaml_env import parse_config
 
-from acx.abis import getABI
+from acx.abis import getABI, getEventABI
+from acx.cache import EventCache
+from acx.columnar import EventWriter, writeEventsBySymbol
 from acx.data.tokens import SYMBOL_TO_CHAIN_TO_ADDRESS
-from acx.utils import findEvents
+from acx.engine import runJobs
+from acx.manifest import startStage
+from acx.session import createProvider
+from acx.sinks import NdjsonSink, readNdjson, streamEvents
+from acx.utils import findEventsMulti, iterEvents, setProviderConcurrency
 
 
-if __name__ == "__main__":
-    # Load parameters
-    params = parse_config("parameters.yaml")
+def collectV1(params, cache):
+    "Collect the v1 relays and disputed relays from the mainnet BridgePools"
     nBlocks = params["bridgoor"]["n_blocks"]
+    nWorkers = params["rpc_concurrency"]["mainnet"]
 
-    #
-    # V1 bridges
-    #
-    provider = web3.Web3.HTTPProvider(
+    provider = createProvider(
         params["rpc_node"]["mainnet"],
-        request_kwargs={"timeout": 60}
+        rateLimit=params["rpc_rate_limit"]["mainnet"]
     )
     w3 = web3.Web3(provider)
+    setProviderConcurrency(w3, nWorkers)
 
     v1StartBlock = params["bridgoor"]["v1_start_block"]
     v1EndBlock = params["bridgoor"]["v1_end_block"]
 
-    # Iterate through each of the relevant pools
+    # Create each of the relevant pools
     # All v1 transfers are L2->L1 so we can only look at relays on L1
-    v1Disputes = {}
-    v1Relays = {}
+    pools = {}
     for token in params["bridgoor"]["tokens"]:
         # Get information about specific BridgePool
         bridgeInfo = params["across"]["v1"]["mainnet"]["bridge"][token]
         poolAddress = bridgeInfo["address"]
 
         # Create BridgePool object
-        pool = w3.eth.contract(address=poolAddress, abi=getABI("BridgePool"))
-
-        # Collect dispute information so they can be excluded
-        v1Disputes[token] = findEvents(
-            w3, pool.events.RelayDisputed, v1StartBlock, v1EndBlock,
-            nBlocks[w3.eth.chainId], {}, True
+        pools[token] = w3.eth.contract(
+            address=poolAddress, abi=getABI("BridgePool")
         )
 
-        v1Relays[token] = findEvents(
-            w3, pool.events.DepositRelayed, v1StartBlock, v1EndBlock,
-            nBlocks[w3.eth.chainId], {}, True
-        )
+    # Collect relays and the dispute information (so they can be excluded)
+    # for every pool with one request per block range
+    v1Events = findEventsMulti(
+        w3,
+        [
+            event
+            for pool in pools.values()
+            for event in [pool.events.RelayDisputed, pool.events.DepositRelayed]
+        ],
+        v1StartBlock, v1EndBlock, nBlocks[w3.eth.chainId], True,
+        nWorkers=nWorkers, adaptive=True, cache=cache
+    )
 
-    with open("raw/v1DisputedRelays.json", "w") as f:
-        json.dump(v1Disputes, f)
-    with open("raw/v1Relays.json", "w") as f:
-        json.dump(v1Relays, f)
-
-
-    #
-    # V2 bridges
-    #
-    v2Deposits = []
-    for chain in params["bridgoor"]["chains"]:
-        # No longer only L2->L1 so we need to retrieve data from each
-        # chain
-        provider = web3.Web3.HTTPProvider(
-            params["rpc_node"][chain],
-            request_kwargs={"timeout": 60}
-        )
-        w3 = web3.Web3(provider)
-        chainId = w3.eth.chainId
-
-        # Create that chain's spoke pool
-        spokeInfo = params["across"]["v2"][chain]["spoke"]
-        spokeAddress = spokeInfo["address"]
-        spoke = w3.eth.contract(address=spokeAddress, abi=getABI("SpokePool"))
-
-        # Get token addresses that qualify
-        addresses = [
-            SYMBOL_TO_CHAIN_TO_ADDRESS[token][chainId]
-            for token in params["bridgoor"]["tokens"]
-        ]
-
-        # Get start block for qualifying
-        v2StartBlock = params["bridgoor"]["v2_start_block"][chainId]
-
-        # Collect data throughout end of BT (we'll need this for traveler)
-        v2EndBlock = params["traveler"]["travel_end_block"][chainId]
-
-        # Retrieve deposits
-        deposits = findEvents(
-            w3, spoke.events.FundsDeposited, v2StartBlock, v2EndBlock,
-            nBlocks[w3.eth.chainId], {"originToken": addresses}, True
-        )
-        v2Deposits.extend(deposits)
+    v1Disputes = {}
+    v1Relays = {}
+    for (token, pool) in pools.items():
+        v1Disputes[token] = v1Events[(pool.address, "RelayDisputed")]
+        v1Relays[token] = v1Events[(pool.address, "DepositRelayed")]
+
+    return v1Disputes, v1Relays
+
+
+def collectV2(params, cache, chain, path):
+    """
+    Stream the qualifying v2 deposits made on `chain`'s SpokePool to the
+    NDJSON file at `path` and return the number of deposits
+    """
+    nBlocks = params["bridgoor"]["n_blocks"]
+    nWorkers = params["rpc_concurrency"][chain]
+
+    # No longer only L2->L1 so we need to retrieve data from each
+    # chain
+    provider = createProvider(
+        params["rpc_node"][chain],
+        rateLimit=params["rpc_rate_limit"][chain]
+    )
+    w3 = web3.Web3(provider)
+    setProviderConcurrency(w3, nWorkers)
+    chainId = w3.eth.chainId
+
+    # Create that chain's spoke pool
+    spokeInfo = params["across"]["v2"][chain]["spoke"]
+    spokeAddress = spokeInfo["address"]
+    spoke = w3.eth.contract(address=spokeAddress, abi=getABI("SpokePool"))
+
+    # Get token addresses that qualify
+    addresses = [
+        SYMBOL_TO_CHAIN_TO_ADDRESS[token][chainId]
+        for token in params["bridgoor"]["tokens"]
+    ]
+
+    # Get start block for qualifying
+    v2StartBlock = params["bridgoor"]["v2_start_block"][chainId]
+
+    # Collect data throughout end of BT (we'll need this for traveler)
+    v2EndBlock = params["traveler"]["travel_end_block"][chainId]
+
+    # Retrieve deposits
+    deposits = iterEvents(
+        w3, spoke.events.FundsDeposited, v2StartBlock, v2EndBlock,
+        nBlocks[chainId], {"originToken": addresses}, True,
+        nWorkers=nWorkers, adaptive=True, cache=cache
+    )
+    with NdjsonSink(path) as sink:
+        return streamEvents(deposits, sink)
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    startStage("bridgoor_events", params["manifest"])
+    cache = EventCache(params["event_cache"])
+    chains = params["bridgoor"]["chains"]
+
+    # Every chain is on its own RPC endpoint so the v1 pools and each of
+    # the v2 SpokePools are collected at the same time. Deposits are
+    # written to disk as they are downloaded (one file per chain) rather
+    # than held in memory until every chain is done
+    partPaths = {chain: f"raw/v2Deposits.{chain}.ndjson" for chain in chains}
+    results = runJobs(
+        [("mainnet", partial(collectV1, params, cache))] + [
+            (chain, partial(collectV2, params, cache, chain, partPaths[chain]))
+            for chain in chains
+        ],
+        limits=params["rpc_concurrency"]
+    )
+
+    v1Disputes, v1Relays = results[0]
+    writeEventsBySymbol(
+        "raw/v1DisputedRelays.parquet", getEventABI("BridgePool", "RelayDisputed"),
+        v1Disputes
+    )
+    writeEventsBySymbol(
+        "raw/v1Relays.parquet", getEventABI("BridgePool", "DepositRelayed"), v1Relays
+    )
 
-    with open("raw/v2Deposits.json", "w") as f:
-        json.dump(v2Deposits, f)
+    # Convert the v2 deposits into a single typed file in chain order --
+    # Each chain's deposits were written in block order so they are
+    # streamed from disk one row group at a time
+    with EventWriter(
+            "raw/v2Deposits.parquet", getEventABI("SpokePool", "FundsDeposited"),
+            sortBy=["originChainId", "blockNumber", "logIndex"]
+        ) as writer:
+        for chain in chains:
+            writer.write(readNdjson(partPaths[chain]), presorted=True)
+    for chain in chains:
+        os.remove(partPaths[chain])
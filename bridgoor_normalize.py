@@ -1,99 +1,101 @@
-import json
-
 import pandas as pd
 
 from pyaml_env import parse_config
 
 from acx.abis import getABI
+from acx.addresses import AddressBook
+from acx.columnar import readEventFrame
 from acx.data.tokens import (
     CHAIN_TO_ADDRESS_TO_SYMBOL, SYMBOL_TO_CHAIN_TO_ADDRESS, SYMBOL_TO_DECIMALS
 )
+from acx.manifest import startStage, writeJson
 from acx.utils import scaleDecimals
 
 
-def getV1DisputeHashes(v1DisputesRaw):
-    disputeHashes = []
-    for token in v1DisputesRaw.keys():
-        disputes = v1DisputesRaw[token]
-
-        disputeHashes.extend([x["args"]["depositHash"] for x in disputes])
-
-    return disputeHashes
-
-
-def unpackV1Relays(v1RelaysRaw, disputes):
-    out = []
-    for token in v1RelaysRaw.keys():
-        # Get all relays of a certain token
-        relays = v1RelaysRaw[token]
-
-        # Get decimals
-        decimals = SYMBOL_TO_DECIMALS[token]
-
-        for relay in relays:
-            # Unpack deposit/relay data
-            depositData = relay["args"]["depositData"]
-            relayData = relay["args"]["relay"]
-
-            if relay["args"]["depositHash"] in disputes:
-                continue
-
-            row = {
-                "originChain": depositData[0],
-                "destinationChain": 1,
-                "block": relay["blockNumber"],
-                "tx": relay["transactionHash"],
-                "sender": depositData[3],
-                "recipient": depositData[2],
-                "symbol": token,
-                "amount": scaleDecimals(depositData[4], decimals),
-                "version": 1
-            }
-            out.append(row)
-
-    return pd.DataFrame(out)
-
-
-def unpackV2Deposits(v2DepositsRaw):
-    out = []
-    for deposit in v2DepositsRaw:
-        # Unpack pieces of useful data
-        args = deposit["args"]
-
-        originChainId = args["originChainId"]
-
-        tokenAddress = args["originToken"]
-        symbol = CHAIN_TO_ADDRESS_TO_SYMBOL[originChainId][tokenAddress]
-        decimals = SYMBOL_TO_DECIMALS[symbol]
-
-        row = {
-            "originChain": originChainId,
-            "destinationChain": args["destinationChainId"],
-            "block": deposit["blockNumber"],
-            "tx": deposit["transactionHash"],
-            "sender": args["depositor"],
-            "recipient": args["recipient"],
-            "symbol": symbol,
-            "amount": scaleDecimals(args["amount"], decimals),
-            "version": 2
-        }
-        out.append(row)
-
-
-    return pd.DataFrame(out)
+def getV1DisputeHashes(v1Disputes):
+    return set(v1Disputes["depositHash"])
+
+
+def unpackV1Relays(v1Relays, disputes):
+    # Drop the relays that were disputed
+    relays = v1Relays.loc[~v1Relays["depositHash"].isin(disputes), :]
+
+    amounts = [
+        scaleDecimals(amount, SYMBOL_TO_DECIMALS[token])
+        for (amount, token) in zip(relays["depositData.amount"], relays["symbol"])
+    ]
+
+    return pd.DataFrame({
+        "originChain": relays["depositData.chainId"],
+        "destinationChain": 1,
+        "block": relays["blockNumber"],
+        "tx": relays["transactionHash"],
+        "sender": relays["depositData.l2Sender"],
+        "recipient": relays["depositData.l1Recipient"],
+        "symbol": relays["symbol"],
+        "amount": amounts,
+        "version": 1
+    }).reset_index(drop=True)
+
+
+def unpackV2Deposits(v2Deposits):
+    symbols = pd.Categorical([
+        CHAIN_TO_ADDRESS_TO_SYMBOL[originChainId][tokenAddress]
+        for (originChainId, tokenAddress)
+        in zip(v2Deposits["originChainId"], v2Deposits["originToken"])
+    ])
+    amounts = [
+        scaleDecimals(amount, SYMBOL_TO_DECIMALS[symbol])
+        for (amount, symbol) in zip(v2Deposits["amount"], symbols)
+    ]
+
+    return pd.DataFrame({
+        "originChain": v2Deposits["originChainId"],
+        "destinationChain": v2Deposits["destinationChainId"],
+        "block": v2Deposits["blockNumber"],
+        "tx": v2Deposits["transactionHash"],
+        "sender": v2Deposits["depositor"],
+        "recipient": v2Deposits["recipient"],
+        "symbol": symbols,
+        "amount": amounts,
+        "version": 2
+    }).reset_index(drop=True)
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
-
-    # Load data
-    with open("raw/v1DisputedRelays.json", "r") as f:
-        v1DisputesRaw = json.loads(f.read())
-    with open("raw/v1Relays.json", "r") as f:
-        v1RelaysRaw = json.loads(f.read())
-    with open("raw/v2Deposits.json", "r") as f:
-        v2DepositsRaw = json.loads(f.read())
+    startStage("bridgoor_normalize", params["manifest"])
+
+    # Senders and recipients are converted into their ids as they are read
+    book = AddressBook.load("intermediate/addresses.parquet")
+
+    # Load data -- Only the columns that are used
+    v1DisputesRaw = readEventFrame(
+        "raw/v1DisputedRelays.parquet", columns=["depositHash"]
+    )
+    v1RelaysRaw = readEventFrame(
+        "raw/v1Relays.parquet",
+        columns=[
+            "blockNumber", "transactionHash", "depositHash", "depositData.chainId",
+            "depositData.l1Recipient", "depositData.l2Sender",
+            "depositData.amount", "symbol"
+        ],
+        addressBook=book
+    )
+    v2DepositsRaw = readEventFrame(
+        "raw/v2Deposits.parquet",
+        columns=[
+            "blockNumber", "transactionHash", "amount", "originChainId",
+            "destinationChainId", "recipient", "depositor"
+        ],
+        addressBook=book
+    )
+    # Token addresses aren't in the address book -- They are only used to
+    # find each deposit's symbol
+    v2DepositsRaw["originToken"] = readEventFrame(
+        "raw/v2Deposits.parquet", columns=["originToken"]
+    )["originToken"]
 
     # Put into DataFrames
     v1Disputes = getV1DisputeHashes(v1DisputesRaw)
@@ -102,7 +104,7 @@ if __name__ == "__main__":
 
     # Save a history of all Across transactions for convenience
     allAcross = pd.concat([v1Relays, v2Deposits], axis=0, ignore_index=True)
-    allAcross.to_json("intermediate/allAcrossTransactions.json", orient="records")
+    writeJson(allAcross, "intermediate/allAcrossTransactions.json", orient="records")
 
     # Restrict v1 to only relevant blocks
     v1StartBlock = params["bridgoor"]["v1_start_block"]
@@ -122,4 +124,4 @@ if __name__ == "__main__":
 
     # Only save the bridgoor relevant transactions
     bridgoors = pd.concat([v1Relays, v2Deposits], axis=0, ignore_index=True)
-    bridgoors.to_json("intermediate/bridgoorTransactions.json", orient="records")
+    writeJson(bridgoors, "intermediate/bridgoorTransactions.json", orient="records")
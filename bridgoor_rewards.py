@@ -1,42 +1,20 @@
-import json
-
 import numpy as np
-import pandas as pd
 
 from pyaml_env import parse_config
 
-from acx.data.chains import SHORTNAME_TO_ID
+from acx.addresses import AddressBook
+from acx.blockstore import BlockStore
+from acx.manifest import dumpJson, readJson, startStage
 from acx.utils import cutAndPowerScore
 
 
-
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("bridgoor_rewards", params["manifest"])
 
-    # Create block to date lookup function
-    blocks = pd.read_json("raw/blocks.json", orient="records")
-
-    blockLookup = {}
-    for chain in params["bridgoor"]["chains"]:
-        chainId = SHORTNAME_TO_ID[chain]
-
-        blockToDate = blocks.query("chainId == @chainId").sort_values("block")
-        _block = blockToDate["block"].to_numpy()
-        _date = blockToDate["date"].to_numpy()
-
-        blockLookup[chainId] = {"blocks": _block, "dates": _date}
-
-
-    def determineDate(x):
-        chainId = 1 if x["version"] == 1 else x["originChain"]
-
-        bl = blockLookup[chainId]
-
-        _idx = np.searchsorted(bl["blocks"], x["block"])
-        _date = bl["dates"][_idx]
-
-        return _date
+    # Block to date lookup
+    blockStore = BlockStore(params["block_store"])
 
     # Inclusion parameters
     transferCount = params["bridgoor"]["parameters"]["inclusion"]["transfer_count"]
@@ -49,15 +27,24 @@ if __name__ == "__main__":
 
     totalACX = params["bridgoor"]["parameters"]["total_rewards"]
 
+    # Recipients are address ids
+    book = AddressBook.load("intermediate/addresses.parquet")
+
     # Load bridge data
-    bridgeData = pd.read_json(
+    bridgeData = readJson(
         "intermediate/bridgoorTransactions.json", orient="records"
     )
-    bridgeData["date"] = bridgeData.apply(determineDate, axis=1)
+
+    # v1 relays all happened on mainnet -- A block gets the date of the
+    # first day boundary at or after it
+    bridgeData["date"] = blockStore.dates(
+        np.where(bridgeData["version"] == 1, 1, bridgeData["originChain"]),
+        bridgeData["block"]
+    )
 
     # Load prices data
     prices = (
-        pd.read_json("raw/prices.json", orient="records")
+        readJson("raw/prices.json", orient="records")
         .set_index(["date", "symbol"])
     )
 
@@ -101,6 +88,5 @@ if __name__ == "__main__":
     )
     bridgoors["acx"] = bridgoors.eval("score * @totalACX")
 
-    out = bridgoors.set_index("recipient")["acx"].to_dict()
-    with open("final/bridgoor_rewards.json", "w") as f:
-        json.dump(out, f)
+    out = book.toAddressIndex(bridgoors.set_index("recipient")["acx"]).to_dict()
+    dumpJson(out, "final/bridgoor_rewards.json")
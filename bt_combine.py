@@ -1,45 +1,26 @@
 import datetime as dt
 
-import numpy as np
 import pandas as pd
-import web3
 
 from pyaml_env import parse_config
 
-from acx.data.chains import SHORTNAME_TO_ID
+from acx.addresses import AddressBook
+from acx.blockstore import BlockStore
+from acx.manifest import readParquet, startStage, writeParquet
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("bt_combine", params["manifest"])
 
-    # Create block to date lookup function
-    blocks = pd.read_json("raw/blocks.json", orient="records")
-
-    blockLookup = {}
-    for chain in params["traveler"]["chains"]:
-        chainId = SHORTNAME_TO_ID[chain]
-
-        blockToDate = blocks.query("chainId == @chainId").sort_values("block")
-        _block = blockToDate["block"].to_numpy()
-        _date = blockToDate["date"].to_numpy()
-
-        blockLookup[chainId] = {"blocks": _block, "dates": _date}
-
-
-    def determineDate(x):
-        chainId = x["chainId"]
-
-        bl = blockLookup[chainId]
-
-        _idx = np.searchsorted(bl["blocks"], x["blockNumber"], side="right")
-        _date = bl["dates"][_idx]
-
-        return _date
+    # Block to date lookup -- A block gets the date of the first day
+    # boundary after it
+    blockStore = BlockStore(params["block_store"])
 
     # Load data from each and transform to a common format
     cbridge = (
-        pd.read_parquet("raw/cbridge_transfers.parquet")
+        readParquet("raw/cbridge_transfers.parquet")
         .rename(
             columns={
                 "block": "blockNumber",
@@ -49,10 +30,10 @@ if __name__ == "__main__":
         )
         .loc[:, ["chainId", "blockNumber", "tx", "traveler", "symbol", "amount"]]
     )
-    cbridge["date"] = cbridge.apply(determineDate, axis=1)
+    cbridge["date"] = blockStore.dates(cbridge["chainId"], cbridge["blockNumber"], side="right")
 
     hop = (
-        pd.read_parquet("raw/hop_transfers.parquet")
+        readParquet("raw/hop_transfers.parquet")
         .rename(
             columns={
                 "originChainId": "chainId",
@@ -71,7 +52,7 @@ if __name__ == "__main__":
     hop = hop.drop(["timestamp"], axis="columns")
 
     stg = (
-        pd.read_parquet("raw/stg_transfers.parquet")
+        readParquet("raw/stg_transfers.parquet")
         .rename(
             columns={
                 "block": "blockNumber",
@@ -81,10 +62,10 @@ if __name__ == "__main__":
         )
         .loc[:, ["chainId", "blockNumber", "tx", "traveler", "symbol", "amount"]]
     )
-    stg["date"] = stg.apply(determineDate, axis=1)
+    stg["date"] = blockStore.dates(stg["chainId"], stg["blockNumber"], side="right")
 
     syn = (
-        pd.read_parquet("raw/synapse_transfers.parquet")
+        readParquet("raw/synapse_transfers.parquet")
         .rename(
             columns={
                 "block": "blockNumber",
@@ -93,13 +74,15 @@ if __name__ == "__main__":
         )
         .loc[:, ["chainId", "blockNumber", "tx", "traveler", "symbol", "amount"]]
     )
-    syn["date"] = syn.apply(determineDate, axis=1)
+    syn["date"] = blockStore.dates(syn["chainId"], syn["blockNumber"], side="right")
 
     # Stack normalized data together
     df = pd.concat([cbridge, hop, stg, syn], axis=0, ignore_index=True)
 
-    # Make sure all addresses are checksum
-    df["traveler"] = df["traveler"].map(web3.Web3.toChecksumAddress)
+    # Travelers are stored as address ids (which doesn't depend on the
+    # case of the addresses that each bridge reports)
+    book = AddressBook.load("intermediate/addresses.parquet")
+    df["traveler"] = book.ids(df["traveler"])
 
     # Convert less common symbols to more common counterparts
     df["symbol"] = df["symbol"].replace(
@@ -108,6 +91,6 @@ if __name__ == "__main__":
             "nETH": "WETH",
             "nUSD": "UDSC"
         }
-    )
+    ).astype("category")
 
-    df.sort_values("date").to_parquet("intermediate/travelerTransfers.parquet")
+    writeParquet(df.sort_values("date"), "intermediate/travelerTransfers.parquet")
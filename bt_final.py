@@ -1,14 +1,15 @@
-import json
-
 import pandas as pd
-import web3
 
 from pyaml_env import parse_config
 
+from acx.addresses import AddressBook
+from acx.manifest import readJson, startStage, writeJson
+
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("bt_final", params["manifest"])
 
     # Reward parameters
     rewardLb = params["traveler"]["parameters"]["rewards"]["tokens_lb"]
@@ -25,15 +26,18 @@ if __name__ == "__main__":
     travelStartBlock = params["traveler"]["travel_start_block"]
     travelEndBlock = params["traveler"]["travel_end_block"]
 
-    # Qualified travelers
+    # Qualified travelers -- Looked up by address id like the senders of
+    # the Across transactions
+    book = AddressBook.load("intermediate/addresses.parquet")
     travelerRewards = pd.DataFrame(
-        pd.read_json("final/traveler_score.json", typ="series"),
+        readJson("final/traveler_score.json", typ="series"),
         columns=["bridge-traveler"]
     )
+    travelerRewards.index = book.ids(travelerRewards.index)
     travelers = travelerRewards.index
 
     # Read across transactions
-    across = pd.read_json(
+    across = readJson(
         "intermediate/allAcrossTransactions.json",
         orient="records"
     )
@@ -74,4 +78,4 @@ if __name__ == "__main__":
         (bridgeTravelers * totalBtReward).clip(0.0, clipThreshold)
     )
 
-    bridgeTravelers["airdrop"].to_json("final/traveler_rewards.json")
+    writeJson(book.toAddressIndex(bridgeTravelers["airdrop"]), "final/traveler_rewards.json")
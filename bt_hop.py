@@ -6,6 +6,7 @@ from pyaml_env import parse_config
 
 from acx.data.chains import SHORTNAME_TO_ID
 from acx.data.tokens import SYMBOL_TO_DECIMALS
+from acx.manifest import startStage, writeParquet
 from acx.thegraph import submit_query_iterate
 
 
@@ -69,6 +70,7 @@ def retrieveTransfers(
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("bt_hop", params["manifest"])
 
     # First and last block data
     HOP_FIRST_BLOCK = params["traveler"]["hop"]["first_block"]
@@ -131,4 +133,4 @@ if __name__ == "__main__":
         }
     )
 
-    hop.to_parquet("raw/hop_transfers.parquet")
+    writeParquet(hop, "raw/hop_transfers.parquet")
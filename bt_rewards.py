@@ -1,16 +1,17 @@
-import json
-
-import pandas as pd
-import web3
+import numpy as np
 
 from pyaml_env import parse_config
 
+from acx.addresses import AddressBook
+from acx.ledger import holders, readLedger
+from acx.manifest import loadJson, readJson, readParquet, startStage, writeJson
 from acx.utils import cutAndPowerScore
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("bt_rewards", params["manifest"])
 
     # Inclusion parameters
     transferCount = params["traveler"]["parameters"]["inclusion"]["transfer_count"]
@@ -24,12 +25,15 @@ if __name__ == "__main__":
     travelStartBlock = params["traveler"]["travel_start_block"]
     travelEndBlock = params["traveler"]["travel_end_block"]
 
+    # Travelers, recipients and LPs are all address ids
+    book = AddressBook.load("intermediate/addresses.parquet")
+
     # Read all transfers that occurred on other bridges
-    df = pd.read_parquet("intermediate/travelerTransfers.parquet")
+    df = readParquet("intermediate/travelerTransfers.parquet")
 
     # Load prices and merge into dataframe
     prices = (
-        pd.read_json("raw/prices.json", orient="records")
+        readJson("raw/prices.json", orient="records")
         .set_index(["date", "symbol"])
     )
     df = df.merge(
@@ -39,42 +43,34 @@ if __name__ == "__main__":
 
     # Load Across transfers
     acrossAddresses = (
-        pd.read_json("intermediate/bridgoorTransactions.json", orient="records")
+        readJson("intermediate/bridgoorTransactions.json", orient="records")
         ["recipient"]
         .unique()
     )
-    acrossAddresses = list(map(web3.Web3.toChecksumAddress, acrossAddresses))
 
     # Filter out any users that have used Across already
-    df = df.query("traveler not in @acrossAddresses")
+    df = df.loc[~df["traveler"].isin(acrossAddresses), :]
 
     # Load Across LPs -- Only look at pre-traveler LPs for exclusion
     originalLpCutoff = 15_649_594
-    v1LpPositions = (
-        pd.read_parquet("intermediate/v1CumulativeLp.parquet")
-        .loc[:originalLpCutoff, :]
-        .max()
-        > 1e-18
-    )
-    v2LpPositions = (
-        pd.read_parquet("intermediate/v2CumulativeLp.parquet")
-        .loc[:originalLpCutoff, :]
-        .max()
-        > 1e-18
-    )
-
-    acrossLps = list(
-        set(v1LpPositions.index[v1LpPositions].get_level_values(1).unique())
-        .union(v2LpPositions.index[v2LpPositions].get_level_values(1).unique())
-    )
+    acrossLps = np.union1d(*[
+        holders(
+            readLedger(
+                f"intermediate/v{version}CumulativeLp.parquet",
+                columns=["lp", "block", "balance"],
+                filters=[("block", "<=", originalLpCutoff)]
+            ),
+            originalLpCutoff, threshold=1e-18
+        )
+        for version in [1, 2]
+    ])
 
     # Filter out any users that have LP'd for Across (prior to BT)
-    df = df.query("traveler not in @acrossLps")
+    df = df.loc[~df["traveler"].isin(acrossLps), :]
 
     # Filter out users who have been identified as sybil
-    with open("raw/sybil.json", "r") as f:
-        sybils = json.loads(f.read())
-    df = df.query("traveler not in @sybils")
+    sybils = book.ids(loadJson("raw/sybil.json"))
+    df = df.loc[~df["traveler"].isin(sybils), :]
 
     # Now we can aggregate and calculate scores
     travelers = (
@@ -102,4 +98,4 @@ if __name__ == "__main__":
 
     # Save output
     travelers = travelers.sort_values("totalVolume", ascending=False)
-    (100 * travelers["score"]).to_json("final/traveler_score.json")
+    writeJson(book.toAddressIndex(100 * travelers["score"]), "final/traveler_score.json")
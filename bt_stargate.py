@@ -1,15 +1,25 @@
+from functools import partial
+
 import pandas as pd
 import web3
 
 from pyaml_env import parse_config
 
 from acx.abis import getABI
+from acx.bloom import eventPrescan
+from acx.cache import EventCache
 from acx.data.chains import SHORTNAME_TO_ID
 from acx.data.tokens import CHAIN_TO_ADDRESS_TO_SYMBOL, SYMBOL_TO_DECIMALS
-from acx.utils import findEvents, scaleDecimals
+from acx.engine import runJobs
+from acx.manifest import startStage, writeParquet
+from acx.session import createProvider
+from acx.utils import findEvents, scaleDecimals, setProviderConcurrency
 
 
-def retrieveSwapRemotes(w3, pool, startBlock, lastBlock, nBlocks):
+def retrieveSwapRemotes(
+        w3, pool, startBlock, lastBlock, nBlocks, nWorkers=1, cache=None,
+        prescan=False
+    ):
     """
     Collect data about the `SwapRemote` events from the Stargate Pool
     contracts
@@ -24,6 +34,15 @@ def retrieveSwapRemotes(w3, pool, startBlock, lastBlock, nBlocks):
         The starting block to collect
     last_block : int
         The ending block (inclusive)
+    nBlocks : int
+        The number of blocks to request at a time
+    nWorkers : int
+        The number of block ranges to request at the same time
+    cache : acx.cache.EventCache, optional
+        An on-disk cache of previously downloaded events
+    prescan : bool
+        Whether to skip block ranges whose headers' blooms rule out any
+        `SwapRemote` events
 
     Returns
     -------
@@ -46,7 +65,8 @@ def retrieveSwapRemotes(w3, pool, startBlock, lastBlock, nBlocks):
     # Collect swap data
     swaps = findEvents(
         w3, pool.events.SwapRemote, startBlock, lastBlock,
-        nBlocks, {}, True
+        nBlocks, {}, True, nWorkers=nWorkers, adaptive=True, cache=cache,
+        prescan=eventPrescan(w3, [pool.events.SwapRemote]) if prescan else None
     )
 
     out = []
@@ -71,22 +91,29 @@ def retrieveSwapRemotes(w3, pool, startBlock, lastBlock, nBlocks):
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("bt_stargate", params["manifest"])
+    cache = EventCache(params["event_cache"])
 
     SUPPORTED_CHAINS = params["traveler"]["stg"]["chains"]
     SUPPORTED_TOKENS = params["traveler"]["stg"]["tokens"]
 
-    swapRemotes = []
+    # Every pool (on every chain) is collected at the same time -- The
+    # number of pools collected at once on a single chain is capped by that
+    # chain's RPC concurrency
+    jobs = []
     for chain in SUPPORTED_CHAINS:
         # Find chain ID
         chainId = SHORTNAME_TO_ID[chain]
 
         # Create a web3 instance
-        provider = web3.Web3.HTTPProvider(
+        provider = createProvider(
             params["rpc_node"][chain],
-            request_kwargs={"timeout": 60}
+            rateLimit=params["rpc_rate_limit"][chain]
         )
         w3 = web3.Web3(provider)
         nBlocks = params["traveler"]["n_blocks"][chainId]
+        nWorkers = params["rpc_concurrency"][chain]
+        setProviderConcurrency(w3, nWorkers)
 
         for token in SUPPORTED_TOKENS:
             contractInfo = params["traveler"]["stg"]["contract_info"]
@@ -106,8 +133,18 @@ if __name__ == "__main__":
                 address=poolAddress, abi=getABI("StargatePool")
             )
 
-            _swaps = retrieveSwapRemotes(w3, pool, fb, lb, nBlocks)
-            swapRemotes.extend(_swaps)
+            jobs.append((
+                chain,
+                partial(
+                    retrieveSwapRemotes,
+                    w3, pool, fb, lb, nBlocks, nWorkers, cache,
+                    chain in params["traveler"]["bloom_prescan"]
+                )
+            ))
+
+    swapRemotes = []
+    for _swaps in runJobs(jobs, limits=params["rpc_concurrency"]):
+        swapRemotes.extend(_swaps)
 
     stg = pd.DataFrame(swapRemotes)
-    stg.to_parquet("raw/stg_transfers.parquet")
+    writeParquet(stg, "raw/stg_transfers.parquet")
@@ -1,14 +1,20 @@
+from functools import partial
+
 import pandas as pd
 import web3
 
 from pyaml_env import parse_config
 
 from acx.abis import getABI
+from acx.cache import EventCache
 from acx.data.chains import SHORTNAME_TO_ID
 from acx.data.tokens import (
     CHAIN_TO_ADDRESS_TO_SYMBOL, SYMBOL_TO_CHAIN_TO_ADDRESS, SYMBOL_TO_DECIMALS
 )
-from acx.utils import findEvents, scaleDecimals
+from acx.engine import runJobs
+from acx.manifest import startStage, writeParquet
+from acx.session import createProvider
+from acx.utils import findEventsMulti, scaleDecimals, setProviderConcurrency
 
 
 # Mapping comes from going to the pool contract and identifying
@@ -74,111 +80,155 @@ CHAIN_TO_SYNTOKEN_TO_SWAPSYMBOL = {
 }
 
 
-if __name__ == "__main__":
-    # Load parameters
-    params = parse_config("parameters.yaml")
-
-    # Chains/Tokens to support
-    SUPPORTED_CHAINS = params["traveler"]["synapse"]["chains"]
+def retrieveInflows(params, chain, cache=None):
+    """
+    Collect the Synapse bridge inflows of the supported tokens on a single
+    chain
+
+    Parameters
+    ----------
+    params : dict
+        The parameters from `parameters.yaml`
+    chain : str
+        The short name of the chain
+    cache : acx.cache.EventCache, optional
+        An on-disk cache of previously downloaded events
+
+    Returns
+    -------
+    out : list(dict)
+        One row per inflow
+    """
     SUPPORTED_TOKENS = params["traveler"]["synapse"]["tokens"]
     contractInfo = params["traveler"]["synapse"]["contract_info"]
 
-    synapseInflows = []
-    for chain in SUPPORTED_CHAINS:
-        chainId = SHORTNAME_TO_ID[chain]
-        chainInfo = contractInfo[chainId]
-
-        # Select a single chain so we have address -> symbol
-        ADDRESS_TO_SYMBOL = CHAIN_TO_ADDRESS_TO_SYMBOL[chainId]
-
-        # Web 3 instance for particular chain
-        provider = web3.Web3.HTTPProvider(
-            params["rpc_node"][chain],
-            request_kwargs={"timeout": 60}
-        )
-        w3 = web3.Web3(provider)
-
-        # First, last block, and number of blocks to search at once
-        fb = chainInfo["first_block"]
-        lb = chainInfo["last_block"]
-        nBlocks = params["traveler"]["n_blocks"][chainId]
-
-        # Create synapse bridge
-        bridgeAddress = chainInfo["address"]
-        bridge = w3.eth.contract(
-            address=bridgeAddress, abi=getABI("SynapseBridge")
-        )
-
-        # Inflow events as defined by Synapse here:
-        # https://github.com/synapsecns/synapse-indexer/blob/6d3fcb4cd57d2413800a1c6858b8215a880b27f3/config/topics.js
-        inflowEvents = [
-            bridge.events.TokenWithdraw, bridge.events.TokenWithdrawAndRemove,
-            bridge.events.TokenMint, bridge.events.TokenMintAndSwap
-        ]
-
-        for event in inflowEvents:
-            # Get event name so that we can do logic on it
-            eventName = event.event_name
-
-            # Collect event data
-            inflows = findEvents(w3, event, fb, lb, nBlocks, {}, True)
-
-            for inflow in inflows:
-                # Separate args into more accessible object
-                inflowArgs = inflow["args"]
-
-                # Extract token address and make sure that it's a token
-                # in our list of tokens
-                tokenAddress = inflowArgs["token"]
-                if tokenAddress not in ADDRESS_TO_SYMBOL.keys():
-                    continue
-
-                # Depending on the event type, we have to do different things
-                if eventName in ["TokenWithdraw", "TokenMint"]:
-                    symbolFrom = ADDRESS_TO_SYMBOL[tokenAddress]
-                    symbolTo = symbolFrom
-
-                elif eventName == "TokenWithdrawAndRemove":
-                    symbolFrom = ADDRESS_TO_SYMBOL[tokenAddress]
-
-                    if inflowArgs["swapSuccess"]:
-                        idxTo = inflowArgs["swapTokenIndex"]
-                        symbolTo = CHAIN_TO_SYNTOKEN_TO_SWAPSYMBOL[chainId][tokenAddress][idxTo]
-                    else:
-                        symbolTo = ADDRESS_TO_SYMBOL[tokenAddress]
-
-                elif eventName == "TokenMintAndSwap":
-                    # Determine index of entry and exit
-                    idxFrom = inflowArgs["tokenIndexFrom"]
-                    if inflowArgs["swapSuccess"]:
-                        idxTo = inflowArgs["tokenIndexTo"]
-                    else:
-                        idxTo = inflowArgs["tokenIndexFrom"]
-
-                    symbolFrom = CHAIN_TO_SYNTOKEN_TO_SWAPSYMBOL[chainId][tokenAddress][idxFrom]
+    chainId = SHORTNAME_TO_ID[chain]
+    chainInfo = contractInfo[chainId]
+
+    # Select a single chain so we have address -> symbol
+    ADDRESS_TO_SYMBOL = CHAIN_TO_ADDRESS_TO_SYMBOL[chainId]
+
+    # Web 3 instance for particular chain
+    provider = createProvider(
+        params["rpc_node"][chain],
+        rateLimit=params["rpc_rate_limit"][chain]
+    )
+    w3 = web3.Web3(provider)
+    nWorkers = params["rpc_concurrency"][chain]
+    setProviderConcurrency(w3, nWorkers)
+
+    # First, last block, and number of blocks to search at once
+    fb = chainInfo["first_block"]
+    lb = chainInfo["last_block"]
+    nBlocks = params["traveler"]["n_blocks"][chainId]
+
+    # Create synapse bridge
+    bridgeAddress = chainInfo["address"]
+    bridge = w3.eth.contract(
+        address=bridgeAddress, abi=getABI("SynapseBridge")
+    )
+
+    # Inflow events as defined by Synapse here:
+    # https://github.com/synapsecns/synapse-indexer/blob/6d3fcb4cd57d2413800a1c6858b8215a880b27f3/config/topics.js
+    inflowEvents = [
+        bridge.events.TokenWithdraw, bridge.events.TokenWithdrawAndRemove,
+        bridge.events.TokenMint, bridge.events.TokenMintAndSwap
+    ]
+
+    # Collect data for all inflow events with one request per block
+    # range
+    allInflows = findEventsMulti(
+        w3, inflowEvents, fb, lb, nBlocks, True,
+        nWorkers=nWorkers, adaptive=True, cache=cache
+    )
+
+    out = []
+    for event in inflowEvents:
+        # Get event name so that we can do logic on it
+        eventName = event.event_name
+        inflows = allInflows[(bridgeAddress, eventName)]
+
+        for inflow in inflows:
+            # Separate args into more accessible object
+            inflowArgs = inflow["args"]
+
+            # Extract token address and make sure that it's a token
+            # in our list of tokens
+            tokenAddress = inflowArgs["token"]
+            if tokenAddress not in ADDRESS_TO_SYMBOL.keys():
+                continue
+
+            # Depending on the event type, we have to do different things
+            if eventName in ["TokenWithdraw", "TokenMint"]:
+                symbolFrom = ADDRESS_TO_SYMBOL[tokenAddress]
+                symbolTo = symbolFrom
+
+            elif eventName == "TokenWithdrawAndRemove":
+                symbolFrom = ADDRESS_TO_SYMBOL[tokenAddress]
+
+                if inflowArgs["swapSuccess"]:
+                    idxTo = inflowArgs["swapTokenIndex"]
                     symbolTo = CHAIN_TO_SYNTOKEN_TO_SWAPSYMBOL[chainId][tokenAddress][idxTo]
+                else:
+                    symbolTo = ADDRESS_TO_SYMBOL[tokenAddress]
+
+            elif eventName == "TokenMintAndSwap":
+                # Determine index of entry and exit
+                idxFrom = inflowArgs["tokenIndexFrom"]
+                if inflowArgs["swapSuccess"]:
+                    idxTo = inflowArgs["tokenIndexTo"]
+                else:
+                    idxTo = inflowArgs["tokenIndexFrom"]
+
+                symbolFrom = CHAIN_TO_SYNTOKEN_TO_SWAPSYMBOL[chainId][tokenAddress][idxFrom]
+                symbolTo = CHAIN_TO_SYNTOKEN_TO_SWAPSYMBOL[chainId][tokenAddress][idxTo]
+
+            # Make sure it is a token that we are tracking for bridge traveler
+            if symbolTo not in SUPPORTED_TOKENS:
+                continue
 
-                # Make sure it is a token that we are tracking for bridge traveler
-                if symbolTo not in SUPPORTED_TOKENS:
-                    continue
+            decimalsFrom = SYMBOL_TO_DECIMALS[symbolFrom]
+            decimalsTo = SYMBOL_TO_DECIMALS[symbolTo]
 
-                decimalsFrom = SYMBOL_TO_DECIMALS[symbolFrom]
-                decimalsTo = SYMBOL_TO_DECIMALS[symbolTo]
+            # Save row by row
+            row = {}
 
-                # Save row by row
-                row = {}
+            row["eventName"] = eventName
+            row["kappa"] = inflowArgs["kappa"]
+            row["block"] = inflow["blockNumber"]
+            row["tx"] = inflow["transactionHash"]
+            row["chainId"] = chainId
+            row["recipient"] = inflowArgs["to"]
+            row["symbol"] = symbolTo
+            row["amount"] = scaleDecimals(inflowArgs["amount"], decimalsTo)
+            row["fee"] = scaleDecimals(inflowArgs["fee"], decimalsFrom)
 
-                row["eventName"] = eventName
-                row["kappa"] = inflowArgs["kappa"]
-                row["block"] = inflow["blockNumber"]
-                row["tx"] = inflow["transactionHash"]
-                row["chainId"] = chainId
-                row["recipient"] = inflowArgs["to"]
-                row["symbol"] = symbolTo
-                row["amount"] = scaleDecimals(inflowArgs["amount"], decimalsTo)
-                row["fee"] = scaleDecimals(inflowArgs["fee"], decimalsFrom)
+            out.append(row)
 
-                synapseInflows.append(row)
+    return out
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    startStage("bt_synapse", params["manifest"])
+    cache = EventCache(params["event_cache"])
+
+    # Chains to support
+    SUPPORTED_CHAINS = params["traveler"]["synapse"]["chains"]
+
+    # Each chain is on its own RPC endpoint so they are collected at the
+    # same time
+    synapseInflows = []
+    chainInflows = runJobs(
+        [
+            (chain, partial(retrieveInflows, params, chain, cache))
+            for chain in SUPPORTED_CHAINS
+        ],
+        limits=params["rpc_concurrency"]
+    )
+    for inflows in chainInflows:
+        synapseInflows.extend(inflows)
 
     df = pd.DataFrame(synapseInflows)
-    df.to_parquet("raw/synapse_transfers.parquet")
+    writeParquet(df, "raw/synapse_transfers.parquet")
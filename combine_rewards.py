@@ -1,96 +1,110 @@
 import decimal
-import json
 
 from decimal import Decimal
 
 import pandas as pd
-import web3
-
-
-bridgoor = pd.DataFrame(
-    pd.read_json("final/bridgoor_rewards.json", typ="series"),
-    columns=["bridgoor"]
-)
-if bridgoor["bridgoor"].isna().any():
-    raise ValueError("Missing values in bridgoor data")
-
-lp = pd.DataFrame(
-    pd.read_json("final/lp_rewards.json", typ="series"),
-    columns=["lp"]
-)
-if lp["lp"].isna().any():
-    raise ValueError("Missing values in lp data")
-
-travelers = pd.DataFrame(
-    pd.read_json("final/traveler_rewards.json", typ="series"),
-    columns=["bridge-traveler"]
-)
-if travelers["bridge-traveler"].isna().any():
-    raise ValueError("Missing values in traveler data")
-
-community = pd.DataFrame(
-    pd.read_json("final/community_rewards.json", typ="series"),
-    columns=["community"]
-)
-
-out = (
-    pd.DataFrame(travelers).join(
-        [bridgoor, community, lp], how="outer"
-    )
-    .fillna(0.0)
-)
-out.index.name = "address"
-out.index = out.index.map(lambda x: web3.Web3.toChecksumAddress(x))
-
-# Make sure no duplicates
-assert out.index.duplicated().sum() == 0
-
-# Convert everything to decimal types for more accurate/consistent computations
-out = out.applymap(lambda x: Decimal(x).quantize(Decimal("0.0000")))
 
-# Format for mr
-mrout = {}
-mrout["recipients"] = []
+from pyaml_env import parse_config
 
-# Metadata
-mrout["chainId"] = 1
-mrout["rewardToken"] = ""
-mrout["windowIndex"] = 0
+from acx.addresses import AddressBook
+from acx.manifest import dumpJson, readJson, startStage, writeJson
 
 
 # Constant 1e18 for convenience
 zeros = Decimal(1e18)
-runningSum = Decimal(0)
 
-# Iterate through rows and compute total and save to merkle tree object
+
 def removeDecimals(x):
     return x.quantize(Decimal("0"))
 
-for (address, row) in out.iterrows():
-
-    # Add by hand because `.sum` converted to float
-    totalDecimal = row["bridge-traveler"] + row["bridgoor"] + row["community"] + row["lp"]
-    runningSum += totalDecimal*zeros
-    out.at[address, "total"] = totalDecimal
-
-    entry = {
-        "account": address,
-        "amount": str(removeDecimals(totalDecimal*zeros)),
-        "metadata": {
-            "amountBreakdown": {
-                "communityRewards":  str(removeDecimals(row["community"] * zeros)),
-                "welcomeTravelerRewards": str(removeDecimals(row["bridge-traveler"] * zeros)),
-                "earlyUserRewards": str(removeDecimals(row["bridgoor"] * zeros)),
-                "liquidityProviderRewards": str(removeDecimals(row["lp"] * zeros))
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    startStage("combine_rewards", params["manifest"])
+
+    # Every list is joined on address ids
+    book = AddressBook.load("intermediate/addresses.parquet")
+
+    bridgoor = pd.DataFrame(
+        readJson("final/bridgoor_rewards.json", typ="series"),
+        columns=["bridgoor"]
+    )
+    if bridgoor["bridgoor"].isna().any():
+        raise ValueError("Missing values in bridgoor data")
+
+    lp = pd.DataFrame(
+        readJson("final/lp_rewards.json", typ="series"),
+        columns=["lp"]
+    )
+    if lp["lp"].isna().any():
+        raise ValueError("Missing values in lp data")
+
+    travelers = pd.DataFrame(
+        readJson("final/traveler_rewards.json", typ="series"),
+        columns=["bridge-traveler"]
+    )
+    if travelers["bridge-traveler"].isna().any():
+        raise ValueError("Missing values in traveler data")
+
+    community = pd.DataFrame(
+        readJson("final/community_rewards.json", typ="series"),
+        columns=["community"]
+    )
+
+    for _df in [bridgoor, lp, travelers, community]:
+        _df.index = book.ids(_df.index)
+
+    out = (
+        pd.DataFrame(travelers).join(
+            [bridgoor, community, lp], how="outer"
+        )
+        .fillna(0.0)
+    )
+    out.index = pd.Index(book.addresses(out.index), name="address")
+
+    # Make sure no duplicates
+    assert out.index.duplicated().sum() == 0
+
+    # Convert everything to decimal types for more accurate/consistent computations
+    out = out.map(lambda x: Decimal(x).quantize(Decimal("0.0000")))
+
+    # Format for mr
+    mrout = {}
+    mrout["recipients"] = []
+
+    # Metadata
+    mrout["chainId"] = 1
+    mrout["rewardToken"] = ""
+    mrout["windowIndex"] = 0
+
+    runningSum = Decimal(0)
+
+    # Iterate through rows and compute total and save to merkle tree object
+    for (address, row) in out.iterrows():
+
+        # Add by hand because `.sum` converted to float
+        totalDecimal = row["bridge-traveler"] + row["bridgoor"] + row["community"] + row["lp"]
+        runningSum += totalDecimal*zeros
+        out.at[address, "total"] = totalDecimal
+
+        entry = {
+            "account": address,
+            "amount": str(removeDecimals(totalDecimal*zeros)),
+            "metadata": {
+                "amountBreakdown": {
+                    "communityRewards":  str(removeDecimals(row["community"] * zeros)),
+                    "welcomeTravelerRewards": str(removeDecimals(row["bridge-traveler"] * zeros)),
+                    "earlyUserRewards": str(removeDecimals(row["bridgoor"] * zeros)),
+                    "liquidityProviderRewards": str(removeDecimals(row["lp"] * zeros))
+                }
             }
         }
-    }
-    mrout["recipients"].append(entry)
+        mrout["recipients"].append(entry)
 
-mrout["rewardsToDeposit"] = str(removeDecimals(runningSum))
+    mrout["rewardsToDeposit"] = str(removeDecimals(runningSum))
 
-out.to_json("final/final_combined.json", orient="index")
-out.to_csv("final/final_combined.csv")
+    writeJson(out, "final/final_combined.json", orient="index")
+    out.to_csv("final/final_combined.csv")
 
-with open("final/mr.json", "w") as f:
-    json.dump(mrout, f)
+    dumpJson(mrout, "final/mr.json", rows=len(mrout["recipients"]))
@@ -1,90 +1,69 @@
-import json
-
+import numpy as np
 import pandas as pd
 
 from pyaml_env import parse_config
 
+from acx.addresses import AddressBook
+from acx.columnar import readEventFrame
 from acx.data.tokens import SYMBOL_TO_DECIMALS
+from acx.ledger import buildLedger, writeLedger
+from acx.manifest import startStage
 from acx.utils import scaleDecimals
 
 
-def processTransfers(lpTransfers, version=1):
+def processTransfers(lpTransfers):
     """
     Helper to process transfers and store in an LP friendly format
-    """
-    out = []
-    for token in lpTransfers.keys():
-        decimals = SYMBOL_TO_DECIMALS[token]
 
-        for transfer in lpTransfers[token]:
-            args = transfer["args"]
+    Parameters
+    ----------
+    lpTransfers : pd.DataFrame
+        The `blockNumber`, `from`, `to` (address ids), `value` and `symbol`
+        of each transfer (see `acx.columnar.readEventFrame`)
+    """
+    # Person that transfer is to is increasing their LP position while
+    # the person it is from is decreasing their LP position
+    amount = np.array([
+        scaleDecimals(value, SYMBOL_TO_DECIMALS[symbol])
+        for (value, symbol) in zip(lpTransfers["value"], lpTransfers["symbol"])
+    ], dtype=float)
 
-            for dest in ["to", "from"]:
-                # Person that transfer is to is increasing their LP position while
-                # the person it is from is decreasing their LP position
-                sign = 1 if dest == "to" else -1
-                row = {
-                    "block": transfer["blockNumber"],
-                    "tx": transfer["transactionHash"],
-                    "lp": args[dest],
-                    "symbol": token,
-                    "amount": sign * scaleDecimals(args["value"], decimals),
-                }
-                out.append(row)
+    out = []
+    for (dest, sign) in [("to", 1), ("from", -1)]:
+        out.append(pd.DataFrame({
+            "block": lpTransfers["blockNumber"],
+            "lp": lpTransfers[dest],
+            "symbol": lpTransfers["symbol"],
+            "amount": sign * amount,
+        }))
 
-    return out
+    return pd.concat(out, axis=0, ignore_index=True)
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("lp_cumulative", params["manifest"])
 
-    # Get start/end blocks for LP rewards
-    v1StartBlock = params["lp"]["v1_start_block"]
-    v1EndBlock = params["lp"]["v1_end_block"]
-
-    v2StartBlock = params["lp"]["v2_start_block"]
-    v2EndBlock = params["lp"]["v2_end_block"]
+    # LPs are converted into their address ids as they are read
+    book = AddressBook.load("intermediate/addresses.parquet")
 
-    # Load raw data
-    with open("raw/v1Transfers.json", "r") as f:
-        v1TransfersRaw = json.loads(f.read())
-    v1Transfers = pd.DataFrame(processTransfers(v1TransfersRaw, 1))
-
-    with open("raw/v2Transfers.json", "r") as f:
-        v2TransfersRaw = json.loads(f.read())
-    v2Transfers = pd.DataFrame(processTransfers(v2TransfersRaw, 2))
-
-    # Get all blocks and LPs -- We will exclude the 0x0 address since it
-    # isn't a real LP and is just used in minting/burning
-    allLps = list(
-        set(v1Transfers["lp"].unique())
-        .union(set(v2Transfers["lp"].unique()))
-        .difference(set(["0x0000000000000000000000000000000000000000"]))
+    # Load raw data -- Only the columns that are used
+    columns = ["blockNumber", "from", "to", "value", "symbol"]
+    v1TransfersRaw = readEventFrame(
+        "raw/v1Transfers.parquet", columns=columns, addressBook=book
     )
-    allTokens = params["lp"]["tokens"]
-    newIndex = pd.MultiIndex.from_product([allTokens, allLps])
+    v1Transfers = processTransfers(v1TransfersRaw)
 
-    # Cumulative totals
-    for version in [1, 2]:
-        if version == 1:
-            _df = v1Transfers
-            startBlock, endBlock = v1StartBlock, v1EndBlock
-        elif version == 2:
-            _df = v2Transfers
-            startBlock, endBlock = v2StartBlock, v2EndBlock
-        else:
-            raise ValueError("Version must be 1 or 2")
+    v2TransfersRaw = readEventFrame(
+        "raw/v2Transfers.parquet", columns=columns, addressBook=book
+    )
+    v2Transfers = processTransfers(v2TransfersRaw)
 
-        data = (
-            _df
-            .pivot_table(
-                index="block", columns=["symbol", "lp"], values="amount",
-                aggfunc="sum"
-            )
-            .fillna(0.0)
-            .reindex(columns=newIndex, fill_value=0.0)
-            .sort_index()
-            .cumsum()
-        )
-        data.to_parquet(f"intermediate/v{version}CumulativeLp.parquet")
+    # Store each version as a sparse ledger of the blocks that every
+    # (symbol, lp) position changed in -- We will exclude the 0x0 address
+    # since it isn't a real LP and is just used in minting/burning
+    allTokens = params["lp"]["tokens"]
+    for (version, _df) in [(1, v1Transfers), (2, v2Transfers)]:
+        ledger = buildLedger(_df, allTokens, exclude=[book.zeroId()])
+        writeLedger(f"intermediate/v{version}CumulativeLp.parquet", ledger)
@@ -1,33 +1,41 @@
-import json
-
 import pandas as pd
 import web3
 
 from pyaml_env import parse_config
 
-from acx.abis import getABI
+from acx.abis import getABI, getEventABI
+from acx.cache import EventCache
+from acx.columnar import writeEvents, writeEventsBySymbol
 from acx.data.tokens import SYMBOL_TO_CHAIN_TO_ADDRESS
-from acx.utils import findEvents
+from acx.manifest import dumpJson, startStage
+from acx.rpc import aggregateCalls
+from acx.session import createProvider
+from acx.utils import findEventsMulti, setProviderConcurrency
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("lp_events", params["manifest"])
+    cache = EventCache(params["event_cache"])
     nBlocks = params["lp"]["n_blocks"]
+    nWorkers = params["rpc_concurrency"]["mainnet"]
 
     # Connect to RPC node
-    provider = web3.Web3.HTTPProvider(
+    provider = createProvider(
         params["rpc_node"]["mainnet"],
-        request_kwargs={"timeout": 60}
+        rateLimit=params["rpc_rate_limit"]["mainnet"]
     )
     w3 = web3.Web3(provider)
+    setProviderConcurrency(w3, nWorkers)
 
     # -------------------------------------
     # V1 Liquidity Add/Remove
     # -------------------------------------
     v1EndBlock = params["lp"]["v1_end_block"]
 
-    v1Transfers = {}
+    v1Pools = {}
+    v1FirstBlocks = []
     for token in params["lp"]["tokens"]:
         # Get information about specific BridgePool
         # NOTE: We have to start with `bridgeInfo["first_block"]` because
@@ -35,20 +43,42 @@ if __name__ == "__main__":
         #       prior to the first block we track for...
         bridgeInfo = params["across"]["v1"]["mainnet"]["bridge"][token]
         poolAddress = bridgeInfo["address"]
-        v1FirstBlock = bridgeInfo["first_block"]
-        v1EndBlock = params["lp"]["v1_end_block"]
+        v1FirstBlocks.append(bridgeInfo["first_block"])
 
         # Create BridgePool object
-        pool = w3.eth.contract(address=poolAddress, abi=getABI("BridgePool"))
-
-        # Track transfer events
-        v1Transfers[token] = findEvents(
-            w3, pool.events.Transfer, v1FirstBlock, v1EndBlock,
-            nBlocks, {}, True
+        v1Pools[token] = w3.eth.contract(
+            address=poolAddress, abi=getABI("BridgePool")
         )
 
-    with open("raw/v1Transfers.json", "w") as f:
-        json.dump(v1Transfers, f)
+    # Track transfer events of every pool with one request per block
+    # range -- Starting at the earliest first block is safe because a pool
+    # can't emit events before it is deployed. Relays and their
+    # settlements are collected along with them because settlements are
+    # when LP fees are allocated (see `acx/exchangerates.py`)
+    v1EventNames = ["Transfer", "DepositRelayed", "RelaySettled"]
+    v1Events = findEventsMulti(
+        w3,
+        [
+            getattr(pool.events, name)
+            for pool in v1Pools.values() for name in v1EventNames
+        ],
+        min(v1FirstBlocks), v1EndBlock,
+        nBlocks, True, nWorkers=nWorkers, adaptive=True, cache=cache
+    )
+
+    v1Files = {
+        "Transfer": "raw/v1Transfers.parquet",
+        "DepositRelayed": "raw/v1PoolRelays.parquet",
+        "RelaySettled": "raw/v1RelaySettled.parquet",
+    }
+    for name in v1EventNames:
+        writeEventsBySymbol(
+            v1Files[name], getEventABI("BridgePool", name),
+            {
+                token: v1Events.get((pool.address, name), [])
+                for (token, pool) in v1Pools.items()
+            }
+        )
 
     # -------------------------------------
     # V2 Liquidity Add/Remove
@@ -59,15 +89,79 @@ if __name__ == "__main__":
 
     hub = w3.eth.contract(address=hubInfo["address"], abi=getABI("HubPool"))
 
-    v2Transfers = {}
-    for token in params["lp"]["tokens"]:
-        lpTokenAddress = hub.functions.pooledTokens(SYMBOL_TO_CHAIN_TO_ADDRESS[token][1]).call()[0]
-        lpToken = w3.eth.contract(address=lpTokenAddress, abi=getABI("ERC20"))
+    # Read every pool's LP token from the hub in a single aggregated call
+    tokens = params["lp"]["tokens"]
+    (pooledTokens,) = aggregateCalls(
+        w3,
+        [
+            (
+                "latest",
+                [
+                    hub.functions.pooledTokens(SYMBOL_TO_CHAIN_TO_ADDRESS[token][1])
+                    for token in tokens
+                ]
+            )
+        ],
+        multicallAddress=params["multicall"]["address"],
+        multicallFirstBlock=params["multicall"]["first_block"][1]
+    )
 
-        v2Transfers[token] = findEvents(
-            w3, lpToken.events.Transfer, v2FirstBlock, v2EndBlock,
-            nBlocks, {}, True
+    v2LpTokens = {}
+    for (token, pooledToken) in zip(tokens, pooledTokens):
+        lpTokenAddress = pooledToken[0]
+        v2LpTokens[token] = w3.eth.contract(
+            address=lpTokenAddress, abi=getABI("ERC20")
         )
 
-        with open(f"raw/v2Transfers.json", "w") as f:
-            json.dump(v2Transfers, f)
+    # Track transfer events of every LP token with one request per block
+    # range
+    v2Events = findEventsMulti(
+        w3, [lpToken.events.Transfer for lpToken in v2LpTokens.values()],
+        v2FirstBlock, v2EndBlock,
+        nBlocks, True, nWorkers=nWorkers, adaptive=True, cache=cache
+    )
+    v2Transfers = {
+        token: v2Events[(lpToken.address, "Transfer")]
+        for (token, lpToken) in v2LpTokens.items()
+    }
+
+    writeEventsBySymbol(
+        "raw/v2Transfers.parquet", getEventABI("ERC20", "Transfer"), v2Transfers
+    )
+
+    # -------------------------------------
+    # V2 LP Fees
+    # -------------------------------------
+    # LP fees are allocated when each root bundle leaf is executed and the
+    # protocol keeps `protocolFeeCapturePct` of them
+    hubEventNames = ["RootBundleExecuted", "ProtocolFeeCaptureSet"]
+    hubEvents = findEventsMulti(
+        w3, [getattr(hub.events, name) for name in hubEventNames],
+        v2FirstBlock, v2EndBlock,
+        nBlocks, True, nWorkers=nWorkers, adaptive=True, cache=cache
+    )
+    for name in hubEventNames:
+        path = f"raw/v2{name}.parquet"
+        writeEvents(
+            path, getEventABI("HubPool", name), hubEvents.get((hub.address, name), [])
+        )
+
+    # The rate at which allocated LP fees are paid out is fixed when each
+    # pool is created, so it is read at the latest block
+    (feeRates,) = aggregateCalls(
+        w3,
+        [
+            (
+                "latest",
+                [pool.functions.lpFeeRatePerSecond() for pool in v1Pools.values()]
+                + [hub.functions.lpFeeRatePerSecond()]
+            )
+        ],
+        multicallAddress=params["multicall"]["address"],
+        multicallFirstBlock=params["multicall"]["first_block"][1]
+    )
+    lpFeeRates = {
+        "v1": dict(zip(v1Pools.keys(), feeRates[:-1])),
+        "v2": {token: feeRates[-1] for token in tokens},
+    }
+    dumpJson(lpFeeRates, "raw/lpFeeRates.json", rows=len(feeRates))
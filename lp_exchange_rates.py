@@ -1,37 +1,145 @@
-import json
+import os
 
+import numpy as np
 import pandas as pd
 import web3
 
 from pyaml_env import parse_config
 
 from acx.abis import getABI
+from acx.blockstore import BlockStore
+from acx.blocktime import BlockTimestamps
+from acx.columnar import readEventFrame
 from acx.data.tokens import SYMBOL_TO_CHAIN_TO_ADDRESS
-from acx.utils import scaleDecimals
+from acx.exchangerates import exchangeRates, v1PoolChanges, v2PoolChanges
+from acx.manifest import dumpJson, loadJson, readJson, startStage
+from acx.rpc import aggregateCalls
+from acx.session import createProvider
+from acx.utils import scaleDecimals, setProviderConcurrency
+
+
+def eventExchangeRates(headers, samples, firstBlocks):
+    """
+    Rebuild the exchange rates of `samples` from the pools' events rather
+    than calling `exchangeRateCurrent` on an archive node (see
+    `acx.exchangerates.PoolAccounting`)
+
+    Fees accrue with the seconds between updates so every event and
+    sample uses its block's exact timestamp (the block store interpolates
+    between the blocks that it has headers for)
+
+    Parameters
+    ----------
+    headers : BlockTimestamps
+        Used for the timestamp of every event and sample
+    samples : list(tuple(str, str, int))
+        The (version, symbol, block) of each rate
+    firstBlocks : dict(tuple(str, str), int)
+        The block that each (version, symbol) pool was created in
+
+    Returns
+    -------
+    rates : list(int)
+        The (fixed point) exchange rate of each sample
+    """
+    transferColumns = ["blockNumber", "logIndex", "from", "to", "value", "symbol"]
+    changes = {
+        "v1": v1PoolChanges(
+            readEventFrame("raw/v1Transfers.parquet", transferColumns),
+            readEventFrame(
+                "raw/v1RelaySettled.parquet",
+                ["blockNumber", "logIndex", "depositHash", "relay.realizedLpFeePct", "symbol"]
+            ),
+            readEventFrame("raw/v1PoolRelays.parquet", ["depositHash", "depositData.amount"])
+        ),
+        "v2": v2PoolChanges(
+            readEventFrame("raw/v2Transfers.parquet", transferColumns),
+            readEventFrame(
+                "raw/v2RootBundleExecuted.parquet",
+                ["blockNumber", "logIndex", "l1Tokens", "bundleLpFees"]
+            ),
+            readEventFrame(
+                "raw/v2ProtocolFeeCaptureSet.parquet",
+                ["blockNumber", "logIndex", "newProtocolFeeCapturePct"]
+            ),
+            {
+                token: SYMBOL_TO_CHAIN_TO_ADDRESS[token][1]
+                for token in set(token for (_, token, _) in samples)
+            }
+        ),
+    }
+    for versionChanges in changes.values():
+        versionChanges["timestamp"] = np.array(
+            headers.get(versionChanges["block"]), dtype=np.int64
+        )
+
+    lpFeeRates = loadJson("raw/lpFeeRates.json")
+
+    # Each pool is replayed once for all of its samples
+    rates = [None]*len(samples)
+    pools = {}
+    for (i, (version, token, block)) in enumerate(samples):
+        pools.setdefault((version, token), []).append((i, block))
+    for ((version, token), poolSamples) in pools.items():
+        idx = [i for (i, _) in poolSamples]
+        blocks = np.array([block for (_, block) in poolSamples], dtype=np.int64)
+        versionChanges = changes[version]
+        createdAt = headers.get([firstBlocks[(version, token)]])[0]
+        poolRates = exchangeRates(
+            versionChanges.loc[versionChanges["symbol"] == token, :],
+            lpFeeRates[version][token], createdAt,
+            blocks, np.array(headers.get(blocks), dtype=np.int64)
+        )
+        for (i, rate) in zip(idx, poolRates):
+            rates[i] = rate
+
+    return rates
+
+
+def validateExchangeRates(path, rows, maxError):
+    """
+    Compare rebuilt exchange rates with the ones already saved in `path`
+    (i.e. sampled from an archive node) and raise a ValueError if any
+    differs by more than `maxError` (relative)
+    """
+    saved = (
+        readJson(path, orient="records")
+        .loc[:, ["block", "symbol", "exchangeRate"]]
+        .query("exchangeRate > 0")
+    )
+    compared = saved.merge(
+        pd.DataFrame(rows).loc[:, ["block", "symbol", "exchangeRate"]],
+        on=["block", "symbol"], suffixes=["Saved", "Events"]
+    )
+    compared["error"] = (
+        (compared["exchangeRateEvents"] - compared["exchangeRateSaved"]).abs()
+        / compared["exchangeRateSaved"]
+    )
+
+    report = compared.groupby("symbol")["error"].agg(["count", "mean", "max"])
+    print(f"Rebuilt exchange rates vs {path}")
+    print(report.to_string())
+
+    if (compared["error"] > maxError).any():
+        raise ValueError(
+            f"{(compared['error'] > maxError).sum()} rebuilt exchange rates differ "
+            f"from {path} by more than {maxError}"
+        )
 
 
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("lp_exchange_rates", params["manifest"])
 
-    # Connect to RPC node
-    provider = web3.Web3.HTTPProvider(
-        params["rpc_node"]["mainnet"],
-        request_kwargs={"timeout": 60}
-    )
-    w3 = web3.Web3(provider)
-
-    # Load block data
-    BLOCKSTODATE = (
-        pd.read_json("raw/blocks.json", orient="records")
-        .query("chainId == 1")
-        .sort_values("block")
-        .loc[:, ["block", "date"]]
-    )
+    # "rpc" calls `exchangeRateCurrent` on an archive node and "events"
+    # rebuilds the rates from the pools' events
+    source = params["lp"]["exchange_rates"]["source"]
+    assert(source in ["rpc", "events"])
 
-    # Create the hub once up front
-    hubInfo = params["across"]["v2"]["mainnet"]["hub"]
-    hub = w3.eth.contract(address=hubInfo["address"], abi=getABI("HubPool"))
+    # Load block data -- The first block of each day on mainnet
+    store = BlockStore(params["block_store"])
+    BLOCKSTODATE = store.dayStarts(1)
 
     # Block bounds -- v1 start block will depend on the pool so it
     # will be retrieved in the loop
@@ -41,61 +149,126 @@ if __name__ == "__main__":
     # -------------------------------------
     # Compute exchange rates
     # -------------------------------------
+    # Build every row up front and remember which rates need to be filled
+    # in -- Rates outside of a pool's lifetime stay zero
     v1ExchangeRates = []
     v2ExchangeRates = []
+    samples = []
+    sampleRows = []
+    firstBlocks = {}
     for token in params["lp"]["tokens"]:
-        # Create the v1 pool
-        bridgeInfo = params["across"]["v1"]["mainnet"]["bridge"][token]
-        poolAddress = bridgeInfo["address"]
-        pool = w3.eth.contract(address=poolAddress, abi=getABI("BridgePool"))
-
         # Get the v1 first block
-        v1FirstBlock = bridgeInfo["first_block"]
+        v1FirstBlock = params["across"]["v1"]["mainnet"]["bridge"][token]["first_block"]
+        firstBlocks[("v1", token)] = v1FirstBlock
+        firstBlocks[("v2", token)] = params["lp"]["v2_lp_token_creation_block"][token]
 
         # Iterate through each date to get exchange rates
-        tokenErs = []
         for row in BLOCKSTODATE.itertuples():
             _date, _block = row.date, row.block
-            print(f"{token} exchange rate for {_date}")
 
             # V1 exchange rate
-            if (_block < v1FirstBlock) | (_block > v1EndBlock):
-                v1Er = 0.0
-            else:
-                v1Er = scaleDecimals(
-                    pool.functions.exchangeRateCurrent().call(block_identifier=_block), 18
-                )
-
             v1Row = {
                 "date": _date.strftime("%Y-%m-%d"),
                 "block": _block,
                 "symbol": token,
-                "exchangeRate": v1Er
+                "exchangeRate": 0.0
             }
             v1ExchangeRates.append(v1Row)
+            if not ((_block < v1FirstBlock) | (_block > v1EndBlock)):
+                samples.append(("v1", token, _block))
+                sampleRows.append(v1Row)
 
             # V2 exchange rate
-            v2FirstBlock = params["lp"]["v2_lp_token_creation_block"][token]
-            if (_block < v2FirstBlock) or (_block > v2EndBlock):
-                v2Er = 0.0
-            else:
-                v2Er = scaleDecimals(
-                    hub.functions.exchangeRateCurrent(
-                        SYMBOL_TO_CHAIN_TO_ADDRESS[token][1]
-                    ).call(block_identifier=_block), 18
-                )
-
+            v2FirstBlock = firstBlocks[("v2", token)]
             v2Row = {
                 "date": _date.strftime("%Y-%m-%d"),
                 "block": _block,
                 "symbol": token,
-                "exchangeRate": v2Er
+                "exchangeRate": 0.0
             }
             v2ExchangeRates.append(v2Row)
+            if not ((_block < v2FirstBlock) or (_block > v2EndBlock)):
+                samples.append(("v2", token, _block))
+                sampleRows.append(v2Row)
+
+    # Connect to RPC node -- Rebuilding from events only needs block
+    # headers so it doesn't have to be an archive node
+    provider = createProvider(
+        params["rpc_node"]["mainnet"],
+        rateLimit=params["rpc_rate_limit"]["mainnet"]
+    )
+    w3 = web3.Web3(provider)
+    nWorkers = params["rpc_concurrency"]["mainnet"]
+    setProviderConcurrency(w3, nWorkers)
+
+    if source == "rpc":
+        # Create the hub and pools once up front
+        hubInfo = params["across"]["v2"]["mainnet"]["hub"]
+        hub = w3.eth.contract(address=hubInfo["address"], abi=getABI("HubPool"))
+        pools = {
+            token: w3.eth.contract(
+                address=params["across"]["v1"]["mainnet"]["bridge"][token]["address"],
+                abi=getABI("BridgePool")
+            )
+            for token in params["lp"]["tokens"]
+        }
+
+        # Group the calls by block so that all of the pools can be read
+        # with a single aggregated call per block
+        blockCalls = {}
+        for (i, (version, token, block)) in enumerate(samples):
+            if version == "v1":
+                fn = pools[token].functions.exchangeRateCurrent()
+            else:
+                fn = hub.functions.exchangeRateCurrent(
+                    SYMBOL_TO_CHAIN_TO_ADDRESS[token][1]
+                )
+            blockCalls.setdefault(block, []).append((i, fn))
+
+        print(f"Retrieving {len(samples)} exchange rates at {len(blockCalls)} blocks")
+        results = aggregateCalls(
+            w3,
+            [
+                (block, [fn for (_, fn) in rowCalls])
+                for (block, rowCalls) in blockCalls.items()
+            ],
+            multicallAddress=params["multicall"]["address"],
+            multicallFirstBlock=params["multicall"]["first_block"][1],
+            nWorkers=nWorkers,
+            allowFailure=True
+        )
+        rates = [None]*len(samples)
+        for (rowCalls, blockResults) in zip(blockCalls.values(), results):
+            for ((i, _), er) in zip(rowCalls, blockResults):
+                rates[i] = er
+
+        # Calls that revert (i.e. a pool that doesn't exist yet) leave the
+        # rate at zero like the days outside of a pool's lifetime
+        failed = [sample for (sample, er) in zip(samples, rates) if er is None]
+        if len(failed) > 0:
+            print(f"{len(failed)} exchange rates reverted and stay zero:")
+            for (version, token, block) in failed:
+                print(f"  {version} {token} at block {block}")
+    else:
+        print(f"Rebuilding {len(samples)} exchange rates from pool events")
+        headers = BlockTimestamps(
+            w3, f"{params['misc']['block']['header_cache']}/1.json", nWorkers
+        )
+        rates = eventExchangeRates(headers, samples, firstBlocks)
+        headers.save()
 
-    with open("raw/v1ExchangeRates.json", "w") as f:
-        json.dump(v1ExchangeRates, f)
+    for (row, er) in zip(sampleRows, rates):
+        if er is not None:
+            row["exchangeRate"] = scaleDecimals(er, 18)
 
-    with open(f"raw/v2ExchangeRates.json", "w") as f:
-        json.dump(v2ExchangeRates, f)
+    # Rebuilt rates are checked against the rates already sampled from
+    # an archive node before they replace them
+    maxError = params["lp"]["exchange_rates"]["max_relative_error"]
+    if (source == "events") and (maxError is not None):
+        for (version, rows) in [("v1", v1ExchangeRates), ("v2", v2ExchangeRates)]:
+            path = f"raw/{version}ExchangeRates.json"
+            if os.path.exists(path):
+                validateExchangeRates(path, rows, maxError)
 
+    dumpJson(v1ExchangeRates, "raw/v1ExchangeRates.json")
+    dumpJson(v2ExchangeRates, "raw/v2ExchangeRates.json")
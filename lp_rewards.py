@@ -1,68 +1,90 @@
-import json
+import os
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import numpy as np
 import pandas as pd
 
 from pyaml_env import parse_config
 
-
-# Load block data
-BLOCKSTODATE = (
-    pd.read_json("raw/blocks.json", orient="records")
-    .query("chainId == 1")
-    .sort_values("block")
-    .loc[:, ["block", "date"]]
+from acx.addresses import AddressBook
+from acx.blockstore import BlockStore
+from acx.engine import runJobs
+from acx.ledger import ledgerHash, readLedger
+from acx.lprewards import (
+    AccrualState, LedgerArrays, accrueRewards, accumulatorRewards,
+    dailyMultipliers, dayWindows, windowRewards, windowRewardsFromDisk
 )
+from acx.manifest import dumpJson, readJson, startStage
 
 
 def computeLpRewards(
-        df, exchangeRates, prices,
-        startBlock, endBlock, rewardPerBlock
+        ledger, exchangeRates, prices, dayStarts,
+        startBlock, endBlock, rewardPerBlock, executor=None
 ):
     """
     This function computes the rewards earned between `startBlock` and
     `endBlock` by breaking the data up into day-at-a-time calculations
+    (see `acx.lprewards.windowRewards`)
+
+    Each day only needs the ledger and that day's multipliers, so when an
+    `executor` is given the days are spread across its worker processes.
+    The ledger's arrays are written once to a temporary directory that
+    every worker memory-maps (rather than each task pickling a copy of
+    the ledger) and the per-day results are summed once all of the days
+    are done
 
     Parameters
     ----------
-    df : DataFrame
-        Contains all of the LP token transfers for either v1 or v2
+    ledger : DataFrame
+        The sparse balance ledger (see `acx.ledger.buildLedger`) of either
+        v1 or v2
     exchangeRates : DataFrame
         Contains all of the LP token exchange rates at a daily frequency
     prices : DataFrame
         Contains token prices at a daily frequency
+    dayStarts : DataFrame
+        The first `block` of each `date` on mainnet (see
+        `BlockStore.dayStarts`)
     startBlock : int
         The block to start tracking rewards at
     endBlock : int
         The block to stop tracking rewards at
+    rewardPerBlock : float
+        The number of rewards paid out each block
+    executor : concurrent.futures.ProcessPoolExecutor, optional
+        Evaluate the days in these worker processes (in this process by
+        default)
 
     Returns
     -------
     addressRewards : Series
-        The rewards an LP will receive -- Original + rewards from
-        `startBlock` to `endBlock`
+        The rewards an LP will receive (indexed by address id) -- Original
+        + rewards from `startBlock` to `endBlock`
     """
-    # df has multi-level columns with (symbol, lp address) as
-    # the two levels -- This extracts the unique lp addresses from
-    # that multi-level
-    lps = df.columns.get_level_values("lp").unique()
-    out = pd.Series(np.zeros_like(lps, dtype=float), index=lps)
+    lps = ledger["lp"].to_numpy()
+    out = np.zeros(lps.max() + 1 if len(lps) > 0 else 0, dtype=float)
+
+    arrays = LedgerArrays.fromLedger(ledger)
+    symbols = ledger["symbol"].cat.categories.astype(str)
 
     # Find the index of the date to start/end
-    startIdx = BLOCKSTODATE["block"].searchsorted(startBlock, side="right") - 1
-    endIdx = BLOCKSTODATE["block"].searchsorted(endBlock, side="right") - 1
+    startIdx = dayStarts["block"].searchsorted(startBlock, side="right") - 1
+    endIdx = dayStarts["block"].searchsorted(endBlock, side="right") - 1
 
     # Can directly use `.loc` because the index is already the
     # ordered positive integers
-    _datetoblock = BLOCKSTODATE.loc[startIdx:endIdx, :]
+    _datetoblock = dayStarts.loc[startIdx:endIdx, :]
 
-    # Date-by-date iteration so that the data we are working with is always
-    # "small enough"
+    # The block window and multipliers of each day -- These are cheap so
+    # they are always built here
+    days = []
     for (idx, block_date) in _datetoblock.iterrows():
         # Extract date from _datetoblock
         date = block_date["date"]
         dailyBlockStart = max(startBlock, block_date["block"])
-        print(f"Working on {date}")
 
         # Get daily price/exchange rate information
         dailyPrices = (
@@ -102,79 +124,155 @@ def computeLpRewards(
         if dailyBlockStart == dailyBlockEnd:
             continue
 
-        # Find the last position prior to today's positions and, if there's
-        # data in the first block of the day, add that as the first block
-        # values
-        #
-        positionIdx = df.index.searchsorted(dailyBlockStart, side="right") - 1
-        lastBlockWPosition = df.index[positionIdx]
-
-        # Select only the relevant blocks for today
-        dailyDf = df.loc[lastBlockWPosition:dailyBlockEnd, :].copy(deep=True)
-
-        # Create a new index that includes the daily start/end block if they
-        # are not already included and use that to reindex
-        newIndex = (
-            dailyDf.index
-            .union([dailyBlockStart, dailyBlockEnd])
-            .sort_values()
-        )
-        dailyDf = dailyDf.reindex(newIndex)
-
-        # Fill missing data (dailyBlockStart and dailyBlockEnd with
-        # previous values) and then index into only today's blocks
-        dailyDf = dailyDf.ffill()
-        dailyDf = dailyDf.loc[dailyBlockStart:dailyBlockEnd, :]
-
-        # Compute the difference between each block to "how long that
-        # relative position was held" -- The final block was manually
-        # added so it will only be valid for a single block
-        blockDiff = np.hstack(
-            [
-                np.diff(dailyDf.index.values),
-                np.ones(1)
+        days.append((
+            date, dailyBlockStart, dailyBlockEnd,
+            dailyMultiplier.loc[symbols].to_numpy(dtype=float)
+        ))
+
+    if executor is None:
+        results = []
+        for (date, dailyBlockStart, dailyBlockEnd, multiplier) in days:
+            print(f"Working on {date}")
+            results.append(windowRewards(
+                arrays, dailyBlockStart, dailyBlockEnd, multiplier, rewardPerBlock
+            ))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            arrays.save(directory)
+            futures = [
+                executor.submit(
+                    windowRewardsFromDisk, directory,
+                    dailyBlockStart, dailyBlockEnd, multiplier, rewardPerBlock
+                )
+                for (_, dailyBlockStart, dailyBlockEnd, multiplier) in days
             ]
+            results = [future.result() for future in futures]
+
+    # Sum all of the days' rewards for each LP
+    for ((date, *_), (dailyLps, dailyRewards)) in zip(days, results):
+        print(f"\t{date} Total Rewards: {dailyRewards.sum()}")
+        np.add.at(out, dailyLps, dailyRewards)
+
+    ledgerLps = np.unique(lps)
+
+    return pd.Series(out[ledgerLps], index=ledgerLps)
+
+
+
+def engineRewards(engine, dayStarts, exchangeRates, prices, multipliers, executor=None):
+    """
+    A function that computes the rewards per unit of `rewardPerBlock` of a
+    ledger between a start and an end block with `engine` (see
+    `acx.lprewards.accrueRewards`)
+    """
+    def rewards(ledger, startBlock, endBlock):
+        if engine == "daily":
+            return computeLpRewards(
+                ledger, exchangeRates, prices, dayStarts,
+                startBlock, endBlock, 1.0, executor=executor
+            )
+
+        return accumulatorRewards(
+            ledger, dayWindows(dayStarts, startBlock, endBlock), multipliers, 1.0
         )
 
-        # Create a `nColumns` length array with all of the corresponding
-        # multipliers for each column (i.e repeated multipliers based on
-        # which symbol the column corresponds to)
-        _multiplier = (
-            dailyMultiplier.loc[dailyDf.columns.get_level_values("symbol")]
-            .to_numpy()
+    return rewards
+
+
+def versionRewards(
+        path, dayStarts, startBlock, endBlock, multipliers, rewardsFn, book,
+        directory=None, check=False
+):
+    """
+    Compute the rewards of one version's ledger, resuming from the
+    accrual state saved in `directory` by a previous run
+
+    The state is only resumed from when its start block, pools, ledger
+    history (the hash of its rows through the saved block) and multipliers
+    are unchanged -- Otherwise every day is recomputed. Only the ledger
+    rows after the saved block are read in full when resuming
+
+    Parameters
+    ----------
+    path : str
+        The ledger file (see `acx.ledger.writeLedger`)
+    dayStarts : DataFrame
+        The first `block` of each `date` on mainnet (see
+        `BlockStore.dayStarts`)
+    startBlock : int
+        The block to start tracking rewards at
+    endBlock : int
+        The block to stop tracking rewards at
+    multipliers : DataFrame
+        The multiplier of each pool on each day (see
+        `acx.lprewards.dailyMultipliers`)
+    rewardsFn : callable
+        See `engineRewards`
+    book : AddressBook
+        Used to save/load the state's LPs
+    directory : str, optional
+        Where the accrual state is saved (it isn't saved by default)
+    check : bool
+        Also recompute every day and raise a ValueError if the result
+        differs from the resumed one
+
+    Returns
+    -------
+    rewards : Series
+        The rewards per unit of `rewardPerBlock` of each LP (indexed by
+        address id)
+    """
+    # The ledger's history is checked against the hash of its rows so
+    # every column but the balance is read
+    index = readLedger(path, columns=["symbol", "lp", "block", "amount"])
+    symbols = list(index["symbol"].cat.categories.astype(str))
+    historyHash = lambda block: ledgerHash(index, block, book)
+
+    state = None
+    if directory is not None:
+        try:
+            state = AccrualState.load(directory, book)
+        except KeyError as e:
+            print(f"\tRecomputing every day -- {e}")
+    if state is not None:
+        reason = state.staleReason(
+            startBlock, endBlock, symbols, multipliers, historyHash(state.block)
         )
+        if reason is not None:
+            print(f"\tRecomputing every day -- {reason}")
+            state = None
+
+    ledger = readLedger(path) if (state is None) or check else None
+    if state is None:
+        state, rows = AccrualState.fresh(ledger, startBlock, book), ledger
+    else:
+        print(f"\tResuming from block {state.block}")
+        rows = readLedger(path, filters=[("block", ">", state.block)])
+
+    state, rewards = accrueRewards(
+        state, rows, dayStarts, endBlock, multipliers, historyHash, rewardsFn
+    )
 
-        # Multiply positions by the multiplier
-        # (i.e. exchange rate * price * bonus)
-        dailyDf = dailyDf.multiply(_multiplier, axis="columns")
-
-        # Get usd totals for each block and convert the positions into
-        # a pro rata amount
-        usdTotals = dailyDf.sum(axis=1)
-        proRata = dailyDf.divide(usdTotals, axis=0)
-
-        # Compute daily rewards
-        dailyRewards = (
-            # Number of rewards for each row is the number of rewards per
-            # block by the number of blocks that position was good for
-            proRata.multiply(blockDiff * rewardPerBlock, axis="rows")
-            # Convert fraction of pool -> rewards
-            # blocks x (symbol, address)
-            # Sum all rewards for each column
-            # (symbol, address) x 1
-            .sum(axis=0)
-            # Move symbol to columns
-            # address x symbol
-            .unstack(level="symbol")
-            # Sum all of the rewards for each LP
-            # address x 1
-            .sum(axis=1)
+    if check:
+        _, expected = accrueRewards(
+            AccrualState.fresh(ledger, startBlock, book), ledger, dayStarts,
+            endBlock, multipliers, historyHash, rewardsFn
         )
-        print(f"\tTotal Rewards: {dailyRewards.sum()}")
-        out += dailyRewards
+        allLps = rewards.index.union(expected.index)
+        a = rewards.reindex(allLps, fill_value=0.0).to_numpy()
+        b = expected.reindex(allLps, fill_value=0.0).to_numpy()
+        if not np.allclose(a, b, rtol=1e-9, atol=1e-9):
+            raise ValueError(
+                f"Resumed rewards of {path} differ from a full recompute for "
+                f"{(~np.isclose(a, b, rtol=1e-9, atol=1e-9)).sum()} LPs "
+                f"(largest difference {np.abs(a - b).max()})"
+            )
+        print(f"\tResumed rewards match a full recompute ({len(allLps)} LPs)")
 
-    return out
+    if directory is not None:
+        state.save(directory, book)
 
+    return rewards
 
 
 if __name__ == "__main__":
@@ -182,6 +280,10 @@ if __name__ == "__main__":
     # Load parameters
     #
     params = parse_config("parameters.yaml")
+    startStage("lp_rewards", params["manifest"])
+
+    # The first block of each day on mainnet
+    dayStarts = BlockStore(params["block_store"]).dayStarts(1)
 
     # Block start and end information
     v1StartBlock = params["lp"]["v1_start_block"]
@@ -194,57 +296,101 @@ if __name__ == "__main__":
     totalRewards = params["lp"]["parameters"]["total_rewards"]
     rewardPerBlock = totalRewards / nBlocks
 
+    # Both engines give the same rewards -- `daily` is the day-by-day
+    # reference and `accumulator` only does work at the ledger's change
+    # points and day boundaries
+    engine = params["lp"]["rewards_engine"]
+    assert(engine in ["accumulator", "daily"])
+
     #
     # Load data
     #
 
     # Load prices data
     prices = (
-        pd.read_json("raw/prices.json", orient="records")
+        readJson("raw/prices.json", orient="records")
         .set_index(["date", "symbol"])
     )
 
-    # Load all positions an LP had at each relevant block
-    v1LpPositions = pd.read_parquet("intermediate/v1CumulativeLp.parquet")
-    v2LpPositions = pd.read_parquet("intermediate/v2CumulativeLp.parquet")
-    for lpDf in [v1LpPositions, v2LpPositions]:
-        lpDf.columns = lpDf.columns.set_names(["symbol", "lp"])
+    # LPs are address ids until the output is written
+    book = AddressBook.load("intermediate/addresses.parquet")
 
     # Create a list of all LPs - The LPs should all be in both datasets
     # but, if not, this makes sure that they are included
-    lps = list(
-        set(v1LpPositions.columns.get_level_values("lp").unique())
-        .union(v2LpPositions.columns.get_level_values("lp").unique())
-    )
+    ledgerPaths = {
+        "v1": "intermediate/v1CumulativeLp.parquet",
+        "v2": "intermediate/v2CumulativeLp.parquet",
+    }
+    lps = np.union1d(*[
+        readLedger(path, columns=["lp"])["lp"].unique()
+        for path in ledgerPaths.values()
+    ])
 
     # Allocate space to save/update results
     addressRewards = pd.Series(np.zeros_like(lps, dtype=float), index=lps)
 
     # Separate v1 and v2 rewards
-    for version in ["v1", "v2"]:
-        print(f"Working on {version}")
-        # Depending on version get different subset of data
-        if version == "v1":
-            startBlock = v1StartBlock
-            endBlock = v1EndBlock
-            df = v1LpPositions.sort_index()
-            exchangeRates = pd.read_json("raw/v1ExchangeRates.json", orient="records")
-        else:
-            startBlock = v2StartBlock
-            endBlock = v2EndBlock
-            df = v2LpPositions.sort_index()
-            exchangeRates = pd.read_json("raw/v2ExchangeRates.json", orient="records")
-
-        # Compute total rewards for each version using the function defined
-        # above
-        out = computeLpRewards(
-            df, exchangeRates, prices,
-            startBlock, endBlock, rewardPerBlock
+    blocks = {
+        "v1": (v1StartBlock, v1EndBlock),
+        "v2": (v2StartBlock, v2EndBlock),
+    }
+    exchangeRates = {}
+    for version in blocks.keys():
+        exchangeRates[version] = readJson(
+            f"raw/{version}ExchangeRates.json", orient="records"
         )
-        addressRewards = addressRewards + out
+
+    # Rewards accrued through the last complete day are saved so that a
+    # later run only computes the new days
+    stateDirectory = params["lp"]["state"]["directory"]
+    check = params["lp"]["state"]["check"]
+
+    # The daily engine spreads its days over `n_workers` processes that
+    # are shared by v1 and v2
+    nWorkers = params["lp"]["n_workers"]
+    assert(nWorkers >= 1)
+    executor = (
+        ProcessPoolExecutor(max_workers=nWorkers) if engine == "daily" and nWorkers > 1
+        else None
+    )
+
+    # Compute total rewards for each version using the selected engine
+    jobs = []
+    for (version, (startBlock, endBlock)) in blocks.items():
+        multipliers = dailyMultipliers(exchangeRates[version], prices)
+        job = partial(
+            versionRewards,
+            ledgerPaths[version], dayStarts, startBlock, endBlock, multipliers,
+            engineRewards(
+                engine, dayStarts, exchangeRates[version], prices, multipliers, executor
+            ),
+            book,
+            directory=(
+                None if stateDirectory is None
+                else os.path.join(stateDirectory, version)
+            ),
+            check=check
+        )
+        jobs.append((version, job))
+
+    # v1 and v2 are independent so they are computed at the same time
+    try:
+        results = runJobs(jobs)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for ((version, _), out) in zip(jobs, results):
+        # Rewards were accrued per unit of `rewardPerBlock`, which changes
+        # whenever the end block moves
+        out = out * rewardPerBlock
+        print(f"{version} Total Rewards: {out.sum()}")
+        addressRewards = addressRewards.add(out, fill_value=0.0)
 
     # Round small rewards to 1 ACX
     addressRewardsClipped = addressRewards.clip(lower=1)
 
-    with open("final/lp_rewards.json", "w") as f:
-        json.dump(addressRewardsClipped.to_dict(), f)
+    # LPs are address ids until now
+    addressRewardsClipped = book.toAddressIndex(addressRewardsClipped)
+
+    dumpJson(addressRewardsClipped.to_dict(), "final/lp_rewards.json")
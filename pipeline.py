@@ -0,0 +1,26 @@
+import sys
+
+from pyaml_env import parse_config
+
+from acx.pipeline import STAGES, Pipeline
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    pipelineParams = params["pipeline"]
+
+    # Stages named on the command line (and whatever they depend on) are
+    # brought up to date -- Every stage is by default
+    targets = sys.argv[1:] or None
+
+    pipeline = Pipeline(
+        STAGES, params, pipelineParams["state"], pipelineParams["logs"]
+    )
+    status = pipeline.run(
+        targets, nWorkers=pipelineParams["n_workers"],
+        force=pipelineParams["force"]
+    )
+
+    if any(x in ["failed", "blocked"] for x in status.values()):
+        sys.exit(1)
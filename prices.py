@@ -4,6 +4,7 @@ import pandas as pd
 from pyaml_env import parse_config
 
 from acx.data.tokens import SYMBOL_TO_CGID
+from acx.manifest import startStage, writeJson
 from acx.utils import getWithRetries
 
 
@@ -32,6 +33,7 @@ def getCoinPriceHistory(_id, startDate, endDate):
 if __name__ == "__main__":
     # Load parameters
     params = parse_config("parameters.yaml")
+    startStage("prices", params["manifest"])
 
     # Tokens that we want data for
     tokens = params["misc"]["price"]["tokens"]
@@ -58,4 +60,4 @@ if __name__ == "__main__":
         dfs.append(prices.loc[:, ["date", "symbol", "price"]])
 
     priceDf = pd.concat(dfs, axis=0)
-    priceDf.to_json("raw/prices.json", orient="records")
+    writeJson(priceDf, "raw/prices.json", orient="records")
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from pyaml_env import parse_config
+
+from acx.manifest import readManifest
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+
+    # Only report the most recent run -- Stages run outside of `make` have
+    # no run so they are grouped by themselves
+    entries = readManifest(params["manifest"])
+    run = entries[-1]["run"]
+    entries = [x for x in entries if x["run"] == run]
+
+    stages = pd.DataFrame(
+        [
+            {
+                "stage": x["stage"],
+                "status": x["status"],
+                "wall": x["wall"],
+                "cpu": x["cpu"],
+                "peakRssMb": x["peakRssMb"],
+                "childPeakRssMb": x.get("childPeakRssMb"),
+                "rowsRead": sum(x["rowsRead"].values()),
+                "rowsWritten": sum(x["rowsWritten"].values()),
+                "bytesWritten": sum(
+                    a["bytes"] for a in x["artifacts"].values() if a["written"]
+                ),
+                "httpRequests": sum(r["http"] for r in x["requests"].values()),
+                "rpcCalls": sum(r["rpc"] for r in x["requests"].values()),
+            }
+            for x in entries
+        ]
+    )
+    stages["share"] = stages["wall"] / stages["wall"].sum()
+
+    print(f"Run {run}")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(stages.sort_values("wall", ascending=False).to_string(index=False))
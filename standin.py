@@ -0,0 +1,28 @@
+from pyaml_env import parse_config
+
+from acx.replay import createStandIn
+
+
+if __name__ == "__main__":
+    # Load parameters
+    params = parse_config("parameters.yaml")
+    replayParams = params["replay"]
+
+    # Serve the recorded responses until interrupted
+    server = createStandIn(
+        replayParams["cassette"],
+        host=replayParams["host"],
+        port=replayParams["port"],
+        latency=replayParams["latency"],
+        maxResults=replayParams["max_results"],
+        errorRate=replayParams["error_rate"],
+    )
+    print(f"Serving {replayParams['cassette']} at {server.url}")
+    print(f"Run stages with ACX_STANDIN={server.url} to use it")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,69 @@
+from web3.providers.base import BaseProvider
+
+
+class LogProvider(BaseProvider):
+    """
+    A provider that answers `eth_getLogs` from a list of raw logs the way
+    a node would (address, topics and block range filters)
+
+    Parameters
+    ----------
+    logs : list(dict)
+        Raw logs (hex strings) in block/logIndex order
+    chainId : int
+        Returned by `eth_chainId`
+    maxResults : int, optional
+        Requests that match more logs than this fail like Infura's do
+    finalized : int, optional
+        The `finalized` block (the last log's block by default)
+    """
+    def __init__(self, logs, chainId=1, maxResults=None, finalized=None):
+        self.logs = logs
+        self.chainId = chainId
+        self.maxResults = maxResults
+        self.finalized = finalized
+        if (finalized is None) and (len(logs) > 0):
+            self.finalized = int(logs[-1]["blockNumber"], 16)
+        self.requests = []
+
+    def _matches(self, log, logFilter):
+        block = int(log["blockNumber"], 16)
+        if not (int(logFilter["fromBlock"], 16) <= block <= int(logFilter["toBlock"], 16)):
+            return False
+
+        addresses = logFilter.get("address")
+        if addresses is not None:
+            if not isinstance(addresses, list):
+                addresses = [addresses]
+            if log["address"].lower() not in [x.lower() for x in addresses]:
+                return False
+
+        for (i, wanted) in enumerate(logFilter.get("topics") or []):
+            if wanted is None:
+                continue
+            if not isinstance(wanted, list):
+                wanted = [wanted]
+            if (i >= len(log["topics"])) or (log["topics"][i] not in [x.lower() for x in wanted]):
+                return False
+
+        return True
+
+    def make_request(self, method, params):
+        self.requests.append((method, params))
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.chainId)}
+        if method == "eth_getBlockByNumber":
+            return {"jsonrpc": "2.0", "id": 0, "result": {"number": hex(self.finalized)}}
+        if method == "eth_getLogs":
+            out = [x for x in self.logs if self._matches(x, params[0])]
+            if (self.maxResults is not None) and (len(out) > self.maxResults):
+                return {
+                    "jsonrpc": "2.0", "id": 0,
+                    "error": {"code": -32005, "message": "query returned more than 10000 results"}
+                }
+            return {"jsonrpc": "2.0", "id": 0, "result": out}
+
+        raise NotImplementedError(method)
+
+    def isConnected(self):
+        return True
@@ -0,0 +1,46 @@
+import random
+
+import acx.blocktime
+
+from acx.blocktime import BlockTimestamps
+
+
+class FakeChain:
+    "Answers header requests for a chain with uneven block times"
+    def __init__(self, nBlocks, seed=0):
+        rng = random.Random(seed)
+        self.timestamps = [1_600_000_000]
+        for _ in range(nBlocks - 1):
+            self.timestamps.append(self.timestamps[-1] + rng.choice([0, 1, 12, 13, 30]))
+        self.requested = []
+
+    def batchRequest(self, w3, rpcRequests, nWorkers=1):
+        blocks = [int(params[0], 16) for (_, params) in rpcRequests]
+        self.requested.extend(blocks)
+        return [{"timestamp": hex(self.timestamps[b])} for b in blocks]
+
+
+def test_headers_are_exact_and_cached(tmp_path, monkeypatch):
+    chain = FakeChain(10_000)
+    monkeypatch.setattr(acx.blocktime, "batchRequest", chain.batchRequest)
+    rng = random.Random(1)
+
+    headers = BlockTimestamps(None, str(tmp_path / "1.json"))
+    for _ in range(3):
+        blocks = [rng.randrange(10_000) for _ in range(500)]
+        assert headers.get(blocks) == [chain.timestamps[b] for b in blocks]
+    assert len(chain.requested) == len(set(chain.requested))
+    assert headers.blocks == sorted(set(chain.requested))
+
+    # Saved headers are never requested again
+    headers.save()
+    chain.requested = []
+    loaded = BlockTimestamps(None, str(tmp_path / "1.json"))
+    assert loaded.get(headers.blocks) == headers.timestamps
+    assert chain.requested == []
+
+    timestamps = [chain.timestamps[0] + 100*i for i in range(50)]
+    expected = [
+        next(b for (b, t) in enumerate(chain.timestamps) if t >= ts) for ts in timestamps
+    ]
+    assert loaded.findBlocksAfterTs(timestamps, 0, 9_999) == expected
@@ -0,0 +1,141 @@
+import json
+import os
+import random
+
+import pytest
+
+from web3 import Web3
+
+from acx.abis import getEventABI
+from acx.cache import EventCache, mergeRanges, missingRanges
+from acx.decode import EventDecoder
+from acx.utils import findEvents
+
+from fakes import LogProvider
+from test_decode import randomLog
+
+
+KEY = "1/0xpool/0xtopic"
+
+
+def events(blocks):
+    return [{"blockNumber": b, "logIndex": 0} for b in blocks]
+
+
+def test_ranges():
+    assert mergeRanges([(5, 9), (1, 3), (4, 4), (20, 30), (25, 26)]) == [(1, 9), (20, 30)]
+    assert missingRanges([(10, 19), (30, 39)], 0, 50) == [(0, 9), (20, 29), (40, 50)]
+    assert missingRanges([(0, 100)], 10, 20) == []
+
+
+def test_only_recorded_files_are_used(tmp_path):
+    cache = EventCache(str(tmp_path))
+    cache.store(KEY, 0, 99, events([5, 50]))
+
+    # A file written by a run that crashed before recording it
+    with open(os.path.join(tmp_path, KEY, "100-199.json"), "w") as f:
+        json.dump(events([150]), f)
+
+    assert cache.completedRanges(KEY) == [(0, 99)]
+    assert cache.missingRanges(KEY, 0, 299) == [(100, 299)]
+    assert [x["blockNumber"] for x in cache.load(KEY, 0, 299)] == [5, 50]
+
+    # A rerun with different boundaries downloads the gap again
+    cache.store(KEY, 100, 249, events([150, 220]))
+    cache.store(KEY, 250, 299, events([]))
+    assert cache.completedRanges(KEY) == [(0, 299)]
+    assert [x["blockNumber"] for x in cache.load(KEY, 0, 299)] == [5, 50, 150, 220]
+
+
+def test_index_is_appended_and_reads_legacy_lists(tmp_path):
+    # A cache written before the index was append only
+    os.makedirs(os.path.join(tmp_path, KEY))
+    for (bs, be) in [(0, 99), (100, 199)]:
+        with open(os.path.join(tmp_path, KEY, f"{bs}-{be}.json"), "w") as f:
+            json.dump(events([bs + 1]), f)
+    with open(os.path.join(tmp_path, KEY, "ranges.json"), "w") as f:
+        json.dump([[0, 99], [100, 199]], f)
+
+    cache = EventCache(str(tmp_path))
+    cache.store(KEY, 300, 399, events([350]))
+    cache.store(KEY, 200, 299, events([250]))
+    cache.store(KEY, 200, 299, events([250]))
+    with open(os.path.join(tmp_path, KEY, "ranges.ndjson"), "a") as f:
+        f.write("[400, 4")
+
+    with open(os.path.join(tmp_path, KEY, "ranges.ndjson")) as f:
+        assert f.read().splitlines() == ["[300, 399]", "[200, 299]", "[400, 4"]
+    assert not any(x.endswith(".tmp") for x in os.listdir(os.path.join(tmp_path, KEY)))
+
+    # Another process sees everything that was recorded
+    other = EventCache(str(tmp_path))
+    assert other.storedChunks(KEY) == [(0, 99), (100, 199), (200, 299), (300, 399)]
+    assert [x["blockNumber"] for x in other.load(KEY, 0, 399)] == [1, 101, 250, 350]
+
+
+def test_overlapping_ranges_are_deduplicated(tmp_path):
+    cache = EventCache(str(tmp_path))
+    cache.store(KEY, 0, 99, events([10, 90]))
+    cache.store(KEY, 50, 149, events([90, 120]))
+    cache.store(KEY, 60, 80, events([]))
+
+    chunks = cache.chunkFiles(KEY, 0, 149)
+    assert [(bs, be) for (bs, be, _) in chunks] == [(0, 99), (100, 149)]
+    assert [x["blockNumber"] for x in cache.load(KEY, 0, 149)] == [10, 90, 120]
+    assert [x["blockNumber"] for x in cache.load(KEY, 95, 130)] == [120]
+
+
+def test_unfinalized_blocks_are_not_recorded(tmp_path):
+    cache = EventCache(str(tmp_path))
+    cache.store(KEY, 0, 99, events([10, 90]), finalizedBlock=80)
+    cache.store(KEY, 100, 199, events([150]), finalizedBlock=80)
+
+    assert cache.completedRanges(KEY) == [(0, 80)]
+    assert [x["blockNumber"] for x in cache.load(KEY, 0, 199)] == [10]
+
+
+@pytest.mark.parametrize("nWorkers,adaptive", [(1, False), (3, True)])
+def test_cached_runs_match_uncached_runs(tmp_path, nWorkers, adaptive):
+    rng = random.Random(1)
+    eventAbi = getEventABI("BridgePool", "DepositRelayed")
+    decoder = EventDecoder(eventAbi)
+    address = "0x43f133FE6fDFA17c417695c476447dc2a449Ba5B"
+
+    logs = []
+    for block in sorted(rng.sample(range(1, 20_000), 500)):
+        log = randomLog(rng, eventAbi, decoder, 0)
+        log["address"] = address.lower()
+        log["blockNumber"] = hex(block)
+        logs.append(log)
+
+    def find(provider, cache, start, end):
+        w3 = Web3(provider)
+        pool = w3.eth.contract(address=address, abi=[eventAbi])
+        return findEvents(
+            w3, pool.events.DepositRelayed, start, end, 700, None,
+            nWorkers=nWorkers, adaptive=adaptive, cache=cache
+        )
+
+    expected = find(LogProvider(logs), None, 1, 19_999)
+    assert len(expected) == 500
+
+    # Blocks after 15,000 aren't final yet on the first run
+    cache = EventCache(str(tmp_path))
+    first = find(LogProvider(logs, maxResults=40, finalized=15_000), cache, 1, 12_000)
+    assert first == [x for x in expected if x["blockNumber"] <= 12_000]
+
+    provider = LogProvider(logs, maxResults=40, finalized=15_000)
+    second = find(provider, cache, 1, 19_999)
+    assert second == expected
+    assert cache.completedRanges(cache.key(1, address, decoder.topic)) == [(1, 15_000)]
+
+    # Only the blocks that weren't cached (or weren't final) are requested
+    requested = [p[0] for (m, p) in provider.requests if m == "eth_getLogs"]
+    assert min(int(x["fromBlock"], 16) for x in requested) > 12_000
+
+    # Once every block is final and cached a rerun doesn't request logs
+    find(LogProvider(logs, finalized=19_999), cache, 1, 19_999)
+    provider = LogProvider(logs, finalized=19_999)
+    third = find(provider, cache, 1, 19_999)
+    assert third == expected
+    assert not any(m == "eth_getLogs" for (m, _) in provider.requests)
@@ -0,0 +1,49 @@
+import random
+
+import pyarrow.parquet as pq
+
+import acx.columnar
+
+from acx.abis import getEventABI
+from acx.columnar import EventWriter, readEvents
+
+
+def transfers(rng, n):
+    "Transfers in (block, logIndex) order the way providers return them"
+    events = []
+    for i in range(n):
+        events.append({
+            "args": {
+                "from": "0x" + "11"*20, "to": "0x" + "22"*20,
+                "value": rng.randint(0, 10**30)
+            },
+            "event": "Transfer", "logIndex": i % 7,
+            "transactionIndex": 0, "transactionHash": "0x" + "33"*32,
+            "address": "0x" + "44"*20, "blockHash": "0x" + "55"*32,
+            "blockNumber": 1000 + i // 7,
+        })
+
+    return events
+
+
+def test_streamed_writes_match_sorted_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(acx.columnar, "CONVERT_CHUNK", 50)
+    rng = random.Random(0)
+    events = transfers(rng, 420)
+    eventAbi = getEventABI("ERC20", "Transfer")
+
+    with EventWriter(str(tmp_path / "sorted.parquet"), eventAbi) as writer:
+        writer.write(events)
+
+    # Events are written as each chunk is converted rather than at the end
+    streamed = str(tmp_path / "streamed.parquet")
+    with EventWriter(streamed, eventAbi) as writer:
+        def produce():
+            for (i, event) in enumerate(events):
+                assert(writer.nWritten == 50*(i // 50))
+                yield event
+
+        assert writer.write(produce(), presorted=True) == 420
+
+    assert pq.ParquetFile(streamed).metadata.num_row_groups == 9
+    assert readEvents(streamed).equals(readEvents(str(tmp_path / "sorted.parquet")))
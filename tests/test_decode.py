@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+from eth_abi import encode_abi, encode_single
+from eth_utils import encode_hex, keccak, to_checksum_address
+from hexbytes import HexBytes
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+from acx.abis import ABIs, getABI, getEventABI
+from acx.decode import EventDecoder, _tupleType
+from acx.utils import findEvents, findEventsMulti, toJsonable
+
+from fakes import LogProvider
+
+
+EVENTS = [
+    (contract, x)
+    for contract in ABIs.keys()
+    for x in getABI(contract)
+    if x["type"] == "event"
+]
+
+
+def randomValue(rng, x):
+    "A random value of the ABI input `x` in the layout `eth_abi` encodes"
+    abiType = x["type"]
+    if abiType.endswith("]"):
+        element = dict(x, type=abiType[:abiType.rindex("[")])
+        size = abiType[abiType.rindex("[") + 1:-1]
+        n = int(size) if size else rng.randint(0, 3)
+        return [randomValue(rng, element) for _ in range(n)]
+    if abiType == "tuple":
+        return tuple(randomValue(rng, c) for c in x["components"])
+    if abiType == "address":
+        return to_checksum_address(rng.getrandbits(160).to_bytes(20, "big"))
+    if abiType == "bool":
+        return rng.random() < 0.5
+    if abiType.startswith("uint"):
+        return rng.getrandbits(int(abiType[4:] or 256))
+    if abiType.startswith("int"):
+        bits = int(abiType[3:] or 256)
+        return rng.getrandbits(bits) - 2**(bits - 1)
+    if abiType == "bytes":
+        return rng.getrandbits(8*40).to_bytes(40, "big")[:rng.randint(0, 40)]
+    if abiType == "string":
+        return "".join(rng.choice("abcdef") for _ in range(rng.randint(0, 10)))
+    if abiType.startswith("bytes"):
+        size = int(abiType[5:])
+        return rng.getrandbits(8*size).to_bytes(size, "big")
+
+    raise ValueError(abiType)
+
+
+def randomLog(rng, eventAbi, decoder, logIndex):
+    "A raw `eth_getLogs` entry of `eventAbi` with random arguments"
+    topics = [decoder.topic]
+    for x in eventAbi["inputs"]:
+        if not x["indexed"]:
+            continue
+        value = randomValue(rng, x)
+        if x["type"] in ["bytes", "string"] or x["type"].endswith("]") or x["type"] == "tuple":
+            # Dynamic indexed values are replaced by their hash
+            topics.append(encode_hex(keccak(rng.getrandbits(64).to_bytes(8, "big"))))
+        else:
+            topics.append(encode_hex(encode_single(x["type"], value)))
+
+    dataInputs = [x for x in eventAbi["inputs"] if not x["indexed"]]
+    data = encode_abi(
+        [_tupleType(x) for x in dataInputs],
+        [randomValue(rng, x) for x in dataInputs]
+    )
+
+    return {
+        "address": encode_hex(rng.getrandbits(160).to_bytes(20, "big")),
+        "topics": topics,
+        "data": encode_hex(data),
+        "blockNumber": hex(rng.randint(1, 10**8)),
+        "logIndex": hex(logIndex),
+        "transactionIndex": hex(rng.randint(0, 300)),
+        "transactionHash": encode_hex(rng.getrandbits(256).to_bytes(32, "big")),
+        "blockHash": encode_hex(rng.getrandbits(256).to_bytes(32, "big")),
+    }
+
+
+def web3Event(eventAbi, log):
+    "Decode a raw log the way `web3` does for `acx.utils.findEvents`"
+    # `web3`'s result formatters checksum the log's address
+    entry = dict(
+        log,
+        address=to_checksum_address(log["address"]),
+        topics=[HexBytes(x) for x in log["topics"]],
+        blockNumber=int(log["blockNumber"], 16),
+        logIndex=int(log["logIndex"], 16),
+        transactionIndex=int(log["transactionIndex"], 16),
+        transactionHash=HexBytes(log["transactionHash"]),
+        blockHash=HexBytes(log["blockHash"]),
+    )
+
+    return toJsonable(get_event_data(Web3().codec, eventAbi, entry))
+
+
+@pytest.mark.parametrize(
+    "contract,eventAbi", EVENTS, ids=[f"{c}.{x['name']}" for (c, x) in EVENTS]
+)
+def test_decode_matches_web3(contract, eventAbi):
+    rng = random.Random(f"{contract}.{eventAbi['name']}")
+    decoder = EventDecoder(eventAbi)
+    logs = [randomLog(rng, eventAbi, decoder, i) for i in range(8)]
+
+    decoded = decoder.toEvents(decoder.decode(logs))
+    expected = [web3Event(eventAbi, log) for log in logs]
+
+    # Exactly equal so that cached events don't depend on the decoder
+    assert decoded == expected
+
+
+def test_fetched_events_match_web3():
+    rng = random.Random(0)
+    pool = getEventABI("BridgePool", "DepositRelayed")
+    hub = getEventABI("HubPool", "RootBundleExecuted")
+
+    # Two contracts emitting two events (and one event that isn't asked
+    # for) spread over a few thousand blocks
+    addresses = [
+        to_checksum_address(rng.getrandbits(160).to_bytes(20, "big"))
+        for _ in range(2)
+    ]
+    logs = []
+    for block in sorted(rng.sample(range(1, 5_000), 300)):
+        eventAbi = rng.choice([pool, hub, getEventABI("ERC20", "Transfer")])
+        log = randomLog(rng, eventAbi, EventDecoder(eventAbi), 0)
+        log["address"] = rng.choice(addresses).lower()
+        log["blockNumber"] = hex(block)
+        logs.append(log)
+
+    abis = {"DepositRelayed": pool, "RootBundleExecuted": hub}
+    w3 = Web3(LogProvider(logs, maxResults=20))
+    contracts = [
+        w3.eth.contract(address=address, abi=[pool, hub]) for address in addresses
+    ]
+
+    # One event of one contract -- Ranges with too many logs are split
+    found = findEvents(
+        w3, contracts[0].events.RootBundleExecuted, 1, 5_000, 1_000, None,
+        nWorkers=2
+    )
+    assert found == [
+        web3Event(hub, log) for log in logs
+        if (log["address"] == addresses[0].lower()) and (log["topics"][0] == EventDecoder(hub).topic)
+    ]
+
+    # Every (contract, event) pair with one query per range
+    found = findEventsMulti(
+        w3,
+        [c.events.DepositRelayed for c in contracts] + [c.events.RootBundleExecuted for c in contracts],
+        1, 5_000, 1_000, nWorkers=2
+    )
+    for ((address, name), events) in found.items():
+        topic = EventDecoder(abis[name]).topic
+        assert events == [
+            web3Event(abis[name], log) for log in logs
+            if (log["address"] == address.lower()) and (log["topics"][0] == topic)
+        ]
+    assert sum(len(x) for x in found.values()) > 0
@@ -0,0 +1,188 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from acx.addresses import ZERO_ADDRESS
+from acx.exchangerates import FIXED_POINT, exchangeRates, v1PoolChanges, v2PoolChanges
+
+
+E = FIXED_POINT
+LP_FEE_RATE = 1_500_000_000_000
+SECONDS_PER_BLOCK = 12
+L1_TOKEN = "0x" + "aa"*20
+
+
+def timestamp(block):
+    return SECONDS_PER_BLOCK * int(block)
+
+
+class ContractPool:
+    """
+    The reserves of a BridgePool/HubPool token the way the contracts keep
+    them -- Liquid and utilized reserves are tracked separately and every
+    deposit is the full amount sent (not the smallest one that mints)
+    """
+    def __init__(self, createdAt):
+        self.liquid = self.utilized = self.undistributed = self.supply = 0
+        self.lastUpdate = createdAt
+
+    def accumulated(self, t):
+        fees = self.undistributed * LP_FEE_RATE * (t - self.lastUpdate) // E
+        return min(fees, self.undistributed)
+
+    def updateFees(self, t):
+        self.undistributed -= self.accumulated(t)
+        self.lastUpdate = t
+
+    def exchangeRateCurrent(self, t, persist=True):
+        if self.supply == 0:
+            return E
+        if persist:
+            self.updateFees(t)
+            undistributed = self.undistributed
+        else:
+            undistributed = self.undistributed - self.accumulated(t)
+
+        return (self.liquid + self.utilized - undistributed) * E // self.supply
+
+
+def simulate(version, seed, nBlocks=300):
+    """
+    Random liquidity, relays/bundles and syncs on a simulated pool along
+    with its events (in the layout of `readEventFrame`) and the rate that
+    an `eth_call` of `exchangeRateCurrent` gives after some of the blocks
+    """
+    rng = random.Random(seed)
+    firstBlock = 1_000
+    pool = ContractPool(timestamp(firstBlock))
+    lps = [f"0x{i:040x}" for i in range(1, 11)]
+    balances = {}
+
+    transfers, relays, settled, bundles = [], [], [], []
+    captures = [{"blockNumber": firstBlock + 500, "logIndex": 0, "newProtocolFeeCapturePct": 10**17}]
+    pending = []
+    samples = {}
+
+    blocks = sorted(rng.sample(range(firstBlock + 1, firstBlock + 5_000), nBlocks))
+    for block in blocks:
+        t = timestamp(block)
+        logIndex = 1
+        # Fees right after the first deposit are paid out from when the
+        # pool was created
+        r = 0.99 if block == blocks[1] else rng.random()
+
+        # v1 relays are settled a while after they are relayed
+        for x in [x for x in pending if x[0] <= block]:
+            pending.remove(x)
+            (_, depositHash, amount, pct) = x
+            pool.updateFees(t)
+            fee = pct * amount // E
+            pool.undistributed += fee
+            pool.utilized += fee
+            settled.append({
+                "blockNumber": block, "logIndex": logIndex, "depositHash": depositHash,
+                "relay.realizedLpFeePct": pct, "symbol": "USDC",
+            })
+            logIndex += 1
+
+        def transfer(src, dest, value):
+            transfers.append({
+                "blockNumber": block, "logIndex": logIndex, "from": src, "to": dest,
+                "value": value, "symbol": "USDC",
+            })
+
+        if (r < 0.3) or (pool.supply == 0):
+            amount = rng.randint(1, 1_000) * 10**rng.randint(15, 18) + rng.randint(0, 10**6)
+            minted = amount * E // pool.exchangeRateCurrent(t)
+            pool.liquid += amount
+            pool.supply += minted
+            lp = rng.choice(lps)
+            balances[lp] = balances.get(lp, 0) + minted
+            transfer(ZERO_ADDRESS, lp, minted)
+        elif r < 0.45:
+            lp = rng.choice([k for (k, v) in balances.items() if v > 0])
+            burnt = balances[lp] // rng.choice([1, 2, 3])
+            # Withdrawals that would need utilized reserves revert
+            if burnt * pool.exchangeRateCurrent(t, persist=False) // E > pool.liquid:
+                continue
+            returned = burnt * pool.exchangeRateCurrent(t) // E
+            pool.liquid -= returned
+            pool.supply -= burnt
+            balances[lp] -= burnt
+            transfer(lp, ZERO_ADDRESS, burnt)
+        elif r < 0.5:
+            # Moving LP tokens between LPs doesn't change the pool
+            lp = rng.choice([k for (k, v) in balances.items() if v > 0])
+            transfer(lp, rng.choice(lps), balances[lp] // 2)
+        elif r < 0.6:
+            # Tokens come back from L2 and a sync makes them liquid
+            back = pool.utilized // 2
+            pool.liquid += back
+            pool.utilized -= back
+        else:
+            amount = rng.randint(1, 50) * 10**rng.randint(12, 18)
+            pct = rng.randint(10**14, 3*10**15)
+            if version == "v1":
+                depositHash = f"0x{rng.getrandbits(256):064x}"
+                sent = min(amount, pool.liquid)
+                pool.liquid -= sent
+                pool.utilized += sent
+                relays.append({"depositHash": depositHash, "depositData.amount": amount})
+                pending.append((block + rng.randint(100, 2_000), depositHash, amount, pct))
+            else:
+                # Bundles allocate fees without paying out accumulated ones
+                fee = pct * amount // E
+                capture = captures[0]["newProtocolFeeCapturePct"] if captures[0]["blockNumber"] < block else 0
+                allocated = fee - fee * capture // E
+                pool.undistributed += allocated
+                pool.utilized += allocated
+                bundles.append({
+                    "blockNumber": block, "logIndex": logIndex,
+                    "l1Tokens": [L1_TOKEN, "0x" + "99"*20], "bundleLpFees": [fee, 12_345],
+                })
+
+        if rng.random() < 0.3:
+            samples[block] = pool.exchangeRateCurrent(t, persist=False)
+
+    # Later blocks see the fees that keep accumulating without any change
+    for block in rng.sample(range(blocks[-1] + 1, blocks[-1] + 10_000), 20):
+        samples[block] = pool.exchangeRateCurrent(timestamp(block), persist=False)
+
+    if version == "v1":
+        changes = v1PoolChanges(
+            pd.DataFrame(transfers),
+            pd.DataFrame(settled, columns=[
+                "blockNumber", "logIndex", "depositHash", "relay.realizedLpFeePct", "symbol"
+            ]),
+            pd.DataFrame(relays, columns=["depositHash", "depositData.amount"])
+        )
+    else:
+        changes = v2PoolChanges(
+            pd.DataFrame(transfers),
+            pd.DataFrame(bundles, columns=["blockNumber", "logIndex", "l1Tokens", "bundleLpFees"]),
+            pd.DataFrame(captures), {"USDC": L1_TOKEN}
+        )
+    changes["timestamp"] = [timestamp(x) for x in changes["block"]]
+
+    return changes, timestamp(firstBlock), samples
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_rates_match_simulated_pool(version, seed):
+    changes, createdAt, samples = simulate(version, seed)
+    assert((changes["kind"] == ("settle" if version == "v1" else "bundle")).any())
+
+    blocks = np.array(sorted(samples.keys()), dtype=np.int64)
+    expected = np.array([samples[b] for b in blocks], dtype=float)
+    rates = exchangeRates(
+        changes, LP_FEE_RATE, createdAt, blocks, [timestamp(b) for b in blocks]
+    )
+    rates = np.array(rates, dtype=float)
+
+    # Fees push the rate above 1:1 and deposits (which are rebuilt as the
+    # smallest amount that mints the same tokens) only leave rounding
+    assert(expected.max() > E)
+    assert(np.allclose(rates, expected, rtol=1e-12, atol=0.0))
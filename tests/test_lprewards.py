@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from acx.addresses import AddressBook
+from acx.ledger import buildLedger, ledgerHash
+from acx.lprewards import (
+    AccrualState, accrueRewards, accumulatorRewards, dailyMultipliers, dayWindows
+)
+from acx.synthetic import randomAddresses
+from lp_rewards import computeLpRewards
+
+
+SYMBOLS = ["USDC", "WETH"]
+DAY_BLOCKS = 100
+
+
+@pytest.fixture
+def pool():
+    "A random ledger along with its address book, days, exchange rates and prices"
+    rng = np.random.default_rng(0)
+    book = AddressBook.fromAddresses(randomAddresses(rng, 30))
+    lps = rng.integers(1, len(book), 400)
+    transfers = pd.DataFrame({
+        "block": rng.integers(0, 1_000, 400),
+        "lp": lps,
+        "symbol": rng.choice(SYMBOLS, 400),
+        "amount": rng.lognormal(0.0, 1.0, 400),
+    })
+    # A few of the transfers are small withdrawals
+    transfers.loc[rng.random(400) < 0.2, "amount"] *= -0.01
+    ledger = buildLedger(transfers, SYMBOLS)
+
+    dates = [f"2022-01-{d:02}" for d in range(1, 12)]
+    dayStarts = pd.DataFrame({
+        "date": dates, "block": np.arange(len(dates)) * DAY_BLOCKS
+    })
+    days = pd.MultiIndex.from_product([dates, SYMBOLS], names=["date", "symbol"])
+    prices = pd.DataFrame({"price": rng.uniform(0.5, 2.0, len(days))}, index=days)
+    exchangeRates = days.to_frame(index=False).assign(
+        exchangeRate=rng.uniform(1.0, 1.1, len(days))
+    )
+
+    return book, ledger, dayStarts, exchangeRates, prices
+
+
+def rewardsFn(dayStarts, multipliers):
+    def rewards(ledger, startBlock, endBlock):
+        windows = dayWindows(dayStarts, startBlock, endBlock)
+        return accumulatorRewards(ledger, windows, multipliers, 1.0)
+
+    return rewards
+
+
+def accrue(state, ledger, book, dayStarts, multipliers, endBlock):
+    return accrueRewards(
+        state, ledger, dayStarts, endBlock, multipliers,
+        lambda block: ledgerHash(ledger, block, book),
+        rewardsFn(dayStarts, multipliers)
+    )
+
+
+def test_resume_matches_full_recompute(pool, tmp_path):
+    book, ledger, dayStarts, exchangeRates, prices = pool
+    multipliers = dailyMultipliers(exchangeRates, prices)
+
+    state, _ = accrue(
+        AccrualState.fresh(ledger, 50, book), ledger, book, dayStarts, multipliers, 555
+    )
+    assert(state.block == 499)
+    state.save(tmp_path, book)
+
+    resumed = AccrualState.load(tmp_path, book)
+    assert(resumed.staleReason(
+        50, 950, SYMBOLS, multipliers, ledgerHash(ledger, resumed.block, book)
+    ) is None)
+    rows = ledger.loc[ledger["block"] > resumed.block, :]
+    _, rewards = accrue(resumed, rows, book, dayStarts, multipliers, 950)
+
+    _, expected = accrue(
+        AccrualState.fresh(ledger, 50, book), ledger, book, dayStarts, multipliers, 950
+    )
+    expected = expected.reindex(rewards.index.union(expected.index), fill_value=0.0)
+    rewards = rewards.reindex(expected.index, fill_value=0.0)
+    assert(np.allclose(rewards, expected, rtol=1e-12, atol=0.0))
+
+
+def test_changed_history_is_stale(pool, tmp_path):
+    book, ledger, dayStarts, exchangeRates, prices = pool
+    multipliers = dailyMultipliers(exchangeRates, prices)
+    state, _ = accrue(
+        AccrualState.fresh(ledger, 50, book), ledger, book, dayStarts, multipliers, 555
+    )
+    state.save(tmp_path, book)
+    state = AccrualState.load(tmp_path, book)
+
+    # The same number of rows but one of them moved a different amount
+    changed = ledger.copy()
+    i = changed.index[changed["block"] <= state.block][0]
+    changed.loc[i, "amount"] += 1.0
+    assert((changed["block"] <= state.block).sum() == (ledger["block"] <= state.block).sum())
+    assert(state.staleReason(
+        50, 950, SYMBOLS, multipliers, ledgerHash(changed, state.block, book)
+    ) == "the ledger changed before the saved block")
+
+    # Rows after the saved block don't matter
+    later = ledger.copy()
+    later.loc[later["block"] > state.block, "amount"] += 1.0
+    assert(state.staleReason(
+        50, 950, SYMBOLS, multipliers, ledgerHash(later, state.block, book)
+    ) is None)
+
+
+def test_ledger_hash_ignores_address_ids(pool):
+    book, ledger, *_ = pool
+
+    # A new address shifts every id after it
+    addresses = book.addresses(np.arange(len(book)))
+    bigger = AddressBook.fromAddresses(addresses, ["0x" + "00"*19 + "01"])
+    shifted = ledger.assign(lp=bigger.ids(book.addresses(ledger["lp"])))
+    assert(not (shifted["lp"] == ledger["lp"]).all())
+
+    assert(ledgerHash(shifted, 500, bigger) == ledgerHash(ledger, 500, book))
+    assert(ledgerHash(ledger.iloc[::-1], 500, book) == ledgerHash(ledger, 500, book))
+
+
+@pytest.mark.parametrize("nWorkers", [1, 2])
+def test_accumulator_matches_daily_engine(pool, nWorkers):
+    _, ledger, dayStarts, exchangeRates, prices = pool
+    multipliers = dailyMultipliers(exchangeRates, prices)
+
+    for (startBlock, endBlock) in [(50, 950), (100, 999), (0, 100), (250, 251)]:
+        expected = accumulatorRewards(
+            ledger, dayWindows(dayStarts, startBlock, endBlock), multipliers, 2.5
+        )
+        if nWorkers == 1:
+            rewards = computeLpRewards(
+                ledger, exchangeRates, prices, dayStarts, startBlock, endBlock, 2.5
+            )
+        else:
+            with ProcessPoolExecutor(max_workers=nWorkers) as executor:
+                rewards = computeLpRewards(
+                    ledger, exchangeRates, prices, dayStarts, startBlock, endBlock,
+                    2.5, executor=executor
+                )
+
+        lps = rewards.index.union(expected.index)
+        rewards = rewards.reindex(lps, fill_value=0.0)
+        expected = expected.reindex(lps, fill_value=0.0)
+        assert(np.allclose(rewards, expected, rtol=1e-9, atol=1e-12))
+        assert(rewards.sum() > 0)
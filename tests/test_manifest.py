@@ -0,0 +1,119 @@
+import atexit
+import importlib
+import subprocess
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+import acx.manifest
+
+from acx.addresses import AddressBook
+from acx.abis import getEventABI
+from acx.columnar import readEvents, writeEvents
+from acx.ledger import readLedger, writeLedger
+from acx.manifest import (
+    StageRun, dumpJson, loadJson, readJson, readManifest, readParquet, startStage,
+    writeJson, writeParquet
+)
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    "A stage run that the shared readers/writers report to"
+    run = StageRun("test", str(tmp_path / "manifest.ndjson"))
+    monkeypatch.setattr(acx.manifest, "_CURRENT_RUN", run)
+
+    return run
+
+
+def test_helpers_record_io(run, tmp_path):
+    df = pd.DataFrame({"date": ["2022-01-01"]*3, "symbol": ["USDC"]*3, "price": [1.0]*3})
+
+    dumpJson({"a": 1, "b": 2}, str(tmp_path / "a.json"))
+    dumpJson({"recipients": [1, 2, 3]}, str(tmp_path / "b.json"), rows=3)
+    writeJson(df, str(tmp_path / "c.json"), orient="records")
+    writeParquet(df, str(tmp_path / "d.parquet"))
+    loadJson(str(tmp_path / "a.json"))
+    readJson(str(tmp_path / "c.json"), orient="records")
+    readParquet(str(tmp_path / "d.parquet"), columns=["price"])
+
+    assert(run.rowsWritten == {
+        str(tmp_path / "a.json"): 2, str(tmp_path / "b.json"): 3,
+        str(tmp_path / "c.json"): 3, str(tmp_path / "d.parquet"): 3,
+    })
+    assert(run.rowsRead == {
+        str(tmp_path / "a.json"): 2, str(tmp_path / "c.json"): 3,
+        str(tmp_path / "d.parquet"): 3,
+    })
+
+
+def test_shared_files_record_io(run, tmp_path):
+    book = AddressBook.fromAddresses(["0x" + "11"*20])
+    book.save(str(tmp_path / "addresses.parquet"))
+    AddressBook.load(str(tmp_path / "addresses.parquet"))
+
+    ledger = pd.DataFrame({
+        "symbol": pd.Categorical(["USDC", "USDC"]), "lp": [1, 1],
+        "block": [1, 2], "amount": [1.0, 1.0], "balance": [1.0, 2.0],
+    })
+    writeLedger(str(tmp_path / "ledger.parquet"), ledger)
+    readLedger(str(tmp_path / "ledger.parquet"), filters=[("block", ">", 1)])
+
+    event = {
+        "args": {"from": "0x" + "11"*20, "to": "0x" + "22"*20, "value": 1},
+        "event": "Transfer", "logIndex": 0, "transactionIndex": 0,
+        "transactionHash": "0x" + "33"*32, "address": "0x" + "44"*20,
+        "blockHash": "0x" + "55"*32, "blockNumber": 1,
+    }
+    writeEvents(str(tmp_path / "events.parquet"), getEventABI("ERC20", "Transfer"), [event]*4)
+    readEvents(str(tmp_path / "events.parquet"), columns=["value"])
+
+    assert(run.rowsWritten == {
+        str(tmp_path / "addresses.parquet"): 2, str(tmp_path / "ledger.parquet"): 2,
+        str(tmp_path / "events.parquet"): 4,
+    })
+    assert(run.rowsRead == {
+        str(tmp_path / "addresses.parquet"): 2, str(tmp_path / "ledger.parquet"): 1,
+        str(tmp_path / "events.parquet"): 4,
+    })
+
+
+def test_thread_failures_fail_the_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+    monkeypatch.setattr(acx.manifest, "_CURRENT_RUN", None)
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+
+    run = startStage("test", str(tmp_path / "manifest.ndjson"))
+    worker = threading.Thread(target=lambda: 1/0)
+    worker.start()
+    worker.join()
+
+    registered[0]()
+    (entry,) = readManifest(str(tmp_path / "manifest.ndjson"))
+    assert(run.status == "failed")
+    assert(entry["status"] == "failed")
+
+
+def test_worker_processes_are_measured(tmp_path):
+    run = StageRun("test", str(tmp_path / "manifest.ndjson"))
+    work = "x = bytearray(200 * 2**20)\nfor _ in range(20): sum(range(10**6))"
+    subprocess.run([sys.executable, "-c", work], check=True)
+    run.finish()
+
+    (entry,) = readManifest(str(tmp_path / "manifest.ndjson"))
+    assert(entry["childCpu"] > 0.1)
+    assert(entry["cpu"] >= entry["childCpu"])
+    assert(entry["childPeakRssMb"] > 200)
+
+
+def test_stages_have_no_import_side_effects(tmp_path, monkeypatch):
+    # There is no `parameters.yaml` (or any data) here
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(acx.manifest, "_CURRENT_RUN", None)
+
+    importlib.import_module("combine_rewards")
+    assert(acx.manifest._CURRENT_RUN is None)
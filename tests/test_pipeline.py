@@ -0,0 +1,37 @@
+import os
+
+from acx.pipeline import Pipeline, Stage
+
+
+def write(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_reruns_follow_the_package_and_always(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write("acx/lib.py", "X = 1\n")
+    write("head.py", "open('raw/head.txt', 'w').write('1')\n")
+    write("double.py", "open('raw/double.txt', 'w').write(open('raw/head.txt').read()*2)\n")
+    os.makedirs("raw")
+
+    stages = [
+        Stage("head", outputs=["raw/head.txt"], always=True),
+        Stage("double", inputs=["raw/head.txt"], outputs=["raw/double.txt"]),
+    ]
+
+    def run():
+        return Pipeline(stages, {}, "state.json", "logs").run()
+
+    assert run() == {"head": "ran", "double": "ran"}
+    assert run() == {"head": "ran", "double": "skipped"}
+
+    # Compiled files don't count but library modules do
+    write("acx/__pycache__/lib.cpython-311.pyc", "")
+    assert run() == {"head": "ran", "double": "skipped"}
+    write("acx/lib.py", "X = 2\n")
+    assert run() == {"head": "ran", "double": "ran"}
+    assert run() == {"head": "ran", "double": "skipped"}
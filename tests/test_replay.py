@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from acx.replay import createStandIn
+
+
+TARGET = "rpc/0123456789abcdef"
+POOL = "0x" + "11"*20
+OTHER = "0x" + "22"*20
+TOPIC = "0x" + "aa"*32
+
+
+def log(block, address=POOL):
+    return {
+        "address": address, "topics": [TOPIC], "data": "0x",
+        "blockNumber": hex(block), "logIndex": "0x0", "transactionIndex": "0x0",
+        "transactionHash": "0x" + "33"*32, "blockHash": "0x" + f"{block:064x}",
+    }
+
+
+def getLogs(fromBlock, toBlock, address=POOL, topics=(TOPIC,)):
+    return {
+        "jsonrpc": "2.0", "id": 0, "method": "eth_getLogs",
+        "params": [{
+            "address": address, "topics": list(topics),
+            "fromBlock": hex(fromBlock), "toBlock": hex(toBlock)
+        }]
+    }
+
+
+@pytest.fixture
+def server(tmp_path):
+    # A recording of two requests for the pool's logs with a gap between
+    records = [
+        (getLogs(100, 199), [log(150)]),
+        (getLogs(300, 399, address=[POOL, OTHER]), [log(310), log(320, OTHER)]),
+    ]
+    with open(tmp_path / "1.ndjson", "w") as f:
+        for (call, logs) in records:
+            f.write(json.dumps({
+                "target": TARGET, "method": "POST", "params": [], "body": call,
+                "status": 200, "response": {"jsonrpc": "2.0", "id": 0, "result": logs},
+            }) + "\n")
+
+    server = createStandIn(str(tmp_path))
+    yield server
+    server.server_close()
+
+
+def blocks(response):
+    return [int(x["blockNumber"], 16) for x in response["result"]]
+
+
+def test_recorded_ranges_are_served(server):
+    assert blocks(server.rpcCall(TARGET, getLogs(100, 199))) == [150]
+    assert blocks(server.rpcCall(TARGET, getLogs(120, 180))) == [150]
+    assert blocks(server.rpcCall(TARGET, getLogs(300, 399))) == [310]
+    assert blocks(server.rpcCall(TARGET, getLogs(300, 399, address=OTHER))) == [320]
+
+
+def test_unrecorded_ranges_are_errors(server):
+    for call in [
+        getLogs(100, 300), getLogs(200, 299), getLogs(0, 99),
+        getLogs(120, 180, address=OTHER),
+        getLogs(120, 180, topics=()),
+    ]:
+        response = server.rpcCall(TARGET, call)
+        assert "result" not in response
+        assert response["error"]["code"] == -32000
+
+    response = server.rpcCall(TARGET, getLogs(150, 350))
+    assert response["error"]["message"] == "eth_getLogs was not recorded for blocks 200 to 299"
+    assert "result" not in server.rpcCall("rpc/other", getLogs(100, 199))
@@ -0,0 +1,285 @@
+import pytest
+import requests
+import web3
+
+from eth_abi import decode_abi, encode_abi, encode_single
+
+import acx.rpc
+
+from acx.abis import getABI
+from acx.rpc import aggregateCalls, batchRequest
+
+
+class FakeResponse:
+    def __init__(self, body, status=200):
+        self.body = body
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """
+    Answers every request with twice its first param and misbehaves
+    the way nodes do
+
+    Parameters
+    ----------
+    maxBatch : int
+        Larger batches are rejected with a single error object
+    flaky : dict(int, int)
+        The number of times each param is answered with a (non revert)
+        error before it succeeds
+    dropped : dict(int, int)
+        The number of times each param is left out of the response
+    reverts : set(int)
+        Params that always revert
+    throttled : list(str)
+        How each of the first few batches is throttled -- "error" answers
+        with a single rate limit error object and "http" gives up on a 429
+        the way the session does
+    """
+    def __init__(
+            self, maxBatch=100, flaky=None, dropped=None, reverts=(), throttled=()
+        ):
+        self.maxBatch = maxBatch
+        self.flaky = dict(flaky or {})
+        self.dropped = dict(dropped or {})
+        self.reverts = set(reverts)
+        self.throttled = list(throttled)
+        self.batches = []
+
+    def post(self, endpoint, json, timeout):
+        self.batches.append([x["params"][0] for x in json])
+        if len(self.throttled) > 0:
+            if self.throttled.pop(0) == "http":
+                raise requests.exceptions.RetryError("too many 429 error responses")
+            return FakeResponse({
+                "jsonrpc": "2.0", "id": None,
+                "error": {"code": -32005, "message": "daily request count exceeded"}
+            })
+        if len(json) > self.maxBatch:
+            return FakeResponse({
+                "jsonrpc": "2.0", "id": None,
+                "error": {"code": -32600, "message": "batch too large"}
+            })
+
+        out = []
+        for call in json:
+            x = call["params"][0]
+            if self.dropped.get(x, 0) > 0:
+                self.dropped[x] -= 1
+                continue
+            response = {"jsonrpc": "2.0", "id": call["id"]}
+            if x in self.reverts:
+                response["error"] = {"code": 3, "message": "execution reverted"}
+            elif self.flaky.get(x, 0) > 0:
+                self.flaky[x] -= 1
+                response["error"] = {"code": -32000, "message": "header not found"}
+            else:
+                response["result"] = 2*x
+            out.append(response)
+
+        # Responses may come back in any order
+        return FakeResponse(out[::-1])
+
+
+@pytest.fixture
+def w3():
+    return web3.Web3(web3.HTTPProvider("http://fake.node"))
+
+
+def useSession(monkeypatch, session):
+    monkeypatch.setattr(acx.rpc, "getSession", lambda: session)
+    return session
+
+
+def test_results_in_order(w3, monkeypatch):
+    session = useSession(monkeypatch, FakeSession())
+    results = batchRequest(w3, [("m", [x]) for x in range(250)], batchSize=100)
+
+    assert results == [2*x for x in range(250)]
+    assert [len(x) for x in session.batches] == [100, 100, 50]
+
+
+def test_rejected_batches_are_split(w3, monkeypatch):
+    session = useSession(monkeypatch, FakeSession(maxBatch=30))
+    results = batchRequest(w3, [("m", [x]) for x in range(100)], batchSize=100)
+
+    assert results == [2*x for x in range(100)]
+    assert sorted(len(x) for x in session.batches) == [25]*4 + [50]*2 + [100]
+
+
+def test_throttled_batches_are_resent_whole(w3, monkeypatch):
+    session = useSession(monkeypatch, FakeSession(throttled=["error", "http"]))
+    results = batchRequest(
+        w3, [("m", [x]) for x in range(10)], batchSize=10, backoffFactor=0
+    )
+
+    assert results == [2*x for x in range(10)]
+    assert session.batches == [list(range(10))]*3
+
+
+def test_throttled_batches_give_up_with_a_clear_error(w3, monkeypatch):
+    session = useSession(monkeypatch, FakeSession(throttled=["error"]*10))
+
+    with pytest.raises(ValueError, match="10 of 10 JSON-RPC requests failed"):
+        batchRequest(
+            w3, [("m", [x]) for x in range(10)], nRetries=2, backoffFactor=0
+        )
+    assert len(session.batches) == 3
+
+
+def test_only_failed_requests_are_resent(w3, monkeypatch):
+    session = useSession(
+        monkeypatch, FakeSession(flaky={3: 2, 7: 1}, dropped={5: 1})
+    )
+    results = batchRequest(
+        w3, [("m", [x]) for x in range(10)], batchSize=10, backoffFactor=0
+    )
+
+    assert results == [2*x for x in range(10)]
+    assert session.batches == [list(range(10)), [3, 5, 7], [3]]
+
+
+def test_gives_up_with_a_clear_error(w3, monkeypatch):
+    useSession(monkeypatch, FakeSession(flaky={4: 100}))
+
+    with pytest.raises(ValueError, match="1 of 10 JSON-RPC requests failed"):
+        batchRequest(
+            w3, [("m", [x]) for x in range(10)], nRetries=2, backoffFactor=0
+        )
+
+
+def test_reverts_are_not_resent(w3, monkeypatch):
+    session = useSession(monkeypatch, FakeSession(reverts={2}))
+    results = batchRequest(
+        w3, [("m", [x]) for x in range(5)], backoffFactor=0, allowReverts=True
+    )
+
+    assert results == [0, 2, None, 6, 8]
+    assert len(session.batches) == 1
+
+
+def test_only_reverts_are_allowed(w3, monkeypatch):
+    useSession(monkeypatch, FakeSession(reverts={2}, flaky={3: 100}))
+
+    with pytest.raises(ValueError, match="1 of 5 JSON-RPC requests failed"):
+        batchRequest(
+            w3, [("m", [x]) for x in range(5)], nRetries=2, backoffFactor=0,
+            allowReverts=True
+        )
+
+
+MULTICALL = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+class PoolSession:
+    """
+    Answers `eth_call`s to `exchangeRateCurrent` of a few pools (directly
+    or through Multicall3's `aggregate3`) from a table of rates
+
+    Parameters
+    ----------
+    rates : dict(tuple(str, int), int)
+        The rate of each (pool address, block) -- Missing pairs revert
+    broken : set(int)
+        Blocks that every request fails at with a (non revert) node error
+    """
+    def __init__(self, rates, broken=()):
+        self.rates = {(a.lower(), b): r for ((a, b), r) in rates.items()}
+        self.broken = set(broken)
+        self.calls = []
+
+    def _call(self, address, block):
+        return self.rates.get((address.lower(), block))
+
+    def post(self, endpoint, json, timeout):
+        out = []
+        for call in json:
+            (tx, block) = call["params"]
+            block = int(block, 16)
+            data = bytes.fromhex(tx["data"][2:])
+            self.calls.append((tx["to"], block))
+            response = {"jsonrpc": "2.0", "id": call["id"]}
+
+            if block in self.broken:
+                response["error"] = {"code": -32000, "message": "missing trie node"}
+            elif tx["to"].lower() == MULTICALL.lower():
+                (inner,) = decode_abi(["(address,bool,bytes)[]"], data[4:])
+                results = []
+                for (address, allowFailure, _) in inner:
+                    rate = self._call(address, block)
+                    if (rate is None) and not allowFailure:
+                        results = None
+                        break
+                    results.append(
+                        (False, b"") if rate is None
+                        else (True, encode_single("uint256", rate))
+                    )
+                if results is None:
+                    response["error"] = {"code": 3, "message": "execution reverted: Multicall3: call failed"}
+                else:
+                    response["result"] = "0x" + encode_abi(["(bool,bytes)[]"], [results]).hex()
+            else:
+                rate = self._call(tx["to"], block)
+                if rate is None:
+                    response["error"] = {"code": 3, "message": "execution reverted"}
+                else:
+                    response["result"] = "0x" + encode_single("uint256", rate).hex()
+            out.append(response)
+
+        return FakeResponse(out)
+
+
+def test_aggregated_calls_fail_on_their_own(w3, monkeypatch):
+    pools = [
+        w3.eth.contract(address=address, abi=getABI("BridgePool"))
+        for address in [
+            "0x43f133FE6fDFA17c417695c476447dc2a449Ba5B",
+            "0x256C8919CE1AB0e33974CF6AA9c71561Ef3017b6",
+        ]
+    ]
+    # The second pool doesn't exist at block 100
+    rates = {
+        (pools[0].address, 100): 10**18, (pools[0].address, 200): 2*10**18,
+        (pools[1].address, 200): 3*10**18,
+    }
+    session = useSession(monkeypatch, PoolSession(rates))
+    blockCalls = [
+        (block, [pool.functions.exchangeRateCurrent() for pool in pools])
+        for block in [100, 200]
+    ]
+
+    results = aggregateCalls(
+        w3, blockCalls, multicallAddress=MULTICALL, multicallFirstBlock=0,
+        allowFailure=True
+    )
+    assert results == [[10**18, None], [2*10**18, 3*10**18]]
+    # One aggregated call per block and the failed call on its own
+    assert session.calls == [(MULTICALL, 100), (MULTICALL, 200), (pools[1].address, 100)]
+
+    # Blocks before the aggregator are read one call at a time
+    results = aggregateCalls(
+        w3, blockCalls, multicallAddress=MULTICALL, multicallFirstBlock=150,
+        allowFailure=True
+    )
+    assert results == [[10**18, None], [2*10**18, 3*10**18]]
+
+    with pytest.raises(ValueError, match="1 of 4 calls failed"):
+        aggregateCalls(w3, blockCalls, multicallAddress=MULTICALL, multicallFirstBlock=0)
+
+    # Node errors are never mistaken for pools that don't exist yet
+    useSession(monkeypatch, PoolSession(rates, broken={200}))
+    monkeypatch.setattr(acx.rpc.time, "sleep", lambda x: None)
+    for multicallFirstBlock in [0, 150]:
+        with pytest.raises(ValueError, match="JSON-RPC requests failed"):
+            aggregateCalls(
+                w3, blockCalls, multicallAddress=MULTICALL,
+                multicallFirstBlock=multicallFirstBlock, allowFailure=True
+            )
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from eth_abi import encode_abi
+from hexbytes import HexBytes
+from web3._utils.abi import get_abi_input_types
+
+from acx.abis import getEventABI
+from acx.synthetic import lpTransfers, randomAddresses, v1Relays, v2Deposits
+
+
+def encodable(value, x):
+    "`value` of the ABI input `x` in the types that `eth_abi` encodes"
+    if x["type"] == "tuple":
+        assert(len(value) == len(x["components"]))
+        return [encodable(v, c) for (v, c) in zip(value, x["components"])]
+    if x["type"].startswith("bytes"):
+        return bytes(HexBytes(value))
+
+    return value
+
+
+def encodeArgs(eventAbi, args):
+    "ABI encode an event's args -- Raises if they don't fit the event's inputs"
+    assert(set(args.keys()) == {x["name"] for x in eventAbi["inputs"]})
+    values = [encodable(args[x["name"]], x) for x in eventAbi["inputs"]]
+
+    return encode_abi(get_abi_input_types(eventAbi), values)
+
+
+@pytest.fixture
+def population():
+    rng = np.random.default_rng(0)
+    return rng, randomAddresses(rng, 20), randomAddresses(rng, 3)
+
+
+def test_v1_relays_fit_the_abi(population):
+    rng, bridgoors, pools = population
+    tokens = ["USDC", "WETH"]
+    relays, disputes = v1Relays(
+        rng, bridgoors, tokens, dict(zip(tokens, pools)), 100, 200, 50, 5
+    )
+
+    relayAbi = getEventABI("BridgePool", "DepositRelayed")
+    disputeAbi = getEventABI("BridgePool", "RelayDisputed")
+    for token in tokens:
+        for event in relays[token]:
+            encodeArgs(relayAbi, event["args"])
+        for event in disputes[token]:
+            encodeArgs(disputeAbi, event["args"])
+
+
+def test_v2_deposits_fit_the_abi(population):
+    rng, bridgoors, spokes = population
+    chains = [1, 10, 137]
+    chunks = v2Deposits(
+        rng, bridgoors, ["USDC", "WETH"], dict(zip(chains, spokes)),
+        {chainId: (100, 200) for chainId in chains}, 50
+    )
+
+    eventAbi = getEventABI("SpokePool", "FundsDeposited")
+    for chunk in chunks:
+        for event in chunk:
+            encodeArgs(eventAbi, event["args"])
+
+
+def test_lp_transfers_fit_the_abi(population):
+    rng, lps, pools = population
+    tokens = ["USDC", "WETH"]
+    transfers = lpTransfers(
+        rng, lps, tokens,
+        {token: (pool, 100, 200) for (token, pool) in zip(tokens, pools)}, 50
+    )
+
+    eventAbi = getEventABI("ERC20", "Transfer")
+    for token in tokens:
+        for event in transfers[token]:
+            encodeArgs(eventAbi, event["args"])
@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+from acx.utils import getLogsSplitting, isRangeError, isRateLimitError
+
+
+def rpcError(code, message):
+    "The error that web3 raises for a JSON-RPC error response"
+    return ValueError({"code": code, "message": message})
+
+
+@pytest.mark.parametrize("err", [
+    rpcError(-32005, "query returned more than 10000 results"),
+    rpcError(-32602, "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range"),
+    rpcError(-32000, "block range is too wide"),
+    rpcError(-32000, "query timeout exceeded"),
+    requests.exceptions.ReadTimeout(),
+])
+def test_range_errors(err):
+    assert isRangeError(err)
+    assert not isRateLimitError(err)
+
+
+@pytest.mark.parametrize("err", [
+    rpcError(-32005, "project ID request rate exceeded"),
+    rpcError(-32005, "daily request count exceeded, request rate limited"),
+    rpcError(429, "Your app has exceeded its compute units per second capacity"),
+    rpcError(-32000, "daily limit exceeded"),
+    requests.exceptions.RetryError("too many 429 error responses"),
+])
+def test_rate_limit_errors(err):
+    assert isRateLimitError(err)
+    assert not isRangeError(err)
+
+
+def test_other_errors_are_raised():
+    def getLogs(bs, be):
+        raise rpcError(-32602, "invalid argument 0: hex string without 0x prefix")
+
+    with pytest.raises(ValueError):
+        getLogsSplitting(getLogs, 1, 100, backoffFactor=0)
+
+
+def test_range_errors_split():
+    requested = []
+
+    def getLogs(bs, be):
+        requested.append((bs, be))
+        if be - bs >= 25:
+            raise rpcError(-32005, "query returned more than 10000 results")
+        return list(range(bs, be + 1))
+
+    logs, nSplits = getLogsSplitting(getLogs, 1, 100, backoffFactor=0)
+
+    assert logs == list(range(1, 101))
+    assert nSplits > 0
+    assert max(be - bs for (bs, be) in requested[1:]) < 100
+
+
+def test_throttled_requests_back_off_without_splitting():
+    requested = []
+
+    def getLogs(bs, be):
+        requested.append((bs, be))
+        if len(requested) <= 3:
+            raise rpcError(-32005, "project ID request rate exceeded")
+        return [bs, be]
+
+    logs, nSplits = getLogsSplitting(getLogs, 1, 100, backoffFactor=0)
+
+    assert (logs, nSplits) == ([1, 100], 0)
+    assert requested == [(1, 100)]*4
+
+
+def test_throttling_gives_up():
+    def getLogs(bs, be):
+        raise rpcError(429, "Too Many Requests")
+
+    with pytest.raises(ValueError):
+        getLogsSplitting(getLogs, 1, 100, nRetries=2, backoffFactor=0)